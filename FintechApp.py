@@ -6,12 +6,34 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import calendar
 import os
-import tempfile
-import random
-import io
-import base64
-from PIL import Image
+import functools
+import html
+import itertools
+import multiprocessing
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
 import numpy as np
+from contractme import core, store
+from contractme.analytics import (bucket_events, deadline_event_arrays, overload_periods, timeline_granularity,
+                                  window_slice, year_heatmap_grid)
+from contractme.changes import ChangeFeed, StoreWatcher, apply_changes
+from contractme.history import History, HistoryRegistry, step_records
+from contractme.currency import RATES_FILE, RateTable, subscription_costs
+from contractme.archive import (ARCHIVE_GRACE_DAYS, DocumentArchive, archive_documents, archive_file_of,
+                                expired_documents, restore_document)
+from contractme.assistant import (AnswerCache, InferenceError, InferenceRunner, LocalModelServerBackend,
+                                  LocalStubBackend)
+from contractme.ics import export_ics_file, parse_ics
+from contractme.imaging import make_image_preview
+from contractme.index import TITLE_FIELDS, DocumentIndex, DuplicateIndex, SearchIndex, document_file_type, search_all
+from contractme.reminders import (FileDropReminderSink, InboxReminderSink, ReminderScheduler,
+                                  deadline_reminder, deadline_reminder_key, log_reminder_sink, reminder_text)
+from contractme.storage import (IMAGE_EXTENSIONS, document_type, ingest_upload, open_line_index,
+                                read_stored_file, read_text_lines, release_stored_file,
+                                release_unreferenced_files, storage_dir_of)
 
 # Initial app configuration
 st.set_page_config(
@@ -21,6 +43,75 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Upload settings
+MAX_FILE_SIZE_MB = 200
+MAX_USER_STORAGE_MB = 1024
+TEXT_VIEWER_PAGE_LINES = 50
+LINE_INDEX_CACHE_SIZE = 64  # Line indexes of text documents kept mapped for all sessions
+LINE_INDEX_CACHE_TTL = 3600  # Seconds before an unused line index is unmapped
+IMAGE_PREVIEW_SIZE = (800, 800)
+IMAGE_WORKERS = os.cpu_count() or 1
+
+# Workspace settings: each browser gets a workspace of its own, whose key is kept in the page address
+SINGLE_USER = os.environ.get("CONTRACTME_SINGLE_USER") == "1"  # Every session opens the data file of the CLI and API
+WORKSPACE_PARAM = "workspace"
+
+# Archive settings
+ARCHIVE_PAGE_SIZE = 20  # Archived documents listed at once
+
+# Undo settings
+UNUSED_FILE_MIN_AGE = 24 * 3600  # Seconds before a file no document refers to is deleted at startup
+
+# Chat settings
+CHAT_HISTORY_LIMIT = 200  # Messages kept per document conversation
+CHAT_WINDOW = 10  # Messages shown at once; older ones are loaded on demand
+
+# AI backend settings
+AI_MODEL_SERVER_URL = os.environ.get("CONTRACTME_MODEL_SERVER_URL")  # e.g. http://localhost:11434/api/generate
+AI_MODEL_NAME = os.environ.get("CONTRACTME_MODEL_NAME", "llama3")
+AI_BACKEND_TIMEOUT = 30  # Seconds allowed for a whole answer
+AI_ANSWER_CACHE_SIZE = 1024
+
+# Live update settings
+CHANGE_POLL_SECONDS = 2  # How often an idle page looks for changes made in other sessions
+
+# Collections each page shows, to rerun it only when one of them changed
+PAGE_COLLECTIONS = {
+    "Dashboard": {"documents", "deadlines", "subscriptions"},
+    "Documents": {"documents"},
+    "Deadlines": {"documents", "deadlines"},
+    "Subscriptions": {"subscriptions"},
+    "Calendar": {"deadlines", "subscriptions"},
+    "Analytics": {"deadlines", "subscriptions"},
+    "AI Assistant": {"documents"}
+}
+
+# Timeline settings
+TIMELINE_RENEWAL_YEARS = 3  # Renewals are projected this far ahead
+TIMELINE_DEFAULT_DAYS = 90  # Window shown at first
+TIMELINE_WEBGL_POINTS = 1000  # Above this many points, the timeline is drawn with WebGL
+
+# Workload settings: a rolling window with more deadlines or renewal costs than this is overloaded
+OVERLOAD_WINDOW_DAYS = 7
+OVERLOAD_MAX_DEADLINES = 5
+OVERLOAD_MAX_COST_USD = 250.0  # Converted to the display currency at today's rate
+OVERLOAD_HORIZON_DAYS = 365  # How far ahead the dashboard looks
+OVERLOAD_WARNINGS_SHOWN = 5
+
+# Search settings
+PICKER_LIMIT = 20  # Documents offered at once by the searchable pickers
+
+# Page and label of the search results of each collection
+SEARCH_PAGES = {"documents": "Documents", "deadlines": "Deadlines", "subscriptions": "Subscriptions"}
+SEARCH_LABELS = {"documents": "Document", "deadlines": "Deadline", "subscriptions": "Subscription"}
+
+# Reminder settings
+REMINDER_DROP_DIR = os.environ.get("CONTRACTME_REMINDER_DIR")  # Also drop reminders as files when set
+REMINDER_FIRED_FILE = os.path.join(store.DATA_DIR, "reminders_fired.json")  # So restarts do not fire them again
+
+# Chart colors, from most to least urgent
+STATUS_COLOR_SCALE = ["#e74a3b", "#f6c23e", "#1cc88a"]
+
 # Utility functions
 def load_css():
     st.markdown("""
@@ -159,19 +250,210 @@ def load_css():
 # Session state initialization
 def init_session_state():
     if 'documents' not in st.session_state:
-        st.session_state.documents = []
-    
-    if 'deadlines' not in st.session_state:
-        st.session_state.deadlines = []
-    
-    if 'subscriptions' not in st.session_state:
-        st.session_state.subscriptions = []
+        st.session_state.data_file = session_data_file()
+        # Identifies this session's changes in the change feed
+        st.session_state.session_id = uuid.uuid4().hex
+        # Subscribe before loading, so no change falls in between
+        st.session_state.feed_cursor = get_change_feed().cursor()
+        load_session_data()
+        st.session_state.history = History()
+        load_history_registry(st.session_state.data_file).add(st.session_state.history)
+        open_workspace(st.session_state.data_file)
     
     if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+        # One capped conversation per document, keyed by document ID
+        st.session_state.chat_history = {}
+
+def session_data_file():
+    """The data file of the workspace this session opens.
+
+    The key of the workspace is read from the page address, or a new one
+    is put there: reopening the address reopens the workspace, while other
+    browsers get workspaces of their own.
+    """
+    if SINGLE_USER:
+        return store.DATA_FILE
+    key = st.query_params.get(WORKSPACE_PARAM)
+    if not store.is_workspace_key(key):
+        key = store.new_workspace_key()
+        st.query_params[WORKSPACE_PARAM] = key
+    return store.workspace_data_file(key)
+
+def load_session_data():
+    """Loads the stored data into the session"""
+    with store.locked(st.session_state.data_file):
+        # Other sessions learn about what was saved meanwhile from the feed, not from reloading
+        pick_up_store_changes()
+        data = store.load_data(st.session_state.data_file)
+    for field in store.FIELDS:
+        st.session_state[field] = data[field]
+    # IDs are allocated by the feed, under its lock, for all sessions
+    get_change_feed().merge_counters(data["id_counters"])
+    st.session_state.id_allocator = get_change_feed()
+    st.session_state.data_version = data["version"]
+    st.session_state.document_index = DocumentIndex(st.session_state.documents)
+    st.session_state.subscription_index = DuplicateIndex(st.session_state.subscriptions)
+    st.session_state.search_indexes = {collection: SearchIndex(field, st.session_state[collection])
+                                       for collection, field in TITLE_FIELDS.items()}
+
+@contextmanager
+def stored_changes():
+    """Runs a write to the session's data under the data file's lock, then saves the data.
+
+    What other sessions and processes saved is applied first, so the write
+    sees the latest records and allocates IDs past the latest counters, and
+    the save loses none of their changes.
+    """
+    with store.locked(st.session_state.data_file):
+        pick_up_store_changes()
+        sync_session_data()
+        yield
+        save_session_data()
 
-    if 'categories' not in st.session_state:
-        st.session_state.categories = ["Home", "Work", "Health", "Finance", "Education", "Other"]
+def save_session_data():
+    """Writes this session's records to the store; the caller holds the data file's lock"""
+    watcher = get_store_watcher()
+    data = {field: st.session_state[field] for field in store.FIELDS}
+    data["id_counters"] = get_change_feed().counters()
+    # Keep the categories other processes added
+    data["categories"] += [c for c in watcher.data["categories"] if c not in data["categories"]]
+    data["version"] = watcher.version
+    st.session_state.data_version = store.save_data(data, st.session_state.data_file)
+    watcher.saved(data)
+
+def pick_up_store_changes():
+    """Publishes what other processes saved to the data file, and updates the reminders it affects.
+
+    The caller holds the data file's lock.
+    """
+    deltas = get_store_watcher().pick_up()
+    for delta in deltas:
+        if delta["collection"] == "deadlines":
+            if delta["op"] == "add":
+                schedule_deadline_reminders(delta["record"])
+            else:
+                cancel_deadline_reminders([delta["record"]])
+    # The API leaves the files of the documents it deletes to the app, which knows what undo still needs
+    release_unused_files([delta["record"] for delta in deltas
+                          if delta["collection"] == "documents" and delta["op"] == "remove"])
+
+def publish_change(op, collection, record, previous=None):
+    """Shares a write with the other sessions; every write goes through here.
+
+    previous is the version an added record replaces, if any.
+    """
+    search_index = st.session_state.search_indexes[collection]
+    if op == "add":
+        search_index.add(record)
+        st.session_state.history.record(collection, previous, record)
+    else:
+        search_index.remove(record)
+        st.session_state.history.record(collection, record, None)
+    get_change_feed().publish(st.session_state.session_id, op, collection, record)
+
+def session_indexes():
+    """The indexes to update with the records of each collection"""
+    search_indexes = st.session_state.search_indexes
+    return {
+        "documents": [st.session_state.document_index, search_indexes["documents"]],
+        "deadlines": [search_indexes["deadlines"]],
+        "subscriptions": [st.session_state.subscription_index, search_indexes["subscriptions"]]
+    }
+
+def current_record(collection, record):
+    """The latest version of a record, or None if another session or process removed it.
+
+    For records picked on an earlier rerun, looked up again once the data is synced.
+    """
+    return next((r for r in st.session_state[collection] if r["id"] == record["id"]), None)
+
+def sync_session_data():
+    """Applies the changes other sessions published since the last sync.
+
+    Saves from other processes, such as the API, are published first.
+    Returns the names of the collections that changed.
+    """
+    if get_store_watcher().changed():
+        with store.locked(st.session_state.data_file):
+            pick_up_store_changes()
+    deltas, st.session_state.feed_cursor = get_change_feed().since(st.session_state.feed_cursor)
+    if deltas is None:
+        # Too far behind for the log: start over from the store
+        load_session_data()
+        return set(store.COLLECTIONS)
+    return apply_changes(st.session_state, deltas, st.session_state.session_id, session_indexes())
+
+@contextmanager
+def undoable(label):
+    """Makes the changes published in the block one step of the session's history"""
+    history = st.session_state.history
+    history.begin(label)
+    try:
+        yield
+    finally:
+        release_history_files(history.end())
+
+def release_history_files(dropped_steps):
+    """Deletes the files only dropped history steps still referred to"""
+    release_unused_files(step_records(dropped_steps, "documents"))
+
+def release_unused_files(documents):
+    """Deletes the stored files of documents unless a stored document or an open session's undo refers to them.
+
+    Called once the data without the documents is saved.
+    """
+    in_use = get_store_watcher().data["documents"] + \
+        load_history_registry(st.session_state.data_file).records("documents")
+    kept = {doc["path"] for doc in in_use if doc.get("path")}
+    for doc in documents:
+        if doc.get("path") and doc["path"] not in kept:
+            release_stored_file(doc, [])
+
+def apply_history_changes(changes):
+    """Puts the records of undone or redone changes back, and shares them with the other sessions.
+
+    Each change is (collection, current, target) and sets the record to
+    target, or removes it if target is None.
+    """
+    deltas = [{"source": None, "op": "remove" if target is None else "add", "collection": collection,
+               "record": current if target is None else target}
+              for collection, current, target in changes]
+    with stored_changes():
+        apply_changes(st.session_state, deltas, st.session_state.session_id, session_indexes())
+        feed = get_change_feed()
+        for delta in deltas:
+            feed.publish(st.session_state.session_id, delta["op"], delta["collection"], delta["record"])
+            if delta["collection"] == "deadlines":
+                if delta["op"] == "add":
+                    schedule_deadline_reminders(delta["record"])
+                else:
+                    cancel_deadline_reminders([delta["record"]])
+
+def undo(steps=1):
+    history = st.session_state.history
+    labels, changes = [], []
+    for _ in range(steps):
+        undone = history.undo()
+        if undone is None:
+            break
+        labels.append(undone[0]["label"])
+        changes += undone[1]
+    if changes:
+        apply_history_changes(changes)
+        st.toast(f"Undid: {labels[0]}" if len(labels) == 1 else f"Undid {len(labels)} steps")
+
+def redo():
+    redone = st.session_state.history.redo()
+    if redone is not None:
+        step, changes = redone
+        apply_history_changes(changes)
+        st.toast(f"Redid: {step['label']}")
+
+@st.fragment(run_every=CHANGE_POLL_SECONDS)
+def live_updates(page):
+    """Picks up other sessions' changes while the page is idle"""
+    if sync_session_data() & PAGE_COLLECTIONS[page]:
+        st.rerun()
 
 # Function to display logo
 def display_logo():
@@ -189,8 +471,23 @@ def create_sidebar():
         
         st.markdown("---")
         
-        menu = ["Dashboard", "Documents", "Deadlines", "Subscriptions", "Calendar", "AI Assistant"]
-        choice = st.radio("Navigation", menu)
+        menu = ["Dashboard", "Documents", "Deadlines", "Subscriptions", "Calendar", "Analytics", "AI Assistant"]
+        choice = st.radio("Navigation", menu, key="nav")
+        
+        search_box()
+        
+        st.markdown("---")
+        
+        history_controls()
+        
+        st.markdown("---")
+        
+        # Costs are shown converted to this currency
+        st.selectbox("Display currency", list(core.CURRENCIES), key="display_currency")
+        
+        if not SINGLE_USER:
+            st.caption("Your documents are kept under this page's address: bookmark it to come back to them, "
+                       "and share it only with people who may see them.")
         
         st.markdown("---")
         
@@ -203,6 +500,269 @@ def create_sidebar():
         
         return choice
 
+def history_controls():
+    """Undo and redo buttons, and the steps that can be undone"""
+    history = st.session_state.history
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("↶ Undo", key="undo", on_click=undo, disabled=not history.undo_steps, use_container_width=True)
+    with col2:
+        st.button("↷ Redo", key="redo", on_click=redo, disabled=not history.redo_steps, use_container_width=True)
+    
+    steps = history.steps()
+    if not steps:
+        return
+    with st.expander(f"History ({len(steps)})"):
+        # Going back to a point undoes every step after it
+        for i, step in enumerate(steps):
+            st.button(f"{step['time'].strftime('%H:%M')} {step['label']}", key=f"history_{i}",
+                      help="Undo back to before this", on_click=undo, args=(i + 1,), use_container_width=True)
+
+def search_box():
+    """Typeahead search across documents, deadlines and subscriptions"""
+    query = st.text_input("Search", key="search_query", placeholder="Documents, deadlines, subscriptions...")
+    if not query:
+        return
+    
+    results = search_all(st.session_state.search_indexes, query)
+    if not results:
+        st.caption("No matches")
+        return
+    
+    # Jumping happens in a callback, before the navigation is drawn
+    def jump(collection, record_id):
+        st.session_state.nav = SEARCH_PAGES[collection]
+        st.session_state.search_focus = (collection, record_id)
+        st.session_state.search_query = ""
+    
+    for _, collection, record_id in results:
+        title = st.session_state.search_indexes[collection].titles[record_id]
+        st.button(f"{SEARCH_LABELS[collection]}: {title}", key=f"search_{collection}_{record_id}",
+                  on_click=jump, args=(collection, record_id), use_container_width=True)
+
+def focused_item(page):
+    """The item picked in the search box, shown at the top of its page"""
+    focus = st.session_state.get("search_focus")
+    if focus is None or SEARCH_PAGES[focus[0]] != page:
+        return
+    
+    collection, record_id = focus
+    record = next((r for r in st.session_state[collection] if r["id"] == record_id), None)
+    if record is None:
+        # Deleted since it was picked
+        del st.session_state.search_focus
+        return
+    
+    if collection == "documents":
+        details = {
+            "Category": record["category"],
+            "File type": document_file_type(record),
+            "Upload date": record["upload_date"].strftime('%m/%d/%Y'),
+            "Expiry date": record["expiry_date"].strftime('%m/%d/%Y') if record["expiry_date"] else None
+        }
+    elif collection == "deadlines":
+        details = {
+            "Date": record["date"].strftime('%m/%d/%Y'),
+            "Days left": (record["date"] - datetime.now().date()).days,
+            "Category": record["category"],
+            "Description": record["description"]
+        }
+    else:
+        details = {
+            "Type": record.get("type"),
+            "Monthly cost": core.format_money(record["cost"], record.get("currency", core.DEFAULT_CURRENCY)),
+            "Next renewal": record["renewal_date"].strftime('%m/%d/%Y'),
+            "Description": record.get("description")
+        }
+    
+    rows = "".join(f"<p><strong>{label}:</strong> {html.escape(str(value))}</p>"
+                   for label, value in details.items() if value not in (None, ""))
+    st.markdown(f"""
+    <div class="card" style="border-left: 5px solid #4e73df;">
+        <h3>{html.escape(record[TITLE_FIELDS[collection]])}</h3>
+        {rows}
+    </div>
+    """, unsafe_allow_html=True)
+    
+    def close():
+        del st.session_state.search_focus
+    
+    st.button("Close", key="close_search_focus", on_click=close)
+
+def document_picker(label, key, none_label):
+    """Document selectbox that only loads the documents matching a search, or the latest ones"""
+    query = st.text_input("Search documents", key=f"{key}_search", placeholder="Type part of a name")
+    index = st.session_state.document_index
+    
+    if query:
+        options = [doc_id for _, doc_id in st.session_state.search_indexes["documents"].search(query, PICKER_LIMIT)]
+    else:
+        options = [doc["id"] for doc in reversed(st.session_state.documents[-PICKER_LIMIT:])]
+    
+    # Keep the current choice while searching for another
+    selected = st.session_state.get(key)
+    if selected is not None and selected not in options and index.get(selected):
+        options.insert(0, selected)
+    
+    doc_id = st.selectbox(label, [None] + options, key=key,
+                          format_func=lambda doc_id: none_label if doc_id is None else index.get(doc_id)["name"])
+    return index.get(doc_id) if doc_id is not None else None
+
+# Shared resources
+@st.cache_resource
+def load_change_feed(data_file):
+    """One change feed for the sessions of each workspace"""
+    return ChangeFeed()
+
+def get_change_feed():
+    return load_change_feed(st.session_state.data_file)
+
+@st.cache_resource
+def load_store_watcher(data_file):
+    """Brings the saves of the command line and the API to a workspace's sessions"""
+    return StoreWatcher(data_file, load_change_feed(data_file))
+
+def get_store_watcher():
+    return load_store_watcher(st.session_state.data_file)
+
+@st.cache_resource
+def load_history_registry(data_file):
+    """The undo histories of a workspace's open sessions, which may still need deleted documents' files"""
+    return HistoryRegistry()
+
+@st.cache_resource
+def get_image_pool():
+    """Process pool shared by all sessions for decoding and resizing images"""
+    # Spawned workers import only the imaging module, never the running server
+    return ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def submit_image_preview(path):
+    """Submits a preview to the image pool, replacing the pool if a worker that died broke it"""
+    try:
+        return get_image_pool().submit(make_image_preview, path, IMAGE_PREVIEW_SIZE)
+    except BrokenProcessPool:
+        # Sessions still waiting on the broken pool get BrokenProcessPool, and retry on the new one
+        get_image_pool().shutdown(wait=False)
+        get_image_pool.clear()
+        return get_image_pool().submit(make_image_preview, path, IMAGE_PREVIEW_SIZE)
+
+@st.cache_resource
+def open_workspace(data_file):
+    """Prepares a workspace once per server start, when its first session opens it.
+
+    Deletes the files deletions kept for undo in sessions that have ended,
+    and schedules the reminders of the stored deadlines.
+    """
+    data = store.load_data(data_file)
+    release_unreferenced_files(data["documents"], UNUSED_FILE_MIN_AGE, storage_dir_of(data_file))
+    scheduler = get_reminder_scheduler()
+    for deadline in data["deadlines"]:
+        scheduler.schedule(deadline_reminder_key(deadline, data_file), deadline_reminder(deadline, data_file))
+
+@st.cache_resource
+def get_reminder_inbox():
+    return InboxReminderSink()
+
+@st.cache_resource
+def get_reminder_scheduler():
+    """One scheduler thread shared by all sessions of all workspaces"""
+    sinks = [log_reminder_sink, get_reminder_inbox()]
+    if REMINDER_DROP_DIR:
+        sinks.append(FileDropReminderSink(REMINDER_DROP_DIR))
+    return ReminderScheduler(sinks, fired_file=REMINDER_FIRED_FILE)
+
+def schedule_deadline_reminders(deadline):
+    data_file = st.session_state.data_file
+    get_reminder_scheduler().schedule(deadline_reminder_key(deadline, data_file),
+                                      deadline_reminder(deadline, data_file))
+
+def cancel_deadline_reminders(deadlines):
+    scheduler = get_reminder_scheduler()
+    for deadline in deadlines:
+        scheduler.cancel(deadline_reminder_key(deadline, st.session_state.data_file))
+
+@st.cache_resource
+def load_document_archive(data_file):
+    """The archive of a workspace's long expired documents, shared by its sessions"""
+    return DocumentArchive(archive_file_of(data_file))
+
+def get_document_archive():
+    return load_document_archive(st.session_state.data_file)
+
+@st.cache_resource(max_entries=1)
+def load_rate_table(path, mtime):
+    return RateTable.load(path)
+
+def get_rate_table():
+    """Exchange rates, reloaded when the rates file changes"""
+    return load_rate_table(RATES_FILE, os.path.getmtime(RATES_FILE))
+
+def display_currency():
+    return st.session_state.get("display_currency", core.DEFAULT_CURRENCY)
+
+# Paged text viewer helpers
+@st.cache_resource(max_entries=LINE_INDEX_CACHE_SIZE, ttl=LINE_INDEX_CACHE_TTL)
+def load_line_index(path):
+    """Line index of a stored text file, mapped once for all sessions.
+
+    The cache is bounded so that viewing many documents does not keep all
+    their indexes mapped, nor the files deleted since then open.
+    """
+    return open_line_index(path)
+
+def text_viewer(doc):
+    """Displays one page of a text document with paging controls"""
+    line_starts = load_line_index(doc["path"])
+    total_lines = len(line_starts)
+    page_key = f"viewer_line_{doc['id']}"
+    jump_key = f"viewer_jump_{doc['id']}"
+
+    if page_key not in st.session_state:
+        st.session_state[page_key] = 0
+        st.session_state[jump_key] = 1
+
+    def go_to_line(line):
+        st.session_state[page_key] = min(max(line, 0), max(total_lines - 1, 0))
+        st.session_state[jump_key] = st.session_state[page_key] + 1
+
+    def jump_to_line():
+        go_to_line(st.session_state[jump_key] - 1)
+
+    first_line = st.session_state[page_key]
+    # Pages of very long lines hold fewer lines, so the page ends where the text read ends
+    text, last_line = read_text_lines(doc["path"], line_starts, first_line, TEXT_VIEWER_PAGE_LINES)
+
+    text_html = html.escape(text).replace('\n', '<br>')
+    st.markdown(f"""
+    <div style="background-color: #f5f5f5; padding: 10px; border-radius: 5px; 
+                max-height: 300px; overflow-y: auto; font-family: monospace;">
+        {text_html}
+    </div>
+    """, unsafe_allow_html=True)
+
+    if total_lines == 0:
+        st.caption("This document is empty.")
+        return
+
+    st.caption(f"Lines {first_line + 1}-{last_line} of {total_lines}")
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+
+    with col1:
+        st.button("Previous page", key=f"viewer_prev_{doc['id']}",
+                  disabled=first_line == 0,
+                  on_click=go_to_line, args=(first_line - TEXT_VIEWER_PAGE_LINES,))
+
+    with col2:
+        st.button("Next page", key=f"viewer_next_{doc['id']}",
+                  disabled=last_line >= total_lines,
+                  on_click=go_to_line, args=(last_line,))
+
+    with col3:
+        st.number_input("Jump to line", min_value=1, max_value=total_lines,
+                        key=jump_key, on_change=jump_to_line)
+
 # 1. Document Upload Module
 def upload_document():
     st.markdown("<h2>Upload a New Document</h2>", unsafe_allow_html=True)
@@ -215,13 +775,16 @@ def upload_document():
         custom_category = st.text_input("Add new category (optional)")
         
         if custom_category and custom_category not in st.session_state.categories:
-            st.session_state.categories.append(custom_category)
+            with stored_changes():
+                st.session_state.categories.append(custom_category)
             st.success(f"Category '{custom_category}' added!")
     
     with col2:
-        uploaded_file = st.file_uploader("Upload a document", 
-                                       type=["pdf", "jpg", "jpeg", "png", "txt", "md"],
-                                       help="Supported formats: PDF, JPG, PNG, TXT, MD")
+        uploaded_files = st.file_uploader("Upload documents", 
+                                        type=["pdf", "jpg", "jpeg", "png", "txt", "md"],
+                                        accept_multiple_files=True,
+                                        help="Supported formats: PDF, JPG, PNG, TXT, MD. "
+                                             "With several files, each document is named after its file.")
         
         has_expiry = st.checkbox("Document has an expiry date")
         
@@ -230,60 +793,197 @@ def upload_document():
         else:
             expiry_date = None
     
+    category = doc_category if not custom_category else custom_category
+    
     if st.button("Upload Document"):
-        if doc_name and uploaded_file:
-            # Temporary file saving
-            file_extension = uploaded_file.name.split(".")[-1].lower()
-            
-            # To determine document type
-            doc_type = ""
-            preview_data = None
-            
-            if file_extension in ["jpg", "jpeg", "png"]:
-                doc_type = "image"
-                image = Image.open(uploaded_file)
-                img_bytes = io.BytesIO()
-                image.save(img_bytes, format="PNG")
-                preview_data = base64.b64encode(img_bytes.getvalue()).decode()
-            
-            elif file_extension == "pdf":
-                doc_type = "pdf"
-                preview_data = base64.b64encode(uploaded_file.read()).decode()
-                
-            elif file_extension in ["txt", "md"]:
-                doc_type = "text"
-                preview_data = uploaded_file.read().decode()
-                
-            # Creating document object
-            document = {
-                "id": len(st.session_state.documents) + 1,
-                "name": doc_name,
-                "category": doc_category if not custom_category else custom_category,
-                "type": doc_type,
-                "preview": preview_data,
-                "upload_date": datetime.now().date(),
-                "expiry_date": expiry_date,
-                "filename": uploaded_file.name
-            }
-            
-            # Adding to session
-            st.session_state.documents.append(document)
-            
-            # If it has an expiry date, we also add it as a deadline
-            if expiry_date:
-                deadline = {
-                    "id": len(st.session_state.deadlines) + 1,
-                    "title": f"Expiry {doc_name}",
-                    "date": expiry_date,
-                    "description": f"Deadline for document '{doc_name}'",
-                    "category": doc_category if not custom_category else custom_category,
-                    "document_id": document["id"]
-                }
-                st.session_state.deadlines.append(deadline)
-            
-            st.success(f"Document '{doc_name}' uploaded successfully!")
+        if uploaded_files and (doc_name or len(uploaded_files) > 1):
+            # Offer to merge uploads that look like existing documents before storing anything
+            duplicates = {}
+            for uploaded_file, name in zip(uploaded_files, upload_names(uploaded_files, doc_name)):
+                matches = st.session_state.document_index.duplicates(name)
+                if matches:
+                    duplicates[uploaded_file.file_id] = [doc["id"] for doc, _ in matches]
+            if duplicates:
+                st.session_state.upload_duplicates = duplicates
+            else:
+                store_uploads(uploaded_files, doc_name, category, expiry_date)
         else:
             st.error("Please enter a name for the document and upload a file.")
+    
+    if st.session_state.get("upload_duplicates"):
+        review_upload_duplicates(uploaded_files, doc_name, category, expiry_date)
+
+def upload_names(uploaded_files, doc_name):
+    """Document names for the uploaded files: with several files, each is named after its file"""
+    if len(uploaded_files) == 1:
+        return [doc_name]
+    names = []
+    for uploaded_file in uploaded_files:
+        stem = os.path.splitext(uploaded_file.name)[0]
+        names.append(f"{doc_name} - {stem}" if doc_name else stem)
+    return names
+
+def review_upload_duplicates(uploaded_files, doc_name, category, expiry_date):
+    """Asks whether uploads that look like existing documents are new versions of them"""
+    index = st.session_state.document_index
+    duplicates = st.session_state.upload_duplicates
+    
+    def describe(doc_id):
+        if doc_id is None:
+            return "A new document"
+        doc = index.get(doc_id)
+        return (f"New file of '{doc['name']}' ({document_file_type(doc)}, "
+                f"uploaded {doc['upload_date'].strftime('%m/%d/%Y')})")
+    
+    st.warning("Some uploads look like documents you already have. "
+               "Merging makes the upload the document's current file and keeps its deadlines.")
+    merge_into = {}
+    for uploaded_file, name in zip(uploaded_files or [], upload_names(uploaded_files or [], doc_name)):
+        matches = [doc_id for doc_id in duplicates.get(uploaded_file.file_id, ()) if index.get(doc_id)]
+        if not matches:
+            continue
+        target = st.radio(f"Save '{name}' as", [None] + matches, format_func=describe,
+                          key=f"merge_upload_{uploaded_file.file_id}")
+        if target is not None:
+            merge_into[uploaded_file.file_id] = index.get(target)
+    
+    # Uploading in a callback lets the page rerun without this form
+    def upload():
+        del st.session_state.upload_duplicates
+        if uploaded_files:
+            store_uploads(uploaded_files, doc_name, category, expiry_date, merge_into)
+    
+    def cancel():
+        del st.session_state.upload_duplicates
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("Continue upload", on_click=upload)
+    with col2:
+        st.button("Cancel", key="cancel_upload", on_click=cancel)
+
+def store_uploads(uploaded_files, doc_name, category, expiry_date, merge_into=None):
+    """Stores the uploaded files as documents, or as new files of the documents in merge_into (by file ID)"""
+    merge_into = merge_into or {}
+    
+    # Check the quotas before reading anything
+    max_file_bytes = MAX_FILE_SIZE_MB * 1024 * 1024
+    remaining_bytes = MAX_USER_STORAGE_MB * 1024 * 1024 - core.storage_used(st.session_state.documents)
+
+    too_large = [f.name for f in uploaded_files if f.size > max_file_bytes]
+    if too_large:
+        st.error(f"Larger than the {MAX_FILE_SIZE_MB} MB limit: {', '.join(too_large)}")
+        return
+    if sum(f.size for f in uploaded_files) > remaining_bytes:
+        st.error(f"Not enough storage left: your documents may use at most {MAX_USER_STORAGE_MB} MB in total.")
+        return
+
+    label = f"Upload '{doc_name}'" if len(uploaded_files) == 1 else f"Upload {len(uploaded_files)} documents"
+    with undoable(label):
+        progress = st.progress(0.0, text="Uploading...")
+        ready = []  # Arguments of add_uploaded_document for each stored file
+        pending_images = {}
+        done = 0
+
+        for uploaded_file, name in zip(uploaded_files, upload_names(uploaded_files, doc_name)):
+            target = merge_into.get(uploaded_file.file_id)
+
+            # Stream the file to storage
+            file_extension = uploaded_file.name.split(".")[-1].lower()
+            try:
+                stored = ingest_upload(uploaded_file, file_extension, min(max_file_bytes, remaining_bytes),
+                                       storage_dir_of(st.session_state.data_file))
+            except ValueError as e:
+                st.error(f"{uploaded_file.name}: {e}")
+                done += 1
+                continue
+            remaining_bytes -= stored["size"]
+
+            if file_extension in IMAGE_EXTENSIONS:
+                # Decoding and resizing run in the process pool, in parallel
+                future = submit_image_preview(stored["path"])
+                pending_images[future] = (name, uploaded_file.name, stored, target)
+                continue
+
+            ready.append((name, file_extension, None, uploaded_file.name, stored, target))
+            done += 1
+            progress.progress(done / len(uploaded_files), text=f"Uploaded {uploaded_file.name}")
+
+        failed = []  # Stored files of the images that could not be read
+        broken = []  # Images whose worker died, taking the pool down with it
+        for future in as_completed(pending_images):
+            name, file_name, stored, target = pending_images[future]
+            try:
+                preview_path = future.result()
+            except BrokenProcessPool:
+                broken.append(pending_images[future])
+                continue
+            except Exception as e:
+                st.error(f"{file_name}: the image could not be read ({e})")
+                failed.append(stored)
+                done += 1
+                continue
+            ready.append((name, file_name.split(".")[-1].lower(), preview_path, file_name, stored, target))
+            done += 1
+            progress.progress(done / len(uploaded_files), text=f"Processed {file_name}")
+
+        # Retried one at a time on a new pool, so that an image breaking it again fails alone
+        for name, file_name, stored, target in broken:
+            done += 1
+            try:
+                preview_path = submit_image_preview(stored["path"]).result()
+            except Exception as e:
+                st.error(f"{file_name}: the image could not be read ({e})")
+                failed.append(stored)
+                continue
+            ready.append((name, file_name.split(".")[-1].lower(), preview_path, file_name, stored, target))
+            progress.progress(done / len(uploaded_files), text=f"Processed {file_name}")
+
+        progress.empty()
+        release_unused_files(failed)
+        # Only adding the records holds the data file's lock, not storing the files
+        with stored_changes():
+            for name, file_extension, preview_path, file_name, stored, target in ready:
+                add_uploaded_document(name, category, file_extension, preview_path, expiry_date, file_name,
+                                      stored, target)
+    if not ready:
+        return
+    if len(uploaded_files) == 1:
+        st.success(f"Document '{doc_name}' uploaded successfully!")
+    elif len(ready) < len(uploaded_files):
+        st.success(f"{len(ready)} of {len(uploaded_files)} documents uploaded!")
+    else:
+        st.success(f"{len(ready)} documents uploaded!")
+
+def add_uploaded_document(doc_name, category, file_extension, preview_data, expiry_date, filename, stored,
+                          merge_into=None):
+    doc_type = document_type(file_extension)
+    if doc_type == "text":
+        preview_data = stored["text_preview"]
+
+    index = st.session_state.document_index
+    if merge_into is not None:
+        target, merge_into = merge_into, current_record("documents", merge_into)
+        if merge_into is None:
+            st.warning(f"'{target['name']}' was deleted meanwhile, so {filename} was added as a new document.")
+    if merge_into is None:
+        # Adding to session, with an expiry deadline if it has a date
+        document, deadline = core.add_document(st.session_state, doc_name, category, doc_type, preview_data,
+                                               expiry_date, filename, stored)
+        removed_deadlines = []
+    else:
+        # The upload becomes the document's current file; the previous one is kept for undo
+        index.remove(merge_into)
+        document, removed_deadlines, deadline = core.merge_document(st.session_state, merge_into, doc_type,
+                                                                    preview_data, expiry_date, filename, stored)
+        cancel_deadline_reminders(removed_deadlines)
+    index.add(document)
+    publish_change("add", "documents", document, previous=merge_into)
+    for removed in removed_deadlines:
+        publish_change("remove", "deadlines", removed)
+    if deadline:
+        publish_change("add", "deadlines", deadline)
+        schedule_deadline_reminders(deadline)
 
 def view_documents():
     st.markdown("<h2>Your Documents</h2>", unsafe_allow_html=True)
@@ -292,78 +992,207 @@ def view_documents():
         st.info("You haven't uploaded any documents yet. Use the form above to upload your first document.")
         return
     
-    # Remove duplicates based on name
-    unique_docs = {}
-    for doc in st.session_state.documents:
-        name = doc.get("name", "Unnamed Document")
-        unique_docs[name] = doc
+    index = st.session_state.document_index
+    
+    # Faceted filters, with counts read from the index
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        category_counts = index.category_counts()
+        category_options = st.session_state.categories + [c for c in category_counts if c not in st.session_state.categories]
+        filter_categories = st.multiselect("Category", category_options,
+                                           format_func=lambda c: f"{c} ({category_counts.get(c, 0)})")
+    
+    with col2:
+        file_type_counts = index.file_type_counts()
+        filter_file_types = st.multiselect("File type", sorted(file_type_counts),
+                                           format_func=lambda t: f"{t} ({file_type_counts[t]})")
+    
+    with col3:
+        first_upload = index.upload_dates[0][0]
+        last_upload = index.upload_dates[-1][0]
+        upload_range = st.date_input("Uploaded between", value=(first_upload, last_upload))
     
-    # Use only unique documents
-    st.session_state.documents = list(unique_docs.values())
+    with col4:
+        expiry_options = {"Any": None, "With expiry date": True, "Without expiry date": False}
+        filter_expiry = st.selectbox("Expiry", list(expiry_options))
     
-    # Filter by category
-    all_categories = ["All"] + st.session_state.categories
-    filter_category = st.selectbox("Filter by category", all_categories)
+    # The range is incomplete while the user is still picking its end
+    uploaded_from = upload_range[0] if len(upload_range) > 0 else None
+    uploaded_to = upload_range[1] if len(upload_range) > 1 else None
     
-    filtered_docs = st.session_state.documents
-    if filter_category != "All":
-        filtered_docs = [doc for doc in st.session_state.documents if doc["category"] == filter_category]
+    filtered_ids = index.query(filter_categories, filter_file_types, uploaded_from, uploaded_to,
+                               expiry_options[filter_expiry])
     
-    if not filtered_docs:
-        st.info(f"There are no documents in the '{filter_category}' category.")
+    if not filtered_ids:
+        st.info("There are no documents matching the selected filters.")
         return
     
-    # Document display
-    for i, doc in enumerate(filtered_docs):
-        col1, col2 = st.columns([2, 3])
-        
-        with col1:
-            st.markdown(f"""
-            <div class="card">
-                <h3>{doc['name']}</h3>
-                <p><strong>Category:</strong> {doc['category']}</p>
-                <p><strong>Upload date:</strong> {doc['upload_date'].strftime('%m/%d/%Y')}</p>
-                <p><strong>File type:</strong> {doc['filename'].split('.')[-1].upper()}</p>
-                
-                {f"<p><strong>Expiry date:</strong> {doc['expiry_date'].strftime('%m/%d/%Y')}</p>" if doc['expiry_date'] else ""}
-            </div>
-            """, unsafe_allow_html=True)
+    st.caption(f"{len(filtered_ids)} of {len(index)} documents")
+    
+    # Document display, in upload order
+    for doc_id in sorted(filtered_ids):
+        document_card(doc_id)
+
+def delete_document(doc):
+    # Remove the document, its deadlines and their reminders; the file is kept while it can be undone
+    with undoable(f"Delete document '{doc['name']}'"), stored_changes():
+        removed_deadlines = core.remove_document(st.session_state, doc)
+        cancel_deadline_reminders(removed_deadlines)
+        st.session_state.document_index.remove(doc)
+        publish_change("remove", "documents", doc)
+        for deadline in removed_deadlines:
+            publish_change("remove", "deadlines", deadline)
+
+def archive_expired_documents():
+    """Moves documents expired longer than the grace period to the archive, once a day per session"""
+    today = datetime.now().date()
+    if st.session_state.get("archive_swept") == today:
+        return
+    st.session_state.archive_swept = today
+    
+    if not expired_documents(st.session_state.documents, ARCHIVE_GRACE_DAYS, today):
+        return
+    with stored_changes():
+        # Another session or process may have archived or restored some meanwhile
+        expired = expired_documents(st.session_state.documents, ARCHIVE_GRACE_DAYS, today)
+        removed_deadlines = archive_documents(st.session_state, get_document_archive(), expired, today)
+        cancel_deadline_reminders(removed_deadlines)
+        for doc in expired:
+            st.session_state.document_index.remove(doc)
+            publish_change("remove", "documents", doc)
+        for deadline in removed_deadlines:
+            publish_change("remove", "deadlines", deadline)
+    # Archived documents are kept in the archive, but an open session may still undo their removal
+    release_unused_files(expired)
+
+@st.fragment
+def document_card(doc_id):
+    """A document and its preview; paging or deleting reruns only this card"""
+    doc = st.session_state.document_index.get(doc_id)
+    if doc is None:
+        # Deleted from this card
+        return
+
+    col1, col2 = st.columns([2, 3])
+    
+    with col1:
+        st.markdown(f"""
+        <div class="card">
+            <h3>{doc['name']}</h3>
+            <p><strong>Category:</strong> {doc['category']}</p>
+            <p><strong>Upload date:</strong> {doc['upload_date'].strftime('%m/%d/%Y')}</p>
+            <p><strong>File type:</strong> {document_file_type(doc)}</p>
             
-            if st.button(f"Delete document {doc['name']}", key=f"del_doc_{doc['id']}"):
-                # Remove the document
-                st.session_state.documents.remove(doc)
-                # Remove any associated deadlines
-                st.session_state.deadlines = [d for d in st.session_state.deadlines if d.get('document_id') != doc['id']]
-                st.success(f"Document '{doc['name']}' deleted successfully!")
-                st.rerun()
+            {f"<p><strong>Expiry date:</strong> {doc['expiry_date'].strftime('%m/%d/%Y')}</p>" if doc['expiry_date'] else ""}
+        </div>
+        """, unsafe_allow_html=True)
         
-        with col2:
-            st.markdown("<div class='card'><h4>Preview</h4>", unsafe_allow_html=True)
+        # Deleting in a callback lets the card rerun without the document
+        def delete():
+            delete_document(doc)
+            st.toast(f"Document '{doc['name']}' deleted successfully!")
+
+        st.button(f"Delete document {doc['name']}", key=f"del_doc_{doc['id']}", on_click=delete)
+    
+    with col2:
+        st.markdown("<div class='card'><h4>Preview</h4>", unsafe_allow_html=True)
+        
+        if doc["type"] == "image":
+            # The thumbnail is served from storage
+            st.image(doc["preview"])
             
-            if doc["type"] == "image":
-                st.markdown(f"""
-                <img src="data:image/png;base64,{doc['preview']}" 
-                     style="max-width: 100%; max-height: 300px; display: block; margin: 0 auto;">
-                """, unsafe_allow_html=True)
-                
-            elif doc["type"] == "pdf":
-                st.markdown(f"""
-                <p>PDF preview not available directly. 
-                   <a href="data:application/pdf;base64,{doc['preview']}" download="{doc['name']}.pdf">
-                   Download PDF</a></p>
-                """, unsafe_allow_html=True)
-                
-            elif doc["type"] == "text":
-                st.markdown(f"""
-                <div style="background-color: #f5f5f5; padding: 10px; border-radius: 5px; 
-                            max-height: 300px; overflow-y: auto; font-family: monospace;">
-                    {doc['preview'].replace('\n', '<br>')}
-                </div>
-                """, unsafe_allow_html=True)
+        elif doc["type"] == "pdf":
+            st.markdown("<p>PDF preview not available directly.</p>", unsafe_allow_html=True)
+            # The file is only read from storage when the button is clicked
+            st.download_button("Download PDF",
+                               data=functools.partial(read_stored_file, doc["path"]),
+                               file_name=f"{doc['name']}.pdf",
+                               mime="application/pdf",
+                               key=f"dl_doc_{doc['id']}",
+                               on_click="ignore")
             
-            st.markdown("</div>", unsafe_allow_html=True)
+        elif doc["type"] == "text":
+            text_viewer(doc)
+        
+        st.markdown("</div>", unsafe_allow_html=True)
+    
+    st.markdown("<hr>", unsafe_allow_html=True)
+
+def view_archive():
+    st.markdown("<h2>Archive</h2>", unsafe_allow_html=True)
+    archive = get_document_archive()
+    
+    total = archive.count()
+    if not total:
+        st.info(f"Documents expired for more than {ARCHIVE_GRACE_DAYS} days are moved here, with their deadlines.")
+        return
+    
+    # A new search starts from the first page
+    def first_page():
+        st.session_state.archive_page = 0
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("Search the archive", key="archive_query", on_change=first_page)
+    with col2:
+        category = st.selectbox("Category", [None] + archive.categories(), key="archive_category",
+                                format_func=lambda c: "All" if c is None else c, on_change=first_page)
+    
+    # One row more than a page tells whether there is a next one
+    page = st.session_state.get("archive_page", 0)
+    stubs = archive.search(query.strip(), category, ARCHIVE_PAGE_SIZE + 1, page * ARCHIVE_PAGE_SIZE)
+    has_next = len(stubs) > ARCHIVE_PAGE_SIZE
+    stubs = stubs[:ARCHIVE_PAGE_SIZE]
+    
+    if not stubs:
+        st.info("There are no archived documents matching the search.")
+    st.caption(f"{total} archived documents")
+    
+    for stub in stubs:
+        col1, col2, col3 = st.columns([3, 1, 1])
+        with col1:
+            expiry = stub["expiry_date"].strftime('%m/%d/%Y') if stub["expiry_date"] else "none"
+            st.markdown(f"**{html.escape(stub['name'])}** · {html.escape(stub['category'])} · "
+                        f"expired {expiry} · archived {stub['archived_date'].strftime('%m/%d/%Y')} · "
+                        f"{stub['size'] / 1024:.0f} KB")
+        with col2:
+            st.button("Restore", key=f"restore_doc_{stub['id']}", on_click=restore_archived_document,
+                      args=(stub["id"],))
+        with col3:
+            # The file is only decompressed when the button is clicked
+            st.download_button("Download", data=functools.partial(archive.read_file, stub["id"]),
+                               file_name=stub["filename"], key=f"dl_archived_{stub['id']}", on_click="ignore")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if page > 0 and st.button("Previous page", key="archive_previous"):
+            st.session_state.archive_page = page - 1
+            st.rerun()
+    with col2:
+        if has_next and st.button("Next page", key="archive_next"):
+            st.session_state.archive_page = page + 1
+            st.rerun()
+
+def restore_archived_document(doc_id):
+    """Brings an archived document back with its deadlines and their reminders"""
+    with stored_changes():
+        restored = restore_document(st.session_state, get_document_archive(), doc_id)
+        if restored is None:
+            # Restored meanwhile by another session
+            return
+        doc, deadlines = restored
         
-        st.markdown("<hr>", unsafe_allow_html=True)
+        # Thumbnails are not archived; make it again from the restored image
+        if doc["type"] == "image" and doc.get("path") and not os.path.exists(doc["preview"] or ""):
+            doc["preview"] = make_image_preview(doc["path"], IMAGE_PREVIEW_SIZE)
+        
+        st.session_state.document_index.add(doc)
+        publish_change("add", "documents", doc)
+        for deadline in deadlines:
+            publish_change("add", "deadlines", deadline)
+            schedule_deadline_reminders(deadline)
+    st.toast(f"Document '{doc['name']}' restored")
 
 # 2. Deadline Management Module
 def add_deadline():
@@ -379,31 +1208,17 @@ def add_deadline():
         deadline_date = st.date_input("Deadline Date", min_value=datetime.now().date())
         
         # Option to link to an existing document
-        doc_options = ["No linked document"] + [doc["name"] for doc in st.session_state.documents]
-        selected_doc = st.selectbox("Linked document (optional)", doc_options)
+        linked_doc = document_picker("Linked document (optional)", "deadline_document", "No linked document")
         
     deadline_desc = st.text_area("Description", height=100)
     
     if st.button("Add Deadline"):
         if deadline_title and deadline_date:
-            # Find the ID of the selected document, if present
-            doc_id = None
-            if selected_doc != "No linked document":
-                for doc in st.session_state.documents:
-                    if doc["name"] == selected_doc:
-                        doc_id = doc["id"]
-                        break
-            
-            deadline = {
-                "id": len(st.session_state.deadlines) + 1,
-                "title": deadline_title,
-                "date": deadline_date,
-                "description": deadline_desc,
-                "category": deadline_category,
-                "document_id": doc_id
-            }
-            
-            st.session_state.deadlines.append(deadline)
+            with undoable(f"Add deadline '{deadline_title}'"), stored_changes():
+                deadline = core.add_deadline(st.session_state, deadline_title, deadline_date, deadline_desc,
+                                             deadline_category, document_id=linked_doc["id"] if linked_doc else None)
+                publish_change("add", "deadlines", deadline)
+                schedule_deadline_reminders(deadline)
             st.success(f"Deadline '{deadline_title}' added successfully!")
         else:
             st.error("Title and date are required!")
@@ -415,56 +1230,36 @@ def view_deadlines():
         st.info("You haven't added any deadlines yet.")
         return
     
-    # Sort deadlines by date
-    sorted_deadlines = sorted(st.session_state.deadlines, key=lambda x: x["date"])
-    
+    deadline_table()
+    deadline_timeline()
+
+@st.fragment
+def deadline_table():
+    """Period filter and deadline table; changing the period reruns only this section"""
     # Filter by periods
-    period_options = ["All", "Next 7 days", "Next 30 days", "Next 3 months", "Expired"]
-    selected_period = st.selectbox("View deadlines by period", period_options)
+    selected_period = st.selectbox("View deadlines by period", list(core.DEADLINE_PERIODS))
     
-    filtered_deadlines = sorted_deadlines
     today = datetime.now().date()
-    
-    if selected_period == "Next 7 days":
-        end_date = today + timedelta(days=7)
-        filtered_deadlines = [d for d in sorted_deadlines if today <= d["date"] <= end_date]
-    elif selected_period == "Next 30 days":
-        end_date = today + timedelta(days=30)
-        filtered_deadlines = [d for d in sorted_deadlines if today <= d["date"] <= end_date]
-    elif selected_period == "Next 3 months":
-        end_date = today + timedelta(days=90)
-        filtered_deadlines = [d for d in sorted_deadlines if today <= d["date"] <= end_date]
-    elif selected_period == "Expired":
-        filtered_deadlines = [d for d in sorted_deadlines if d["date"] < today]
+    filtered_deadlines = core.filter_deadlines(st.session_state.deadlines, selected_period, today)
     
     if not filtered_deadlines:
         st.info(f"There are no deadlines in the selected period ({selected_period}).")
         return
     
     # Display deadlines in a table
+    status_labels = {"Expired": "⚠️ Expired", "Imminent": "🔄 Imminent", "Future": "✅ Future"}
     deadlines_data = []
     
-    for d in filtered_deadlines:
-        # Calculate if expired or imminent
-        days_left = (d["date"] - today).days
-        status = "⚠️ Expired" if days_left < 0 else "🔄 Imminent" if days_left <= 7 else "✅ Future"
-        
-        # Find the name of the associated document, if present
-        doc_name = "None"
-        if d.get("document_id"):
-            for doc in st.session_state.documents:
-                if doc["id"] == d["document_id"]:
-                    doc_name = doc["name"]
-                    break
-        
+    for row in core.deadline_rows(filtered_deadlines, st.session_state.documents, today):
+        days_left = row["days_left"]
         deadlines_data.append({
-            "ID": d["id"],
-            "Title": d["title"],
-            "Date": d["date"].strftime("%m/%d/%Y"),
-            "Days remaining": max(days_left, 0) if days_left >= 0 else f"Expired {abs(days_left)} days ago",
-            "Category": d["category"],
-            "Document": doc_name,
-            "Status": status
+            "ID": row["id"],
+            "Title": row["title"],
+            "Date": row["date"].strftime("%m/%d/%Y"),
+            "Days remaining": days_left if days_left >= 0 else f"Expired {abs(days_left)} days ago",
+            "Category": row["category"],
+            "Document": row["document"] or "None",
+            "Status": status_labels[row["status"]]
         })
     
     df = pd.DataFrame(deadlines_data)
@@ -537,35 +1332,135 @@ def view_deadlines():
     
     st.markdown(html_table, unsafe_allow_html=True)
     
-    # Chart of upcoming deadlines
-    st.markdown("<h3>Chart of Upcoming Deadlines</h3>", unsafe_allow_html=True)
+def timeline_end():
+    """How far ahead the timeline projects renewals"""
+    return datetime.now().date() + timedelta(days=365 * TIMELINE_RENEWAL_YEARS)
+
+def sorted_event_arrays(end, currency):
+    dates, categories, codes, costs = deadline_event_arrays(
+        st.session_state.deadlines, st.session_state.subscriptions, end, get_rate_table(), currency)
+    order = np.argsort(dates, kind="stable")
+    return dates[order], categories, codes[order], costs[order]
+
+def timeline_events(currency):
+    """Every deadline and projected renewal as arrays sorted by date, kept until the data changes"""
+    today = datetime.now().date()
+    key = (st.session_state.data_version, st.session_state.feed_cursor, currency, today)
+    cached = st.session_state.get("timeline_events")
     
-    upcoming_deadlines = [d for d in sorted_deadlines if d["date"] >= today][:10]  # Take the next 10
+    if cached is None or cached[0] != key:
+        cached = (key, sorted_event_arrays(timeline_end(), currency))
+        st.session_state.timeline_events = cached
     
-    if upcoming_deadlines:
-        df_chart = pd.DataFrame([
-            {
-                "Title": d["title"], 
-                "Date": d["date"], 
-                "Days remaining": (d["date"] - today).days
-            } for d in upcoming_deadlines
-        ])
-        
-        df_chart = df_chart.sort_values("Date")
-        
-        fig = px.bar(
-            df_chart, 
-            x="Title", 
-            y="Days remaining",
-            title="Days remaining to upcoming deadlines",
-            color="Days remaining",
-            color_continuous_scale=["#e74a3b", "#f6c23e", "#1cc88a"],
-            height=400
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+    return cached[1]
+
+def overload_max_cost(currency):
+    """OVERLOAD_MAX_COST_USD in currency, at today's rate"""
+    rates = get_rate_table()
+    today = np.array([np.datetime64(datetime.now().date(), "D")])
+    return float(rates.convert(np.array([OVERLOAD_MAX_COST_USD]), rates.currency_codes(["USD"], 1), currency,
+                               today)[0])
+
+def busy_periods(start, end):
+    """Overloaded periods of deadlines and renewals from start to end"""
+    currency = display_currency()
+    if end <= timeline_end():
+        dates, _, _, costs = timeline_events(currency)
     else:
-        st.info("There are no future deadlines to display in the chart.")
+        # Beyond the timeline, renewals are projected as far as this check needs
+        dates, _, _, costs = sorted_event_arrays(end, currency)
+    window = window_slice(dates, start, end)
+    return overload_periods(dates[window], costs[window], OVERLOAD_WINDOW_DAYS, OVERLOAD_MAX_DEADLINES,
+                            overload_max_cost(currency))
+
+def busy_period_warnings(periods):
+    currency = display_currency()
+    max_cost = overload_max_cost(currency)
+    for period in periods[:OVERLOAD_WARNINGS_SHOWN]:
+        dates = period["start"].strftime('%m/%d/%Y')
+        if period["end"] != period["start"]:
+            dates += f" to {period['end'].strftime('%m/%d/%Y')}"
+        reasons = []
+        if period["peak_events"] > OVERLOAD_MAX_DEADLINES:
+            reasons.append(f"up to {period['peak_events']} deadlines")
+        if period["peak_cost"] > max_cost:
+            reasons.append(f"up to {core.format_money(period['peak_cost'], currency)} of renewals")
+        text = f"⚠️ Busy period {dates}: {' and '.join(reasons)} within {OVERLOAD_WINDOW_DAYS} days"
+        if period["events"] > period["peak_events"]:
+            text += f" ({period['events']} deadlines and renewals in all)"
+        st.warning(text)
+    if len(periods) > OVERLOAD_WARNINGS_SHOWN:
+        st.caption(f"and {len(periods) - OVERLOAD_WARNINGS_SHOWN} more busy periods")
+
+@st.fragment
+def deadline_timeline():
+    """Every deadline and renewal over time; moving the window reruns only this chart"""
+    st.markdown("<h3>Timeline</h3>", unsafe_allow_html=True)
+    
+    currency = display_currency()
+    dates, categories, codes, costs = timeline_events(currency)
+    
+    if not len(dates):
+        st.info("There are no deadlines or renewals to display.")
+        return
+    
+    today = datetime.now().date()
+    first = min(dates[0].astype(object), today)
+    last = max(dates[-1].astype(object), today + timedelta(days=1))
+    
+    # A window from before the data changed may fall outside the new range
+    window = st.session_state.get("timeline_window")
+    if window is None or window[0] < first or window[1] > last:
+        st.session_state.timeline_window = (today, min(last, today + timedelta(days=TIMELINE_DEFAULT_DAYS)))
+    
+    start, end = st.slider("Window", min_value=first, max_value=last, format="MM/DD/YYYY", key="timeline_window")
+    
+    # Only the events in the window are grouped, as finely as the window allows
+    granularity = timeline_granularity(start, end)
+    view = window_slice(dates, start, end)
+    bucket_starts, counts, cost_sums = bucket_events(dates[view], codes[view], costs[view], len(categories),
+                                                     start, end, granularity)
+    
+    # One point per category and bucket with events
+    category_index, bucket_index = np.nonzero(counts)
+    dense = len(category_index) > TIMELINE_WEBGL_POINTS
+    colors = px.colors.qualitative.Set3
+    
+    fig = go.Figure()
+    for code in np.unique(category_index):
+        cells = bucket_index[category_index == code]
+        trace = dict(
+            x=bucket_starts[cells],
+            y=counts[code, cells],
+            customdata=cost_sums[code, cells],
+            name=categories[code],
+            marker_color=colors[code % len(colors)],
+            hovertemplate="%{x|%m/%d/%Y}<br>%{y} deadlines<br>" + core.CURRENCIES[currency]
+                          + "%{customdata:.2f}<extra>%{fullData.name}</extra>"
+        )
+        # Dense windows are drawn with WebGL, which keeps many points responsive
+        fig.add_trace(go.Scattergl(mode="markers", **trace) if dense else go.Bar(**trace))
+    
+    fig.update_layout(
+        barmode="stack",
+        height=400,
+        xaxis=dict(range=[start, end + timedelta(days=1)]),
+        yaxis_title=f"Deadlines per {granularity.lower()}",
+        dragmode="select"
+    )
+    
+    # Selecting a range on the chart zooms into it
+    def zoom_to_selection():
+        boxes = st.session_state.timeline_chart.selection.box
+        if boxes:
+            low, high = sorted(pd.Timestamp(x).date() for x in boxes[0]["x"])
+            low = min(max(low, first), last - timedelta(days=1))
+            st.session_state.timeline_window = (low, min(max(high, low + timedelta(days=1)), last))
+    
+    st.plotly_chart(fig, use_container_width=True, key="timeline_chart", on_select=zoom_to_selection,
+                    selection_mode="box")
+    st.caption(f"{int(counts.sum())} deadlines and renewals between {start.strftime('%m/%d/%Y')} and "
+               f"{end.strftime('%m/%d/%Y')}, grouped by {granularity.lower()}. Select a range to zoom in.")
 
 # 3. Subscription Module
 def add_subscription():
@@ -579,37 +1474,90 @@ def add_subscription():
         
     with col2:
         sub_renewal_date = st.date_input("Next renewal date", min_value=datetime.now().date())
-        sub_cost = st.number_input("Monthly cost ($)", min_value=0.0, step=0.01)
+        cost_col, currency_col = st.columns([2, 1])
+        with cost_col:
+            sub_cost = st.number_input("Monthly cost", min_value=0.0, step=0.01)
+        with currency_col:
+            sub_currency = st.selectbox("Currency", list(core.CURRENCIES),
+                                        index=list(core.CURRENCIES).index(display_currency()))
         
     sub_desc = st.text_area("Description", placeholder="Enter additional details...", height=100)
     
+    details = (sub_type, sub_renewal_date, sub_cost, sub_desc, sub_currency)
+    
     if st.button("Add Subscription"):
         if sub_name and sub_renewal_date:
-            subscription = {
-                "id": len(st.session_state.subscriptions) + 1,
-                "name": sub_name,
-                "type": sub_type,
-                "renewal_date": sub_renewal_date,
-                "cost": float(sub_cost),  # Ensure cost is a float
-                "description": sub_desc
-            }
-            
-            st.session_state.subscriptions.append(subscription)
-            
-            # Also add a deadline for the renewal
-            deadline = {
-                "id": len(st.session_state.deadlines) + 1,
-                "title": f"Renewal {sub_name}",
-                "date": sub_renewal_date,
-                "description": f"Subscription renewal '{sub_name}' - ${sub_cost}",
-                "category": "Subscriptions",
-                "subscription_id": subscription["id"]
-            }
-            st.session_state.deadlines.append(deadline)
-            
-            st.success(f"Subscription '{sub_name}' added successfully!")
+            # Offer to merge into a subscription that looks the same instead of adding another
+            duplicates = st.session_state.subscription_index.duplicates(sub_name, sub_desc)
+            if duplicates:
+                st.session_state.subscription_duplicates = [sub["id"] for sub, _ in duplicates]
+            else:
+                save_subscription(sub_name, details)
         else:
             st.error("Name and renewal date are required!")
+    
+    if st.session_state.get("subscription_duplicates"):
+        review_subscription_duplicates(sub_name, details)
+
+def save_subscription(sub_name, details, merge_into=None):
+    """Adds a subscription, or updates merge_into with its details"""
+    label = f"Add subscription '{sub_name}'" if merge_into is None else f"Update subscription '{merge_into['name']}'"
+    with undoable(label), stored_changes():
+        if merge_into is not None:
+            target, merge_into = merge_into, current_record("subscriptions", merge_into)
+            if merge_into is None:
+                st.warning(f"'{target['name']}' was deleted meanwhile, so '{sub_name}' was added as a new "
+                           "subscription.")
+        if merge_into is None:
+            # Also adds a deadline for the renewal
+            subscription, deadline = core.add_subscription(st.session_state, sub_name, *details)
+            removed_deadlines = []
+        else:
+            st.session_state.subscription_index.remove(merge_into)
+            subscription, removed_deadlines, deadline = core.merge_subscription(st.session_state, merge_into,
+                                                                                *details)
+            cancel_deadline_reminders(removed_deadlines)
+        st.session_state.subscription_index.add(subscription)
+        publish_change("add", "subscriptions", subscription, previous=merge_into)
+        for removed in removed_deadlines:
+            publish_change("remove", "deadlines", removed)
+        publish_change("add", "deadlines", deadline)
+        schedule_deadline_reminders(deadline)
+    
+    if merge_into is None:
+        st.success(f"Subscription '{sub_name}' added successfully!")
+    else:
+        st.success(f"Subscription '{subscription['name']}' updated with the new details!")
+
+def review_subscription_duplicates(sub_name, details):
+    """Asks whether a new subscription is one of the similar existing ones"""
+    index = st.session_state.subscription_index
+    matches = [sub_id for sub_id in st.session_state.subscription_duplicates if sub_id in index.records]
+    
+    def describe(sub_id):
+        if sub_id is None:
+            return "A new subscription"
+        sub = index.records[sub_id]
+        return (f"Merge into '{sub['name']}' ({core.format_money(sub['cost'], sub['currency'])}, "
+                f"renews {sub['renewal_date'].strftime('%m/%d/%Y')})")
+    
+    st.warning(f"'{sub_name}' looks like a subscription you already have. "
+               "Merging updates the existing one with the details above.")
+    merge_id = st.radio("Save as", [None] + matches, format_func=describe, key="subscription_merge_choice")
+    
+    # Saving in a callback lets the page rerun without this form
+    def save():
+        del st.session_state.subscription_duplicates
+        save_subscription(sub_name, details, index.records.get(merge_id))
+    
+    def cancel():
+        del st.session_state.subscription_duplicates
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("Save subscription", on_click=save)
+    with col2:
+        st.button("Cancel", key="cancel_subscription", on_click=cancel)
 
 def view_subscriptions():
     st.markdown("<h2>Your Subscriptions</h2>", unsafe_allow_html=True)
@@ -619,120 +1567,101 @@ def view_subscriptions():
         return
     
     # Display subscriptions in cards
-    # Ensure each subscription has a 'cost' key and it's a number
-    for sub in st.session_state.subscriptions:
-        if "cost" not in sub or not isinstance(sub["cost"], (int, float)):
-            sub["cost"] = 0.0
-            
-    total_monthly_cost = sum(sub["cost"] for sub in st.session_state.subscriptions)
+    # Ensure each subscription has a numeric cost, a currency and a valid renewal date
+    if any(core.subscription_repairs(sub) for sub in st.session_state.subscriptions):
+        with stored_changes():
+            for original, repaired in core.clean_subscriptions(st.session_state):
+                st.session_state.subscription_index.remove(original)
+                st.session_state.subscription_index.add(repaired)
+                publish_change("add", "subscriptions", repaired, previous=original)
+    
+    sorted_subs = sorted(st.session_state.subscriptions, key=lambda x: x["renewal_date"])
+    
+    # All costs converted at today's rates in one pass
+    currency = display_currency()
+    converted_costs = subscription_costs(sorted_subs, get_rate_table(), currency, datetime.now().date())
     
     st.markdown(f"""
     <div class="metric">
         <div class="metric-label">Total Monthly Cost</div>
-        <div class="metric-value">${total_monthly_cost:.2f}</div>
+        <div class="metric-value">{core.format_money(converted_costs.sum(), currency)}</div>
     </div>
     """, unsafe_allow_html=True)
     
-    # Verify that each subscription has a valid renewal_date before sorting
-    for sub in st.session_state.subscriptions:
-        # Always reset the renewal date for safety
-        try:
-            # Try to access the date, if it doesn't exist or is not valid, set a default
-            renewal_date = sub.get("renewal_date")
-            if renewal_date is None or not hasattr(renewal_date, "year"):
-                sub["renewal_date"] = datetime.now().date()
-        except:
-            # In case of any error, set a default date
-            sub["renewal_date"] = datetime.now().date()
-    
-    # Remove duplicates based on name
-    unique_subs = {}
-    for sub in st.session_state.subscriptions:
-        name = sub.get("name", "Unnamed Subscription")
-        unique_subs[name] = sub
-    
-    # Use only unique subscriptions
-    st.session_state.subscriptions = list(unique_subs.values())
-    
-    # Safe sorting
-    try:
-        sorted_subs = sorted(st.session_state.subscriptions, key=lambda x: x["renewal_date"])
-    except:
-        # If sorting fails, use the unsorted list
-        sorted_subs = st.session_state.subscriptions.copy()
-    
     # Display cards in a grid
     col1, col2 = st.columns(2)
     
-    for i, sub in enumerate(sorted_subs):
+    for i, (sub, converted_cost) in enumerate(zip(sorted_subs, converted_costs)):
         # Alternate columns
         with col1 if i % 2 == 0 else col2:
-            # Check safely if we can calculate days to renewal
-            try:
-                days_to_renewal = (sub["renewal_date"] - datetime.now().date()).days
-            except:
-                days_to_renewal = 0
-                
-            status_color = "#e74a3b" if days_to_renewal <= 3 else "#f6c23e" if days_to_renewal <= 7 else "#1cc88a"
-            
-            # Make sure name and other required fields are present
-            name = sub.get("name", "Unnamed Subscription")
-            sub_type = sub.get("type", "Not specified")
-            cost_value = sub.get("cost", 0)
-            description = sub.get("description", "")
-            
-            if not isinstance(cost_value, (int, float)):
-                cost_value = 0
-                
-            st.markdown(f"""
-            <div class="card" style="border-left: 5px solid {status_color};">
-                <h3>{name}</h3>
-                <p><strong>Type:</strong> {sub_type}</p>
-                <p><strong>Monthly cost:</strong> ${cost_value:.2f}</p>
-                <p><strong>Next renewal:</strong> {sub["renewal_date"].strftime('%m/%d/%Y')}</p>
-                <p><strong>Days to renewal:</strong> <span style="color: {status_color}; font-weight: bold;">{days_to_renewal}</span></p>
-                <p><strong>Description:</strong> {description}</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            # Get the name of the subscription safely
-            name = sub.get("name", "Unnamed Subscription")
-            sub_id = sub.get("id", 0)
-            
-            if st.button(f"Delete {name}", key=f"del_sub_{sub_id}_{name}"):
-                # Remove subscription
-                st.session_state.subscriptions.remove(sub)
-                # Remove any associated deadlines
-                st.session_state.deadlines = [d for d in st.session_state.deadlines if d.get('subscription_id') != sub['id']]
-                st.success(f"Subscription '{sub['name']}' deleted successfully!")
-                st.rerun()
-    
-    # Pie chart of subscription costs
+            subscription_card(sub, converted_cost)
+    
+    subscription_cost_chart(sorted_subs, converted_costs)
+
+def delete_subscription(sub):
+    # Remove the subscription, its renewal deadlines and their reminders
+    with undoable(f"Delete subscription '{sub['name']}'"), stored_changes():
+        removed_deadlines = core.remove_subscription(st.session_state, sub)
+        cancel_deadline_reminders(removed_deadlines)
+        st.session_state.subscription_index.remove(sub)
+        publish_change("remove", "subscriptions", sub)
+        for deadline in removed_deadlines:
+            publish_change("remove", "deadlines", deadline)
+
+@st.fragment
+def subscription_card(sub, converted_cost):
+    days_to_renewal = core.days_to_renewal(sub)
+        
+    status_color = "#e74a3b" if days_to_renewal <= 3 else "#f6c23e" if days_to_renewal <= 7 else "#1cc88a"
+    
+    # Make sure name and other required fields are present
+    name = sub.get("name", "Unnamed Subscription")
+    sub_type = sub.get("type", "Not specified")
+    cost_value = sub.get("cost", 0)
+    description = sub.get("description", "")
+    
+    if not isinstance(cost_value, (int, float)):
+        cost_value = 0
+    
+    cost_text = core.format_money(cost_value, sub["currency"])
+    if sub["currency"] != display_currency():
+        cost_text += f" (≈ {core.format_money(converted_cost, display_currency())})"
+        
+    st.markdown(f"""
+    <div class="card" style="border-left: 5px solid {status_color};">
+        <h3>{name}</h3>
+        <p><strong>Type:</strong> {sub_type}</p>
+        <p><strong>Monthly cost:</strong> {cost_text}</p>
+        <p><strong>Next renewal:</strong> {sub["renewal_date"].strftime('%m/%d/%Y')}</p>
+        <p><strong>Days to renewal:</strong> <span style="color: {status_color}; font-weight: bold;">{days_to_renewal}</span></p>
+        <p><strong>Description:</strong> {description}</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    sub_id = sub.get("id", 0)
+    
+    if st.button(f"Delete {name}", key=f"del_sub_{sub_id}_{name}"):
+        delete_subscription(sub)
+        st.success(f"Subscription '{name}' deleted successfully!")
+        # The total and the cost chart depend on every subscription
+        st.rerun(scope="app")
+
+@st.fragment
+def subscription_cost_chart(sorted_subs, converted_costs):
+    # Pie chart of subscription costs, in the display currency
     st.markdown("<h3>Distribution of Subscription Costs</h3>", unsafe_allow_html=True)
     
     if sorted_subs:
-        # For the pie chart, ensure all data is valid
-        valid_subs = []
-        for sub in sorted_subs:
-            if "cost" in sub and isinstance(sub["cost"], (int, float)):
-                # Make sure there's a valid name
-                if "name" not in sub or not sub["name"]:
-                    sub["name"] = "Unnamed Subscription"
-                valid_subs.append(sub)
+        fig = px.pie(
+            names=[sub["name"] for sub in sorted_subs],
+            values=converted_costs,
+            title=f"Monthly cost distribution ({display_currency()})",
+            hole=0.4,
+            color_discrete_sequence=px.colors.qualitative.Pastel
+        )
         
-        if valid_subs:
-            fig = px.pie(
-                names=[sub["name"] for sub in valid_subs],
-                values=[sub["cost"] for sub in valid_subs],
-                title="Monthly cost distribution",
-                hole=0.4,
-                color_discrete_sequence=px.colors.qualitative.Pastel
-            )
-            
-            fig.update_traces(textposition='inside', textinfo='percent+label')
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("There are no subscriptions with valid costs to display.")
+        fig.update_traces(textposition='inside', textinfo='percent+label')
+        st.plotly_chart(fig, use_container_width=True)
     else:
         st.info("There are no subscriptions to display.")
 
@@ -740,13 +1669,103 @@ def view_subscriptions():
 def generate_calendar():
     st.markdown("<h2>Calendar of Deadlines and Renewals</h2>", unsafe_allow_html=True)
     
+    calendar_grid()
+
+    year_heatmap()
+
+    # iCalendar export and import
+    st.markdown("<h3>Export and Import</h3>", unsafe_allow_html=True)
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        # The feed is only generated when the button is clicked
+        st.download_button("Export calendar (.ics)",
+                           data=functools.partial(export_ics_file,
+                                                  list(st.session_state.deadlines),
+                                                  list(st.session_state.subscriptions)),
+                           file_name="contractme.ics",
+                           mime="text/calendar",
+                           on_click="ignore")
+
+    with col2:
+        ics_file = st.file_uploader("Import deadlines from an .ics file", type=["ics"])
+
+        if ics_file and st.button("Import Deadlines"):
+            lines = (line.decode("utf-8", errors="replace") for line in ics_file)
+            # The whole file is read before anything is added, so a bad event cannot stop an import half way
+            skipped = []
+            events = list(parse_ics(lines, skipped))
+            with undoable(f"Import deadlines from {ics_file.name}"), stored_changes():
+                added = core.import_events(st.session_state, events)
+                for deadline in added:
+                    publish_change("add", "deadlines", deadline)
+                    schedule_deadline_reminders(deadline)
+            st.toast(f"{len(added)} deadlines imported!")
+            if skipped:
+                st.toast(f"{len(skipped)} invalid events were skipped: {'; '.join(skipped[:3])}"
+                         + ("..." if len(skipped) > 3 else ""))
+            st.rerun()
+
+def calendar_years():
+    return core.calendar_years(st.session_state.deadlines, st.session_state.subscriptions, datetime.now().year)
+
+@st.fragment
+def year_heatmap():
+    """GitHub-style map of deadline density and renewal costs over a whole year"""
+    st.markdown("<h3>Year at a Glance</h3>", unsafe_allow_html=True)
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        year_options = calendar_years()
+        year = st.selectbox("Year", year_options, index=year_options.index(datetime.now().year),
+                            key="heatmap_year")
+
+    with col2:
+        color_by = st.radio("Color by", ["Deadlines", "Cost"], horizontal=True, key="heatmap_color")
+
+    currency = display_currency()
+    dates, _, _, costs = deadline_event_arrays(st.session_state.deadlines, st.session_state.subscriptions,
+                                               datetime(year, 12, 31).date(), get_rate_table(), currency)
+    count_grid, cost_grid, label_grid = year_heatmap_grid(dates, costs, year)
+
+    # Month names at the week where each month starts
+    month_starts = np.arange(f"{year}-01", f"{year + 1}-01", dtype="datetime64[M]").astype("datetime64[D]")
+    first_cell = (np.datetime64(f"{year}-01-01", "D").astype(np.int64) + 3) % 7
+    month_weeks = ((month_starts - np.datetime64(f"{year}-01-01", "D")).astype(np.int64) + first_cell) // 7
+
+    fig = go.Figure(go.Heatmap(
+        z=count_grid if color_by == "Deadlines" else cost_grid,
+        customdata=np.dstack([label_grid, count_grid, cost_grid]),
+        hovertemplate="%{customdata[0]}<br>%{customdata[1]} deadlines<br>"
+                      + core.CURRENCIES[currency] + "%{customdata[2]:.2f}<extra></extra>",
+        y=["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
+        colorscale=[[0, "#ebedf0"], [0.01, "#c6f1e0"], [1, "#1cc88a"]] if color_by == "Deadlines"
+                   else [[0, "#ebedf0"], [0.01, "#fbe3a4"], [1, "#e74a3b"]],
+        xgap=3,
+        ygap=3,
+        showscale=True
+    ))
+    fig.update_layout(
+        height=250,
+        margin=dict(l=40, r=20, t=20, b=20),
+        xaxis=dict(tickmode="array", tickvals=month_weeks, ticktext=[calendar.month_abbr[m] for m in range(1, 13)],
+                   showgrid=False, zeroline=False),
+        yaxis=dict(autorange="reversed", showgrid=False, zeroline=False),
+        plot_bgcolor="white"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+@st.fragment
+def calendar_grid():
+    """Month selection and grid; browsing months reruns only this section"""
     # Month/year selection
     col1, col2 = st.columns(2)
     
     with col1:
-        current_year = datetime.now().year
-        year_options = list(range(current_year, current_year + 3))
-        selected_year = st.selectbox("Year", year_options)
+        year_options = calendar_years()
+        selected_year = st.selectbox("Year", year_options, index=year_options.index(datetime.now().year))
     
     with col2:
         month_options = list(range(1, 13))
@@ -757,30 +1776,30 @@ def generate_calendar():
     # Generate the calendar
     cal = calendar.monthcalendar(selected_year, selected_month)
     
-    # Get all events for the selected month
-    events = []
-    
-    # Add deadlines
-    for deadline in st.session_state.deadlines:
-        if deadline["date"].year == selected_year and deadline["date"].month == selected_month:
-            events.append({
-                "day": deadline["date"].day,
-                "title": deadline["title"],
-                "type": "deadline",
-                "id": deadline["id"],
-                "category": deadline["category"]
-            })
-    
-    # Add subscription renewals
-    for sub in st.session_state.subscriptions:
-        if sub["renewal_date"].year == selected_year and sub["renewal_date"].month == selected_month:
-            events.append({
-                "day": sub["renewal_date"].day,
-                "title": f"Renewal {sub.get('name', 'Unnamed')}",
-                "type": "subscription",
-                "id": sub.get("id", 0),
-                "cost": sub.get("cost", 0)
-            })
+    # Busy periods reaching into the month, from windows that may start or end outside it
+    month_start = datetime(selected_year, selected_month, 1).date()
+    month_end = month_start + timedelta(days=calendar.monthrange(selected_year, selected_month)[1] - 1)
+    window = timedelta(days=OVERLOAD_WINDOW_DAYS - 1)
+    periods = [p for p in busy_periods(month_start - window, month_end + window)
+               if p["start"] <= month_end and p["end"] >= month_start]
+    busy_days = {(p["start"] + timedelta(days=i)) for p in periods for i in range((p["end"] - p["start"]).days + 1)}
+    
+    # Get all events for the selected month, by day: the same deadlines and projected renewals as the busy days
+    events = core.month_events(st.session_state.deadlines, st.session_state.subscriptions,
+                               selected_year, selected_month)
+    
+    # Renewal costs in the display currency, at the rates of their dates, in one pass
+    currency = display_currency()
+    renewals = [(day, event) for day, day_events in events.items() for event in day_events
+                if event["type"] == "subscription"]
+    if renewals:
+        rates = get_rate_table()
+        days = np.array([day - 1 for day, _ in renewals]) + np.datetime64(f"{selected_year}-{selected_month:02d}-01")
+        amounts = np.array([event["cost"] if isinstance(event["cost"], (int, float)) else 0.0
+                            for _, event in renewals], dtype=np.float64)
+        codes = rates.currency_codes((event["currency"] for _, event in renewals), len(renewals))
+        for (_, event), cost in zip(renewals, rates.convert(amounts, codes, currency, days)):
+            event["display_cost"] = cost
     
     # Create calendar HTML directly
     week_days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
@@ -805,7 +1824,7 @@ def generate_calendar():
                 calendar_html += "<td></td>"
             else:
                 # Find events for this day
-                day_events = [e for e in events if e["day"] == day]
+                day_events = events.get(day, [])
                 
                 # Check if today
                 is_today = (datetime.now().day == day and 
@@ -813,8 +1832,10 @@ def generate_calendar():
                            datetime.now().year == selected_year)
                 
                 today_style = "background-color: #e8f4f8; font-weight: bold;"
+                busy_style = "background-color: #fdecea;"
+                is_busy = datetime(selected_year, selected_month, day).date() in busy_days
                 
-                calendar_html += f"<td style='{today_style if is_today else ''}'>"
+                calendar_html += f"<td style='{busy_style if is_busy else ''}{today_style if is_today else ''}'>"
                 calendar_html += f"<div class='calendar-day'>{day}</div>"
                 
                 # Add events
@@ -823,9 +1844,7 @@ def generate_calendar():
                     event_title = event["title"]
                     
                     if event["type"] == "subscription":
-                        cost = event.get("cost", 0)
-                        if isinstance(cost, (int, float)):
-                            event_title += f" - ${cost:.2f}"
+                        event_title += f" - {core.format_money(event['display_cost'], currency)}"
                     
                     calendar_html += f"<div class='{event_class}'>{event_title}</div>"
                 
@@ -841,42 +1860,50 @@ def generate_calendar():
     st.markdown("""
     <div style='margin-top: 20px;'>
         <span class='calendar-event' style='display: inline-block; margin-right: 10px;'>Subscription</span>
-        <span class='calendar-event urgent' style='display: inline-block;'>Deadline</span>
+        <span class='calendar-event urgent' style='display: inline-block; margin-right: 10px;'>Deadline</span>
+        <span style='display: inline-block; padding: 2px 5px; background-color: #fdecea;'>Busy period</span>
     </div>
     """, unsafe_allow_html=True)
+    
+    busy_period_warnings(periods)
 
 # 5. AI Assistant Module
 def ai_assistant():
     st.markdown("<h2>AI Assistant</h2>", unsafe_allow_html=True)
     
+    chat_pane()
+
+@st.fragment
+def chat_pane():
+    """Document picker and conversation; chatting reruns only this pane"""
     # Document selection
-    document_options = ["No document selected"] + [doc["name"] for doc in st.session_state.documents]
-    selected_doc_name = st.selectbox("Select a document to ask questions about", document_options)
-    
-    selected_doc = None
-    if selected_doc_name != "No document selected":
-        for doc in st.session_state.documents:
-            if doc["name"] == selected_doc_name:
-                selected_doc = doc
-                break
+    selected_doc = document_picker("Select a document to ask questions about", "chat_document",
+                                   "No document selected")
     
-    # Display chat history
+    conversation_key = selected_doc["id"] if selected_doc else None
+    conversation = get_conversation(conversation_key)
+    window_key = f"chat_window_{conversation_key}"
+
+    if window_key not in st.session_state:
+        st.session_state[window_key] = CHAT_WINDOW
+
+    # Display chat history, only the most recent window of it
     st.markdown("<h3>Chat History</h3>", unsafe_allow_html=True)
-    
-    for chat in st.session_state.chat_history:
-        if chat["role"] == "user":
-            st.markdown(f"""
-            <div class="chat-message chat-user">
-                <strong>You:</strong> {chat["content"]}
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown(f"""
-            <div class="chat-message chat-assistant">
-                <strong>AI Assistant:</strong> {chat["content"]}
-            </div>
-            """, unsafe_allow_html=True)
-    
+
+    hidden_count = max(len(conversation) - st.session_state[window_key], 0)
+
+    if hidden_count:
+        def show_earlier_messages():
+            st.session_state[window_key] += CHAT_WINDOW
+
+        st.button(f"Show earlier messages ({hidden_count} hidden)", on_click=show_earlier_messages)
+
+    for chat in itertools.islice(conversation, hidden_count, None):
+        render_chat_message(chat["role"], chat["content"])
+
+    # New messages are streamed here, below the history
+    live_chat = st.container()
+
     # User input
     user_input = st.text_input("Type your question...")
     
@@ -886,74 +1913,79 @@ def ai_assistant():
         if st.button("Send Question"):
             if user_input:
                 # Add the question to the chat
-                st.session_state.chat_history.append({
+                conversation.append({
                     "role": "user",
                     "content": user_input
                 })
-                
-                # Generate a simulated AI response
-                ai_response = simulate_ai_response(user_input, selected_doc)
-                
+
+                with live_chat:
+                    render_chat_message("user", user_input)
+
+                    # Stream the AI response as it is produced
+                    placeholder = st.empty()
+                    ai_response = ""
+                    try:
+                        for token in stream_ai_response(user_input, selected_doc):
+                            ai_response += token
+                            render_chat_message("assistant", ai_response + "▌", placeholder)
+                    except InferenceError as e:
+                        st.error(f"The AI assistant could not answer: {e}")
+
+                    if ai_response:
+                        render_chat_message("assistant", ai_response, placeholder)
+                    else:
+                        placeholder.empty()
+
                 # Add the response to the chat
-                st.session_state.chat_history.append({
-                    "role": "assistant",
-                    "content": ai_response
-                })
-                
-                st.rerun()
+                if ai_response:
+                    conversation.append({
+                        "role": "assistant",
+                        "content": ai_response
+                    })
     
     with col2:
-        if st.button("Clear Chat"):
-            st.session_state.chat_history = []
+        # Clearing in a callback empties the history before this pane reruns
+        def clear_chat():
+            conversation.clear()
+            st.session_state[window_key] = CHAT_WINDOW
+
+        if st.button("Clear Chat", on_click=clear_chat):
             st.success("Chat history cleared!")
-            st.rerun()
 
-def simulate_ai_response(user_input, doc):
-    """Simulates an AI response based on the selected document"""
-    
-    # Predefined responses to simulate AI
-    general_responses = [
-        "I can help you manage your documents and deadlines. What would you like to know?",
-        "This is a simulated assistant. In a complete version, I could analyze your documents and provide more relevant responses.",
-        "I don't have access to a real language model. This is a response simulation.",
-        "To get more detailed information, you should connect a real AI model to this app."
-    ]
-    
-    document_responses = [
-        f"I've examined the document '{doc['name']}'. What specifically would you like to know?",
-        f"The document '{doc['name']}' is in the '{doc['category']}' category. I can help you interpret it.",
-        f"This document was uploaded on {doc['upload_date'].strftime('%m/%d/%Y')}. How can I help you?",
-        f"I'm analyzing '{doc['name']}'. Remember this is a simulated AI assistant."
-    ]
-    
-    # Specific responses based on keywords in the question
-    if "deadline" in user_input.lower() or "expiry" in user_input.lower() or "renewal" in user_input.lower():
-        if doc and doc.get("expiry_date"):
-            return f"The deadline for '{doc['name']}' is set for {doc['expiry_date'].strftime('%m/%d/%Y')}."
-        else:
-            return "I couldn't find any deadline information in the selected document."
-    
-    elif "content" in user_input.lower() or "what" in user_input.lower() and "says" in user_input.lower():
-        if doc and doc["type"] == "text":
-            preview = doc["preview"]
-            # Limit the response length
-            if len(preview) > 300:
-                preview = preview[:300] + "..."
-            return f"Here's an excerpt from the document: \n\n{preview}"
-        else:
-            return "I can't extract text content from this type of document."
-    
-    elif "category" in user_input.lower():
-        if doc:
-            return f"The document '{doc['name']}' belongs to the '{doc['category']}' category."
-        else:
-            return "You haven't selected a document."
-    
-    # Random responses
-    if doc:
-        return random.choice(document_responses)
+def get_conversation(conversation_key):
+    """Returns the capped message history of a document conversation"""
+    history = st.session_state.chat_history
+    if conversation_key not in history:
+        history[conversation_key] = deque(maxlen=CHAT_HISTORY_LIMIT)
+    return history[conversation_key]
+
+def render_chat_message(role, content, container=st):
+    content_html = html.escape(content).replace('\n', '<br>')
+    if role == "user":
+        container.markdown(f"""
+        <div class="chat-message chat-user">
+            <strong>You:</strong> {content_html}
+        </div>
+        """, unsafe_allow_html=True)
     else:
-        return random.choice(general_responses)
+        container.markdown(f"""
+        <div class="chat-message chat-assistant">
+            <strong>AI Assistant:</strong> {content_html}
+        </div>
+        """, unsafe_allow_html=True)
+
+def stream_ai_response(user_input, doc):
+    """Yields the AI response as the backend produces it"""
+    return get_inference_runner().stream(user_input, doc)
+
+@st.cache_resource
+def get_inference_runner():
+    """Shared by all sessions, so cached answers serve every user"""
+    if AI_MODEL_SERVER_URL:
+        backend = LocalModelServerBackend(AI_MODEL_SERVER_URL, AI_MODEL_NAME, AI_BACKEND_TIMEOUT)
+    else:
+        backend = LocalStubBackend()
+    return InferenceRunner(backend, AnswerCache(AI_ANSWER_CACHE_SIZE), AI_BACKEND_TIMEOUT)
 
 # 6. Dashboard
 def dashboard():
@@ -963,21 +1995,19 @@ def dashboard():
     col1, col2, col3, col4 = st.columns(4)
     
     # Calculate metrics
-    total_docs = len(st.session_state.documents)
+    index = st.session_state.document_index
+    total_docs = len(index)
     
     # Documents uploaded in the last 7 days
     today = datetime.now().date()
     week_ago = today - timedelta(days=7)
-    docs_last_week = sum(1 for doc in st.session_state.documents if doc["upload_date"] >= week_ago)
+    docs_last_week = len(index.uploaded_between(week_ago))
     
     # Number of categories used
-    used_categories = set()
-    for doc in st.session_state.documents:
-        used_categories.add(doc["category"])
+    used_categories = index.by_category
     
     # Upcoming deadlines
-    week_later = today + timedelta(days=7)
-    upcoming_deadlines = sum(1 for d in st.session_state.deadlines if today <= d["date"] <= week_later)
+    upcoming_deadlines = len(core.filter_deadlines(st.session_state.deadlines, "Next 7 days", today))
     
     # Display metrics
     with col1:
@@ -1012,75 +2042,27 @@ def dashboard():
         </div>
         """, unsafe_allow_html=True)
     
+    # Latest reminders fired by the scheduler
+    reminders = get_reminder_inbox().recent(st.session_state.data_file)
+    if reminders:
+        st.markdown("<h3>Reminders</h3>", unsafe_allow_html=True)
+        for reminder in reversed(reminders[-5:]):
+            st.warning(f"🔔 {reminder_text(reminder)}")
+    
+    # Weeks where many deadlines or renewal costs pile up
+    periods = busy_periods(today, today + timedelta(days=OVERLOAD_HORIZON_DAYS))
+    if periods:
+        st.markdown("<h3>Busy Periods</h3>", unsafe_allow_html=True)
+        busy_period_warnings(periods)
+    
     # Charts
     col1, col2 = st.columns(2)
     
     with col1:
-        st.markdown("<h3>Document Distribution by Category</h3>", unsafe_allow_html=True)
-        
-        if st.session_state.documents:
-            # Count documents by category
-            category_counts = {}
-            for doc in st.session_state.documents:
-                category = doc["category"]
-                if category in category_counts:
-                    category_counts[category] += 1
-                else:
-                    category_counts[category] = 1
-            
-            # Create chart
-            fig = px.pie(
-                names=list(category_counts.keys()),
-                values=list(category_counts.values()),
-                title="Documents by Category",
-                hole=0.4,
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            
-            fig.update_traces(textposition='inside', textinfo='percent+label')
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("You haven't uploaded any documents yet. The chart will appear when you add documents.")
+        documents_by_category_chart()
     
     with col2:
-        st.markdown("<h3>Upcoming Deadlines</h3>", unsafe_allow_html=True)
-        
-        if st.session_state.deadlines:
-            # Upcoming deadlines sorted by date
-            upcoming = sorted([d for d in st.session_state.deadlines if d["date"] >= today], 
-                              key=lambda x: x["date"])[:10]  # Show the next 10
-            
-            if upcoming:
-                deadline_data = []
-                for d in upcoming:
-                    days_left = (d["date"] - today).days
-                    deadline_data.append({
-                        "Title": d["title"] if len(d["title"]) <= 20 else d["title"][:17] + "...",
-                        "Days": days_left,
-                        "Date": d["date"].strftime("%m/%d/%Y")
-                    })
-                
-                df = pd.DataFrame(deadline_data)
-                
-                # Create horizontal bar chart
-                fig = px.bar(
-                    df,
-                    y="Title",
-                    x="Days",
-                    orientation='h',
-                    title="Days remaining to upcoming deadlines",
-                    color="Days",
-                    color_continuous_scale=["#e74a3b", "#f6c23e", "#1cc88a"],
-                    text="Date",
-                    labels={"Title": "", "Days": "Days remaining"}
-                )
-                
-                fig.update_layout(yaxis={'categoryorder': 'total ascending'})
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("There are no future deadlines.")
-        else:
-            st.info("You haven't added any deadlines yet. The chart will appear when you add deadlines.")
+        dashboard_deadlines_chart()
     
     # Recent documents and upcoming deadlines
     col1, col2 = st.columns(2)
@@ -1112,8 +2094,7 @@ def dashboard():
         
         if st.session_state.deadlines:
             # Next 5 deadlines
-            next_deadlines = sorted([d for d in st.session_state.deadlines if d["date"] >= today], 
-                                    key=lambda x: x["date"])[:5]
+            next_deadlines = core.upcoming_deadlines(st.session_state.deadlines, today, limit=5)
             
             if next_deadlines:
                 for deadline in next_deadlines:
@@ -1134,11 +2115,167 @@ def dashboard():
         else:
             st.info("You haven't added any deadlines yet.")
 
+@st.fragment
+def documents_by_category_chart():
+    st.markdown("<h3>Document Distribution by Category</h3>", unsafe_allow_html=True)
+    
+    if st.session_state.documents:
+        # Count documents by category
+        category_counts = st.session_state.document_index.category_counts()
+        
+        # Create chart
+        fig = px.pie(
+            names=list(category_counts.keys()),
+            values=list(category_counts.values()),
+            title="Documents by Category",
+            hole=0.4,
+            color_discrete_sequence=px.colors.qualitative.Set3
+        )
+        
+        fig.update_traces(textposition='inside', textinfo='percent+label')
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("You haven't uploaded any documents yet. The chart will appear when you add documents.")
+
+@st.fragment
+def dashboard_deadlines_chart():
+    today = datetime.now().date()
+
+    st.markdown("<h3>Upcoming Deadlines</h3>", unsafe_allow_html=True)
+    
+    if st.session_state.deadlines:
+        # Upcoming deadlines sorted by date
+        upcoming = core.upcoming_deadlines(st.session_state.deadlines, today, limit=10)  # Show the next 10
+        
+        if upcoming:
+            deadline_data = []
+            for d in upcoming:
+                days_left = (d["date"] - today).days
+                deadline_data.append({
+                    "Title": d["title"] if len(d["title"]) <= 20 else d["title"][:17] + "...",
+                    "Days": days_left,
+                    "Date": d["date"].strftime("%m/%d/%Y")
+                })
+            
+            df = pd.DataFrame(deadline_data)
+            
+            # Create horizontal bar chart
+            fig = px.bar(
+                df,
+                y="Title",
+                x="Days",
+                orientation='h',
+                title="Days remaining to upcoming deadlines",
+                color="Days",
+                color_continuous_scale=STATUS_COLOR_SCALE,
+                text="Date",
+                labels={"Title": "", "Days": "Days remaining"}
+            )
+            
+            fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("There are no future deadlines.")
+    else:
+        st.info("You haven't added any deadlines yet. The chart will appear when you add deadlines.")
+
+# 7. Analytics
+@st.fragment
+def deadline_analytics():
+    """Histograms of deadlines and renewal costs; changing the controls reruns only this page"""
+    if not st.session_state.deadlines and not st.session_state.subscriptions:
+        st.info("You haven't added any deadlines or subscriptions yet. The analytics will appear when you add them.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        granularity = st.radio("Group by", ["Week", "Month"], horizontal=True)
+
+    with col2:
+        horizon_years = st.selectbox("Period", [1, 2, 3, 5], index=2,
+                                     format_func=lambda y: f"Next {y} year{'s' if y > 1 else ''}")
+
+    today = datetime.now().date()
+    end = today + timedelta(days=365 * horizon_years)
+
+    currency = display_currency()
+    dates, categories, codes, costs = deadline_event_arrays(
+        st.session_state.deadlines, st.session_state.subscriptions, end, get_rate_table(), currency)
+
+    with col3:
+        selected_categories = st.multiselect("Categories", list(categories))
+
+    if selected_categories:
+        keep = np.isin(codes, np.searchsorted(categories, selected_categories))
+        dates, codes, costs = dates[keep], codes[keep], costs[keep]
+
+    bucket_starts, counts, cost_sums = bucket_events(dates, codes, costs, len(categories), today, end, granularity)
+
+    # Long format for plotting, built without looping over buckets
+    n_buckets = len(bucket_starts)
+    df = pd.DataFrame({
+        "Period": np.tile(bucket_starts, len(categories)),
+        "Category": np.repeat(categories, n_buckets),
+        "Deadlines": counts.ravel(),
+        "Cost": cost_sums.ravel()
+    })
+
+    total_cost = cost_sums.sum()
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown(f"""
+        <div class="metric">
+            <div class="metric-value">{int(counts.sum())}</div>
+            <div class="metric-label">Deadlines and renewals in the period</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    with col2:
+        st.markdown(f"""
+        <div class="metric">
+            <div class="metric-value">{core.format_money(total_cost, currency)}</div>
+            <div class="metric-label">Subscription costs due in the period</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+    st.markdown(f"<h3>Deadlines per {granularity.lower()}</h3>", unsafe_allow_html=True)
+
+    fig = px.bar(
+        df[df["Deadlines"] > 0],
+        x="Period",
+        y="Deadlines",
+        color="Category",
+        color_discrete_sequence=px.colors.qualitative.Set3,
+        height=400
+    )
+    fig.update_layout(barmode="stack", bargap=0.1)
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown(f"<h3>Subscription costs per {granularity.lower()}</h3>", unsafe_allow_html=True)
+
+    df_cost = pd.DataFrame({"Period": bucket_starts, "Cost": cost_sums.sum(axis=0)})
+
+    fig = px.bar(
+        df_cost,
+        x="Period",
+        y="Cost",
+        color="Cost",
+        # Highest costs in the most urgent color
+        color_continuous_scale=STATUS_COLOR_SCALE[::-1],
+        labels={"Cost": f"Cost ({currency})"},
+        height=400
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
 # Application main
 def main():
     # Initialization
     load_css()
     init_session_state()
+    sync_session_data()
+    archive_expired_documents()
     
     # Creating sidebar for navigation
     page = create_sidebar()
@@ -1149,18 +2286,23 @@ def main():
     
     elif page == "Documents":
         st.markdown("<h1>Document Management</h1>", unsafe_allow_html=True)
+        focused_item(page)
         
         # Tab for upload or view
-        tab1, tab2 = st.tabs(["Upload Documents", "View Documents"])
+        tab1, tab2, tab3 = st.tabs(["Upload Documents", "View Documents", "Archive"])
         
         with tab1:
             upload_document()
         
         with tab2:
             view_documents()
+        
+        with tab3:
+            view_archive()
     
     elif page == "Deadlines":
         st.markdown("<h1>Deadline Management</h1>", unsafe_allow_html=True)
+        focused_item(page)
         
         # Tab for add or view
         tab1, tab2 = st.tabs(["Add Deadline", "View Deadlines"])
@@ -1173,6 +2315,7 @@ def main():
     
     elif page == "Subscriptions":
         st.markdown("<h1>Subscription Management</h1>", unsafe_allow_html=True)
+        focused_item(page)
         
         # Tab for add or view
         tab1, tab2 = st.tabs(["Add Subscription", "View Subscriptions"])
@@ -1187,9 +2330,16 @@ def main():
         st.markdown("<h1>Calendar</h1>", unsafe_allow_html=True)
         generate_calendar()
     
+    elif page == "Analytics":
+        st.markdown("<h1>Deadline Analytics</h1>", unsafe_allow_html=True)
+        deadline_analytics()
+    
     elif page == "AI Assistant":
         st.markdown("<h1>AI Assistant</h1>", unsafe_allow_html=True)
         ai_assistant()
+    
+    # Keeps the page current with changes made in other sessions
+    live_updates(page)
 
 if __name__ == '__main__':
     main()
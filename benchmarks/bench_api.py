@@ -0,0 +1,85 @@
+"""Load-tests the local HTTP API with many concurrent keep-alive clients.
+
+Run from the repository root:
+
+    python benchmarks/bench_api.py [clients] [requests per client]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contractme.api import Api, serve_connection  # noqa: E402
+
+
+async def request(reader, writer, method, path, body=None):
+    payload = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+                 + payload)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.lower()] = value.strip()
+
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int(await reader.readline(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers["content-length"]))
+    return status
+
+
+async def client(port, n_requests, latencies, writer_client):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for i in range(n_requests):
+        started = time.perf_counter()
+        if writer_client and i % 5 == 0:
+            items = [{"title": f"Load {i}-{j}", "date": "2030-01-01"} for j in range(50)]
+            status = await request(reader, writer, "POST", "/deadlines/batch", {"items": items})
+        elif i % 10 == 9:
+            status = await request(reader, writer, "GET", "/deadlines?format=ndjson")
+        else:
+            status = await request(reader, writer, "GET", f"/deadlines?offset={i * 10}&limit=50")
+        assert status in (200, 201), status
+        latencies.append(time.perf_counter() - started)
+    writer.close()
+
+
+async def main():
+    n_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        api = Api(os.path.join(tmp, "data.json"))
+        server = await asyncio.start_server(lambda r, w: serve_connection(api, r, w), "127.0.0.1", 0,
+                                            backlog=1024)
+        port = server.sockets[0].getsockname()[1]
+
+        latencies = []
+        started = time.perf_counter()
+        await asyncio.gather(*(client(port, n_requests, latencies, i < 5) for i in range(n_clients)))
+        elapsed = time.perf_counter() - started
+        server.close()
+
+    latencies.sort()
+    print(f"{n_clients} clients x {n_requests} requests in {elapsed:.2f} s "
+          f"({len(latencies) / elapsed:.0f} requests/s)")
+    for p in (50, 95, 99):
+        print(f"p{p}  {latencies[int(len(latencies) * p / 100) - 1] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""Benchmarks duplicate detection against 100k existing subscriptions.
+
+Run from the repository root:
+
+    python benchmarks/bench_duplicates.py [records]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contractme.index import DuplicateIndex  # noqa: E402
+
+SYLLABLES = [consonant + vowel for consonant in "bcdfghklmnprstvwz" for vowel in "aeiouy"] + ["x", "n", "r", "st"]
+PLANS = ["", "", "", " Premium", " Family", " Pro", " Basic", " Plus", " Annual"]
+
+
+def make_name(rng):
+    stem = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+    return f"{stem}{rng.choice(PLANS)} {rng.randint(1, 999)}"
+
+
+def main():
+    n_records = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(7)
+    records = [
+        {"id": i + 1, "name": make_name(rng), "description": f"Plan paid from account {rng.randint(1, 50)}"}
+        for i in range(n_records)
+    ]
+
+    started = time.perf_counter()
+    index = DuplicateIndex(records)
+    print(f"index    {time.perf_counter() - started:8.2f} s for {n_records} records")
+
+    # Near copies of existing names, then names unlike any of them
+    queries = [rng.choice(records)["name"] + " " for _ in range(500)]
+    queries += [rng.choice(records)["name"].replace("e", "a", 1) for _ in range(500)]
+    queries += [f"Unrelated service {i}" for i in range(500)]
+
+    timings = []
+    found = 0
+    for name in queries:
+        started = time.perf_counter()
+        found += bool(index.duplicates(name))
+        timings.append(time.perf_counter() - started)
+
+    timings.sort()
+    print(f"{len(queries)} lookups, {found} with likely duplicates")
+    for p in (50, 95, 99):
+        print(f"p{p}  {timings[int(len(timings) * p / 100) - 1] * 1000:8.2f} ms")
+
+    # The same check by comparing with every record
+    started = time.perf_counter()
+    grams = index.names.grams
+    query = next(iter(grams.values()))
+    sum(2 * len(query & other) / (len(query) + len(other)) >= 0.6 for other in grams.values())
+    print(f"pairwise {(time.perf_counter() - started) * 1000:8.2f} ms for one lookup")
+
+
+if __name__ == "__main__":
+    main()
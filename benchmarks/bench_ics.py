@@ -0,0 +1,96 @@
+"""Benchmarks the streaming iCalendar export and import at 50k events,
+and creating deadlines from the imported events.
+
+Run from the repository root:
+
+    python benchmarks/bench_ics.py [events]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contractme import core  # noqa: E402
+from contractme.ics import parse_ics, write_ics  # noqa: E402
+from contractme.store import empty_data  # noqa: E402
+
+
+def make_data(n_events):
+    start = date.today()
+    n_subscriptions = n_events // 10
+    deadlines = [
+        {
+            "id": i + 1,
+            "title": f"Deadline {i}, contract #{i % 97}",
+            "date": start + timedelta(days=i % 1500),
+            "description": f"Generated deadline {i}; see the attached document",
+            "category": ["Home", "Work", "Health", "Finance"][i % 4],
+            "document_id": None,
+        }
+        for i in range(n_events - n_subscriptions)
+    ]
+    subscriptions = [
+        {
+            "id": i + 1,
+            "name": f"Service {i}",
+            "type": "Software",
+            "renewal_date": start + timedelta(days=i % 365),
+            "cost": 9.99,
+            "description": "",
+        }
+        for i in range(n_subscriptions)
+    ]
+    return deadlines, subscriptions
+
+
+def measure(label, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+
+    # Second run for memory, since tracing slows the code down
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<8} {elapsed:8.2f} s  peak {peak / (1024 * 1024):7.2f} MB")
+    return result
+
+
+def main():
+    n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    deadlines, subscriptions = make_data(n_events)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.ics")
+
+        def export():
+            with open(path, "wb") as f:
+                write_ics(f, deadlines, subscriptions)
+
+        def parse():
+            count = 0
+            with open(path, encoding="utf-8", newline="") as f:
+                for _ in parse_ics(f):
+                    count += 1
+            return count
+
+        print(f"{n_events} events")
+        measure("export", export)
+        print(f"file size {os.path.getsize(path) / (1024 * 1024):.2f} MB")
+        parsed = measure("import", parse)
+        assert parsed == n_events, parsed
+
+        with open(path, encoding="utf-8", newline="") as f:
+            events = list(parse_ics(f))
+        # Each run creates the deadlines in empty data, so none is skipped as imported before
+        created = measure("create", lambda: len(core.import_events(empty_data(), events)))
+        assert created == n_events, created
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Benchmarks the search for overloaded periods over 100k deadlines and renewals.
+
+Run from the repository root:
+
+    python benchmarks/bench_overload.py [events]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contractme.analytics import overload_periods  # noqa: E402
+
+# Thresholds near the average week at 100k events, so that many separate periods are found
+WINDOW_DAYS = 7
+MAX_EVENTS = 205
+MAX_COST = 1700.0
+
+
+def main():
+    n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = np.random.default_rng(7)
+    # Ten years of events; a quarter of them renewals with a cost
+    dates = np.sort(np.datetime64("2025-01-01") + rng.integers(0, 3650, n_events))
+    costs = np.where(rng.random(n_events) < 0.25, rng.uniform(5, 60, n_events).round(2), 0.0)
+
+    timings = []
+    for _ in range(20):
+        started = time.perf_counter()
+        periods = overload_periods(dates, costs, WINDOW_DAYS, MAX_EVENTS, MAX_COST)
+        timings.append(time.perf_counter() - started)
+    print(f"{n_events} events, {len(periods)} overloaded periods")
+    print(f"sweep    {min(timings) * 1000:8.2f} ms")
+
+    # Sorting is part of the O(n log n) cost when the dates do not come sorted
+    shuffled = rng.permutation(dates)
+    started = time.perf_counter()
+    order = np.argsort(shuffled, kind="stable")
+    overload_periods(shuffled[order], costs[order], WINDOW_DAYS, MAX_EVENTS, MAX_COST)
+    print(f"sort+sweep {(time.perf_counter() - started) * 1000:6.2f} ms")
+
+    # The same check by comparing every event with every other, on a sample
+    sample = dates[:5000].astype(np.int64)
+    started = time.perf_counter()
+    in_window = (sample[None, :] >= sample[:, None]) & (sample[None, :] < sample[:, None] + WINDOW_DAYS)
+    in_window.sum(axis=1)
+    print(f"pairwise {(time.perf_counter() - started) * 1000:8.2f} ms for {len(sample)} events")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmarks the sidebar search over 100k documents, deadlines and subscriptions.
+
+Run from the repository root:
+
+    python benchmarks/bench_search.py [records per collection]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contractme.index import TITLE_FIELDS, SearchIndex, search_all  # noqa: E402
+
+SYLLABLES = [consonant + vowel for consonant in "bcdfghklmnprstvwz" for vowel in "aeiouy"] + ["x", "n", "r", "st"]
+KINDS = ["Contract", "Invoice", "Lease", "Policy", "Receipt", "Statement", "Warranty", "Premium", "Plan"]
+VOCABULARY_SIZE = 20_000  # Distinct words in the titles, besides the kinds and years
+
+
+def make_vocabulary(rng):
+    return ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+            for _ in range(VOCABULARY_SIZE)]
+
+
+def make_title(rng, vocabulary):
+    words = rng.sample(vocabulary, rng.randint(1, 3))
+    return f"{rng.choice(KINDS)} {' '.join(words)} {rng.randint(2000, 2030)}"
+
+
+def main():
+    n_records = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(7)
+    vocabulary = make_vocabulary(rng)
+
+    started = time.perf_counter()
+    indexes = {
+        collection: SearchIndex(field, ({"id": i + 1, field: make_title(rng, vocabulary)} for i in range(n_records)))
+        for collection, field in TITLE_FIELDS.items()
+    }
+    print(f"index    {time.perf_counter() - started:8.2f} s for {n_records} records per collection")
+
+    titles = list(indexes["documents"].titles.values())
+    queries = []
+    for _ in range(300):
+        title = rng.choice(titles).lower()
+        queries.append(title[:rng.randint(1, 8)])  # Typing the start
+        queries.append(" ".join(word[:3] for word in title.split()[1:3]))  # Word starts
+        queries.append(title.split()[1][:-1] + "x")  # A typo
+    queries += ["contract", "c", "zzz"]
+
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        search_all(indexes, query)
+        timings.append(time.perf_counter() - started)
+
+    timings.sort()
+    print(f"{len(queries)} searches")
+    for p in (50, 95, 99, 100):
+        print(f"p{p:<3} {timings[max(int(len(timings) * p / 100) - 1, 0)] * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
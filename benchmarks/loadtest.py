@@ -0,0 +1,227 @@
+"""Load-tests the Streamlit app with many concurrent sessions.
+
+Worker processes each drive a share of the sessions with AppTest, taking
+turns step by step like the sessions of one server would. Every session
+follows the same scripted flow: it uploads documents, adds a
+subscription, pages through the calendar and chats with the assistant.
+For each number of sessions the run reports throughput, rerun latency
+percentiles and the memory each session adds.
+
+Run from the repository root:
+
+    python benchmarks/loadtest.py --sessions 1 5 10 20 [--workers 4] [--rounds 2] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import string
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RERUN_TIMEOUT = 60  # Seconds a single rerun may take before the session fails
+CALENDAR_MONTHS = ["January", "February", "March"]
+
+
+def app():
+    """The app as AppTest runs it, plus a hook to upload files without the browser"""
+    import io
+
+    import streamlit as st
+
+    import FintechApp
+
+    class Upload(io.BytesIO):
+        """Stand-in for an UploadedFile"""
+
+        def __init__(self, name, data):
+            super().__init__(data)
+            self.name = name
+            self.size = len(data)
+            self.file_id = name
+
+    FintechApp.init_session_state()
+    uploads = st.session_state.pop("loadtest_uploads", None)
+    if uploads:
+        FintechApp.store_uploads([Upload(name, data) for name, data in uploads], "", "Work", None)
+    FintechApp.main()
+
+
+def rss_mb():
+    """Resident memory of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        # Peak rather than current memory, where /proc is missing
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def random_word(rng, length=8):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length)).capitalize()
+
+
+def session_flow(rng):
+    """The steps of one round, as (name, action) pairs acting on an AppTest"""
+
+    def navigate(page):
+        return lambda at: at.sidebar.radio(key="nav").set_value(page)
+
+    def upload(at):
+        navigate("Documents")(at)
+        # Random names, so the uploads of different sessions do not look like duplicates
+        at.session_state["loadtest_uploads"] = [
+            (f"{random_word(rng)} {random_word(rng)}.txt", ("Clause %d\n" % i * 200).encode())
+            for i in range(2)
+        ]
+
+    def add_subscription(at):
+        next(t for t in at.text_input if t.label == "Subscription Name").set_value(random_word(rng, 12))
+        next(n for n in at.number_input if n.label == "Monthly cost").set_value(round(rng.uniform(1, 50), 2))
+        next(b for b in at.button if b.label == "Add Subscription").click()
+
+    def calendar_month(month):
+        def action(at):
+            next(s for s in at.selectbox if s.label == "Month").set_value(month)
+        return action
+
+    def ask(at):
+        next(t for t in at.text_input if t.label == "Type your question...").set_value("When does it expire?")
+        next(b for b in at.button if b.label == "Send Question").click()
+
+    return (
+        [("upload", upload), ("subscriptions", navigate("Subscriptions")), ("add subscription", add_subscription),
+         ("calendar", navigate("Calendar"))]
+        + [("calendar month", calendar_month(month)) for month in CALENDAR_MONTHS]
+        + [("assistant", navigate("AI Assistant")), ("chat", ask), ("dashboard", navigate("Dashboard"))]
+    )
+
+
+def run_worker(worker, n_sessions, rounds, seed):
+    """Drives n_sessions sessions in this process; returns their latencies and memory"""
+    from streamlit.testing.v1 import AppTest
+
+    # Deprecation warnings would repeat on every rerun of every session
+    logging.disable(logging.WARNING)
+    rng = random.Random(seed * 1000 + worker)
+
+    # Load the app's modules before measuring the memory sessions add
+    AppTest.from_function(app, default_timeout=RERUN_TIMEOUT).run()
+    baseline = rss_mb()
+
+    latencies = defaultdict(list)
+    failures = []
+    started = time.perf_counter()
+
+    sessions = [AppTest.from_function(app, default_timeout=RERUN_TIMEOUT) for _ in range(n_sessions)]
+    for at in sessions:
+        step_started = time.perf_counter()
+        at.run()
+        latencies["load"].append(time.perf_counter() - step_started)
+
+    # Round-robin: each session takes its next step in turn
+    flows = [session_flow(rng) * rounds for _ in sessions]
+    for step in range(len(flows[0])):
+        for session, (at, flow) in enumerate(zip(sessions, flows)):
+            name, action = flow[step]
+            step_started = time.perf_counter()
+            try:
+                action(at)
+                at.run()
+            except Exception as e:
+                failures.append(f"session {worker}.{session} {name}: {e!r}")
+                continue
+            latencies[name].append(time.perf_counter() - step_started)
+            if at.exception:
+                failures.append(f"session {worker}.{session} {name}: {at.exception[0].message}")
+
+    return {
+        "latencies": dict(latencies),
+        "elapsed": time.perf_counter() - started,
+        "memory_mb": rss_mb() - baseline,
+        "sessions": n_sessions,
+        "failures": failures
+    }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(int(len(values) * p / 100 + 0.5) - 1, 0)]
+
+
+def run_load(n_sessions, n_workers, rounds, seed):
+    """Runs n_sessions sessions over n_workers processes against a fresh data directory"""
+    n_workers = min(n_workers, n_sessions)
+    shares = [n_sessions // n_workers + (i < n_sessions % n_workers) for i in range(n_workers)]
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Workers read the data directory when they import the app
+        os.environ["CONTRACTME_DATA_DIR"] = data_dir
+        started = time.perf_counter()
+        with ProcessPoolExecutor(n_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(run_worker, range(n_workers), shares, [rounds] * n_workers,
+                                    [seed] * n_workers))
+        wall = time.perf_counter() - started
+
+    latencies = defaultdict(list)
+    for result in results:
+        for name, values in result["latencies"].items():
+            latencies[name].extend(values)
+    reruns = [value for values in latencies.values() for value in values]
+    busy = max(result["elapsed"] for result in results)
+
+    return {
+        "sessions": n_sessions,
+        "workers": n_workers,
+        "reruns": len(reruns),
+        "wall_s": wall,
+        "reruns_per_s": len(reruns) / busy,
+        "p50_ms": percentile(reruns, 50) * 1000,
+        "p95_ms": percentile(reruns, 95) * 1000,
+        "p99_ms": percentile(reruns, 99) * 1000,
+        "memory_per_session_mb": sum(r["memory_mb"] for r in results) / n_sessions,
+        "steps_p95_ms": {name: percentile(values, 95) * 1000 for name, values in latencies.items()},
+        "failures": [failure for result in results for failure in result["failures"]]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 20],
+                        help="numbers of concurrent sessions to run, one load test each")
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count() or 1, 4),
+                        help="worker processes sharing the sessions")
+    parser.add_argument("--rounds", type=int, default=1, help="times each session repeats the flow")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the results to this file, to compare runs")
+    args = parser.parse_args()
+
+    print(f"{'sessions':>8} {'workers':>7} {'reruns':>6} {'reruns/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'MB/session':>10}")
+    runs = []
+    for n_sessions in args.sessions:
+        run = run_load(n_sessions, args.workers, args.rounds, args.seed)
+        runs.append(run)
+        print(f"{run['sessions']:>8} {run['workers']:>7} {run['reruns']:>6} {run['reruns_per_s']:>8.1f} "
+              f"{run['p50_ms']:>8.1f} {run['p95_ms']:>8.1f} {run['p99_ms']:>8.1f} "
+              f"{run['memory_per_session_mb']:>10.2f}")
+        print("         p95 by step: " + ", ".join(f"{name} {ms:.0f}" for name, ms in run["steps_p95_ms"].items()))
+        for failure in run["failures"][:5]:
+            print(f"         failed: {failure}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(runs, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""ContractME core: documents, deadlines and subscriptions without Streamlit.
+
+The Streamlit app (FintechApp.py) and the command-line tool
+(python -m contractme) are both built on these modules. Import the
+submodules directly; this package imports nothing so that the CLI starts
+fast.
+"""
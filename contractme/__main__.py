@@ -0,0 +1,5 @@
+import sys
+
+from contractme.cli import main
+
+sys.exit(main())
@@ -0,0 +1,197 @@
+"""Vectorized deadline and renewal statistics over numpy date arrays."""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from contractme.core import DEFAULT_CURRENCY
+
+UNIX_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+TIMELINE_MAX_BUCKETS = 370  # Buckets per category at most, so timeline payloads stay bounded
+
+# Granularities from finest to coarsest, with their shortest length in days
+GRANULARITY_DAYS = {"Day": 1, "Week": 7, "Month": 28, "Year": 365}
+
+def project_monthly_renewals(renewal_dates, costs, end):
+    """Expands monthly subscriptions into every renewal up to end (datetime64[D] arrays).
+
+    Renewals on the 29th-31st fall on the last day of shorter months. Each
+    subscription gets only its own months, so one with a renewal date far
+    in the past does not widen the expansion of all the others.
+    """
+    if len(renewal_dates) == 0:
+        return renewal_dates, costs, np.empty(0, dtype=np.int64)
+
+    first_month = renewal_dates.astype("datetime64[M]")
+    day_in_month = (renewal_dates - first_month.astype("datetime64[D]")).astype(np.int64)
+    n_months = np.maximum((np.datetime64(end, "M") - first_month).astype(np.int64) + 1, 0)
+
+    # Each subscription's renewals in turn, numbered from 0 within it
+    owner = np.repeat(np.arange(len(renewal_dates)), n_months)
+    month_offset = np.arange(len(owner)) - np.repeat(np.cumsum(n_months) - n_months, n_months)
+
+    months = first_month[owner] + month_offset
+    month_start = months.astype("datetime64[D]")
+    month_length = ((months + 1).astype("datetime64[D]") - month_start).astype(np.int64)
+    dates = month_start + np.minimum(day_in_month[owner], month_length - 1)
+
+    keep = dates <= np.datetime64(end, "D")
+    return dates[keep], costs[owner[keep]], owner[keep]
+
+def dates_to_datetime64(dates, count):
+    """Converts date objects to datetime64[D] through their ordinals, much faster than np.array"""
+    ordinals = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=count)
+    return (ordinals - UNIX_EPOCH_ORDINAL).astype("datetime64[D]")
+
+def deadline_event_arrays(deadlines, subscriptions, end, rates=None, currency=None):
+    """Returns dates, category names, category codes and costs of every deadline and renewal up to end.
+
+    With a RateTable and a currency, renewal costs are converted at the rates of their dates.
+    """
+    # Renewal deadlines are replaced by the projected renewals of their subscription
+    plain = [d for d in deadlines if not d.get("subscription_id")]
+    dates = dates_to_datetime64((d["date"] for d in plain), len(plain))
+    codes, categories = pd.factorize(pd.Series([d["category"] for d in plain] + ["Subscriptions"]), sort=True)
+    categories = np.asarray(categories, dtype=object)
+    codes = codes[:-1]
+
+    renewal_dates = dates_to_datetime64((sub["renewal_date"] for sub in subscriptions), len(subscriptions))
+    renewal_costs = np.array([sub.get("cost", 0.0) for sub in subscriptions], dtype=np.float64)
+    renewals, renewal_costs, owner = project_monthly_renewals(renewal_dates, renewal_costs, end)
+    if rates is not None:
+        currency_codes = rates.currency_codes((sub.get("currency", DEFAULT_CURRENCY) for sub in subscriptions),
+                                              len(subscriptions))
+        renewal_costs = rates.convert(renewal_costs, currency_codes[owner], currency, renewals)
+    subscription_code = int(np.searchsorted(categories, "Subscriptions"))
+
+    return (
+        np.concatenate([dates, renewals]),
+        categories,
+        np.concatenate([codes, np.full(len(renewals), subscription_code)]),
+        np.concatenate([np.zeros(len(dates)), renewal_costs])
+    )
+
+def bucket_events(dates, codes, costs, n_categories, start, end, granularity):
+    """Counts events and sums costs per category and day, week, month or year with np.bincount.
+
+    Returns the bucket start dates and two (category, bucket) matrices.
+    """
+    if granularity == "Day":
+        origin = np.datetime64(start, "D")
+        bucket = (dates - origin).astype(np.int64)
+        n_buckets = int((np.datetime64(end, "D") - origin).astype(np.int64)) + 1
+        bucket_starts = origin + np.arange(n_buckets)
+    elif granularity == "Week":
+        # Weeks start on Monday; 1970-01-01 was a Thursday
+        origin = np.datetime64(start, "D")
+        origin -= (origin.astype(np.int64) + 3) % 7
+        bucket = (dates - origin).astype(np.int64) // 7
+        n_buckets = int((np.datetime64(end, "D") - origin).astype(np.int64) // 7) + 1
+        bucket_starts = origin + 7 * np.arange(n_buckets)
+    elif granularity == "Year":
+        origin = np.datetime64(start, "Y")
+        bucket = (dates.astype("datetime64[Y]") - origin).astype(np.int64)
+        n_buckets = int((np.datetime64(end, "Y") - origin).astype(np.int64)) + 1
+        bucket_starts = (origin + np.arange(n_buckets)).astype("datetime64[D]")
+    else:
+        origin = np.datetime64(start, "M")
+        bucket = (dates.astype("datetime64[M]") - origin).astype(np.int64)
+        n_buckets = int((np.datetime64(end, "M") - origin).astype(np.int64)) + 1
+        bucket_starts = (origin + np.arange(n_buckets)).astype("datetime64[D]")
+
+    in_range = (dates >= np.datetime64(start, "D")) & (dates <= np.datetime64(end, "D"))
+    flat = codes[in_range] * n_buckets + bucket[in_range]
+    size = n_categories * n_buckets
+    counts = np.bincount(flat, minlength=size).reshape(n_categories, n_buckets)
+    cost_sums = np.bincount(flat, weights=costs[in_range], minlength=size).reshape(n_categories, n_buckets)
+    return bucket_starts, counts, cost_sums
+
+def timeline_granularity(start, end, max_buckets=TIMELINE_MAX_BUCKETS):
+    """The finest granularity giving at most max_buckets buckets from start to end"""
+    days = (end - start).days + 1
+    for granularity, length in GRANULARITY_DAYS.items():
+        # Partial buckets at both ends add up to two
+        if days // length + 2 <= max_buckets:
+            return granularity
+    return "Year"
+
+def window_slice(sorted_dates, start, end):
+    """The slice of the dates from start to end, in datetime64[D] dates sorted ascending"""
+    low = np.searchsorted(sorted_dates, np.datetime64(start, "D"), side="left")
+    high = np.searchsorted(sorted_dates, np.datetime64(end, "D"), side="right")
+    return slice(int(low), int(high))
+
+def year_heatmap_grid(dates, costs, year):
+    """Lays out daily event counts and costs of a year as (weekday, week) matrices.
+
+    Returns the counts, costs and date labels, with NaN and "" outside the year.
+    """
+    start = np.datetime64(f"{year}-01-01", "D")
+    n_days = int((np.datetime64(f"{year + 1}-01-01", "D") - start).astype(np.int64))
+
+    offsets = (dates - start).astype(np.int64)
+    in_year = (offsets >= 0) & (offsets < n_days)
+    counts = np.bincount(offsets[in_year], minlength=n_days)
+    day_costs = np.bincount(offsets[in_year], weights=costs[in_year], minlength=n_days)
+
+    # Rows are weekdays from Monday; 1970-01-01 was a Thursday
+    cells = np.arange(n_days) + (start.astype(np.int64) + 3) % 7
+    weekday, week = cells % 7, cells // 7
+    n_weeks = int(week[-1]) + 1
+
+    count_grid = np.full((7, n_weeks), np.nan)
+    cost_grid = np.full((7, n_weeks), np.nan)
+    label_grid = np.full((7, n_weeks), "", dtype=object)
+    count_grid[weekday, week] = counts
+    cost_grid[weekday, week] = day_costs
+    label_grid[weekday, week] = np.datetime_as_string(start + np.arange(n_days))
+    return count_grid, cost_grid, label_grid
+
+def overload_periods(sorted_dates, costs, window_days, max_events, max_cost):
+    """Finds the periods with more than max_events events or more than max_cost within window_days days.
+
+    A sweep over the datetime64[D] dates sorted ascending: searchsorted
+    finds where the window starting at each event day ends, and prefix
+    sums of the costs give its total, so the whole pass is O(n log n).
+    Overloaded windows that overlap are merged into one period. Returns
+    the periods in date order, with their number of events and costs and
+    those of their busiest window.
+    """
+    if len(sorted_dates) == 0:
+        return []
+
+    days = sorted_dates.astype(np.int64)
+    cost_sums = np.concatenate([[0.0], np.cumsum(costs)])
+
+    # Windows start on event days; more windows could not hold more events
+    starts = np.flatnonzero(np.concatenate([[True], days[1:] != days[:-1]]))
+    ends = np.searchsorted(days, days[starts] + window_days, side="left")
+    counts = ends - starts
+    totals = cost_sums[ends] - cost_sums[starts]
+    # Differences of prefix sums are off by rounding; a window at exactly max_cost is not over it
+    overloaded = (counts > max_events) | (totals > max_cost + 1e-9)
+    if not overloaded.any():
+        return []
+
+    starts, ends, counts, totals = starts[overloaded], ends[overloaded], counts[overloaded], totals[overloaded]
+    first_day, last_day = days[starts], days[ends - 1]
+
+    # A window starting after every earlier one ended opens a new period
+    reach = np.maximum.accumulate(last_day)
+    opens = np.flatnonzero(np.concatenate([[True], first_day[1:] > reach[:-1]]))
+
+    period_first = starts[opens]
+    period_end = np.maximum.reduceat(ends, opens)
+    return [
+        {
+            "start": sorted_dates[first].astype(object),
+            "end": sorted_dates[end - 1].astype(object),
+            "events": int(end - first),
+            "cost": float(cost_sums[end] - cost_sums[first]),
+            "peak_events": int(peak_events),
+            "peak_cost": float(peak_cost)
+        }
+        for first, end, peak_events, peak_cost in zip(period_first, period_end, np.maximum.reduceat(counts, opens),
+                                                      np.maximum.reduceat(totals, opens))
+    ]
@@ -0,0 +1,450 @@
+"""Local HTTP API over the stored data, served with asyncio streams.
+
+    python -m contractme serve [--host HOST] [--port PORT]
+
+Endpoints, for collection in documents, deadlines and subscriptions:
+
+    GET    /{collection}?offset=0&limit=100  a page of records
+    GET    /{collection}?format=ndjson       every record, streamed as NDJSON
+    GET    /{collection}/{id}                one record
+    POST   /{collection}/batch               {"items": [...]} creates records
+    DELETE /{collection}/batch               {"ids": [...]} deletes records
+
+GET responses carry an ETag made from the data version and answer a matching
+If-None-Match with 304. Dates are ISO strings; new documents send their
+file as "content_base64". Deleting a document leaves its stored file to
+the app: a session's undo may still need it, so the app releases it when
+it picks up the deletion, or when the workspace is next opened.
+"""
+import asyncio
+import base64
+import binascii
+import http
+import io
+import json
+import math
+import urllib.parse
+from datetime import date
+
+from contractme import core, store
+from contractme.imaging import is_readable_image, make_image_preview
+from contractme.storage import ingest_upload, document_type, storage_dir_of
+
+API_HOST = "127.0.0.1"
+API_PORT = 8502
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+API_MAX_BATCH = 1000  # Records per batch request
+API_MAX_BODY_BYTES = 64 * 1024 * 1024
+API_MAX_HEADERS = 100
+API_STREAM_CHUNK = 500  # Records per chunk of a streamed list
+API_IDLE_TIMEOUT = 30  # Seconds a connection may wait between requests
+IMAGE_PREVIEW_SIZE = (800, 800)
+API_MIN_DATE = date(1900, 1, 1)  # Dates accepted in records
+API_MAX_DATE = date(2199, 12, 31)
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class Response:
+    """Status, headers and either a complete body or an async iterator of chunks"""
+
+    def __init__(self, status, body=b"", headers=None, chunks=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        self.chunks = chunks
+
+def encode_json(value):
+    return json.dumps(value, default=store.encode_value).encode("utf-8")
+
+def json_response(status, value, headers=None):
+    return Response(status, encode_json(value), dict(headers or {}, **{"Content-Type": "application/json"}))
+
+# Request validation
+def field(item, name, kind, required=True, default=None):
+    value = item.get(name, default)
+    if value is None:
+        if required:
+            raise ApiError(400, f"'{name}' is required")
+        return None
+    if kind is date:
+        try:
+            value = date.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ApiError(400, f"'{name}' must be a date (YYYY-MM-DD)")
+        if not API_MIN_DATE <= value <= API_MAX_DATE:
+            raise ApiError(400, f"'{name}' must be between {API_MIN_DATE} and {API_MAX_DATE}")
+        return value
+    if kind is float:
+        # JSON parsing accepts NaN and Infinity, which totals cannot use
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+            raise ApiError(400, f"'{name}' must be a non-negative number")
+        return float(value)
+    # bool is a subclass of int, but true is not an ID
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise ApiError(400, f"'{name}' must be a {kind.__name__}")
+    return value
+
+def int_param(query, name, default, maximum=None):
+    try:
+        value = int(query.get(name, [default])[0])
+    except ValueError:
+        raise ApiError(400, f"'{name}' must be an integer")
+    if maximum is None and value < 0:
+        raise ApiError(400, f"'{name}' must not be negative")
+    if maximum is not None and not 0 <= value <= maximum:
+        raise ApiError(400, f"'{name}' must be between 0 and {maximum}")
+    return value
+
+class Api:
+    """Request handling, independent of the connection it comes from.
+
+    Reads see the latest saved data: the store is reloaded whenever its file
+    changes, e.g. after a save from the app. Writes hold the data file's
+    lock from loading the latest data to saving it, and are saved before
+    they are answered.
+    """
+
+    def __init__(self, path=store.DATA_FILE):
+        self.path = path
+        self.data = store.load_data(path)
+        self.stamp = store.file_stamp(path)
+        self.write_lock = asyncio.Lock()
+
+    def refresh(self):
+        stamp = store.file_stamp(self.path)
+        if stamp != self.stamp:
+            self.data = store.load_data(self.path)
+            self.stamp = stamp
+
+    def etag(self):
+        # The file's inode and time tell apart data saved again from scratch with the same version
+        inode, mtime_ns, _ = self.stamp or (0, 0, 0)
+        return f'"{self.data["version"]}-{inode}-{mtime_ns}"'
+
+    async def handle(self, method, target, headers, body):
+        try:
+            url = urllib.parse.urlsplit(target)
+            parts = [part for part in url.path.split("/") if part]
+            if not parts or parts[0] not in store.COLLECTIONS or len(parts) > 2:
+                raise ApiError(404, "Not found")
+            collection = parts[0]
+            query = urllib.parse.parse_qs(url.query)
+
+            if len(parts) == 2 and parts[1] == "batch":
+                if method == "POST":
+                    return await self.create(collection, self.parse_body(body, "items"))
+                if method == "DELETE":
+                    return await self.delete(collection, self.parse_body(body, "ids"))
+                raise ApiError(405, "Use POST or DELETE")
+
+            if method != "GET":
+                raise ApiError(405, "Use GET")
+
+            self.refresh()
+            if headers.get("if-none-match") in (self.etag(), "*"):
+                return Response(304, headers={"ETag": self.etag()})
+
+            if len(parts) == 2:
+                return self.get(collection, parts[1])
+            return self.list(collection, query)
+        except ApiError as e:
+            return json_response(e.status, {"error": e.message})
+
+    def parse_body(self, body, key):
+        try:
+            values = json.loads(body)[key]
+        except (ValueError, KeyError, TypeError):
+            raise ApiError(400, f"The body must be a JSON object with a '{key}' list")
+        if not isinstance(values, list):
+            raise ApiError(400, f"'{key}' must be a list")
+        if len(values) > API_MAX_BATCH:
+            raise ApiError(413, f"At most {API_MAX_BATCH} records per request")
+        return values
+
+    def get(self, collection, record_id):
+        for record in self.data[collection]:
+            if str(record["id"]) == record_id:
+                return json_response(200, record, {"ETag": self.etag()})
+        raise ApiError(404, f"No record {record_id} in {collection}")
+
+    def list(self, collection, query):
+        records = self.data[collection]
+        offset = int_param(query, "offset", 0)
+        headers = {"ETag": self.etag()}
+
+        if query.get("format") == ["ndjson"]:
+            # Streamed from a snapshot, so later writes do not affect it
+            records = records[offset:]
+            return Response(200, headers=dict(headers, **{"Content-Type": "application/x-ndjson"}),
+                            chunks=self.stream_records(records))
+
+        limit = int_param(query, "limit", API_PAGE_SIZE, API_MAX_PAGE_SIZE)
+        return json_response(200, {
+            "items": records[offset:offset + limit],
+            "total": len(records),
+            "offset": offset,
+            "limit": limit,
+            "version": self.data["version"]
+        }, headers)
+
+    async def stream_records(self, records):
+        for start in range(0, len(records), API_STREAM_CHUNK):
+            yield b"".join(encode_json(record) + b"\n" for record in records[start:start + API_STREAM_CHUNK])
+            # Let other connections run between chunks
+            await asyncio.sleep(0)
+
+    async def write(self, change):
+        """Runs change(data) on the latest data under the data file's lock; returns its result.
+
+        change returns its result and whether it changed the data, which
+        is then saved. The lock keeps the app and the command line from
+        saving in between, so IDs are allocated past everyone's counters
+        and nobody's write is lost. change runs in a worker thread, on a
+        copy of the data: reads are served the previous data meanwhile.
+        """
+        async with self.write_lock:
+            return await asyncio.to_thread(self.write_locked, change)
+
+    def write_locked(self, change):
+        with store.locked(self.path):
+            stamp = store.file_stamp(self.path)
+            if stamp == self.stamp:
+                data = dict(self.data, id_counters=dict(self.data["id_counters"]),
+                            categories=list(self.data["categories"]),
+                            **{collection: list(self.data[collection]) for collection in store.COLLECTIONS})
+            else:
+                data = store.load_data(self.path)
+            result, changed = change(data)
+            if changed:
+                store.save_data(data, self.path)
+                stamp = store.file_stamp(self.path)
+            self.data, self.stamp = data, stamp
+        return result
+
+    async def create(self, collection, items):
+        if not all(isinstance(item, dict) for item in items):
+            raise ApiError(400, "'items' must be a list of objects")
+
+        # Validate the whole batch before storing or creating anything
+        if collection == "documents":
+            new = await self.store_documents([self.document_fields(item) for item in items])
+        elif collection == "deadlines":
+            new = [self.deadline_fields(item) for item in items]
+        else:
+            new = [self.subscription_fields(item) for item in items]
+
+        def change(data):
+            if collection == "documents":
+                return [core.add_document(data, *fields)[0] for fields in new], True
+            if collection == "deadlines":
+                # Linked documents are checked against the latest data, which may have deleted them
+                known = {doc["id"] for doc in data["documents"]}
+                for fields in new:
+                    if fields[4] is not None and fields[4] not in known:
+                        raise ApiError(400, f"No document {fields[4]}")
+                return [core.add_deadline(data, *fields) for fields in new], True
+            return [core.add_subscription(data, *fields)[0] for fields in new], True
+
+        created = await self.write(change)
+        return json_response(201, {"items": created, "version": self.data["version"]})
+
+    def deadline_fields(self, item):
+        return (field(item, "title", str), field(item, "date", date), field(item, "description", str, default=""),
+                field(item, "category", str, default="Other"), field(item, "document_id", int, required=False))
+
+    def subscription_fields(self, item):
+        currency = field(item, "currency", str, default=core.DEFAULT_CURRENCY)
+        if currency not in core.CURRENCIES:
+            raise ApiError(400, f"'currency' must be one of {', '.join(core.CURRENCIES)}")
+        return (field(item, "name", str), field(item, "type", str, default="Other"),
+                field(item, "renewal_date", date), field(item, "cost", float),
+                field(item, "description", str, default=""), currency)
+
+    def document_fields(self, item):
+        """Checks a new document; returns its fields and file content, without storing anything"""
+        name = field(item, "name", str)
+        filename = field(item, "filename", str)
+        try:
+            content = base64.b64decode(field(item, "content_base64", str), validate=True)
+        except binascii.Error:
+            raise ApiError(400, "'content_base64' must be base64")
+
+        file_extension = filename.split(".")[-1].lower()
+        doc_type = document_type(file_extension)
+        if not doc_type:
+            raise ApiError(400, f"Unsupported file type: {file_extension}")
+
+        if doc_type == "image" and not is_readable_image(content):
+            raise ApiError(400, f"{filename}: the image could not be read")
+
+        return (name, field(item, "category", str, default="Other"), doc_type,
+                field(item, "expiry_date", date, required=False), filename, content)
+
+    async def store_documents(self, checked):
+        """Stores the files of checked documents; returns the arguments of core.add_document for each.
+
+        If one still fails, the files stored for the batch stay behind: the
+        same file may belong to a document saved or held for undo elsewhere,
+        so they are left to the app's sweep of unreferenced files.
+        """
+        new = []
+        for name, category, doc_type, expiry_date, filename, content in checked:
+            file_extension = filename.split(".")[-1].lower()
+            stored = await asyncio.to_thread(ingest_upload, io.BytesIO(content), file_extension,
+                                           API_MAX_BODY_BYTES, storage_dir_of(self.path))
+            preview = stored["text_preview"]
+            if doc_type == "image":
+                try:
+                    preview = await asyncio.to_thread(make_image_preview, stored["path"], IMAGE_PREVIEW_SIZE)
+                except OSError as e:
+                    raise ApiError(400, f"{filename}: the image could not be read ({e})")
+            new.append((name, category, doc_type, preview, expiry_date, filename, stored))
+        return new
+
+    async def delete(self, collection, ids):
+        if not all(isinstance(record_id, int) and not isinstance(record_id, bool) for record_id in ids):
+            raise ApiError(400, "'ids' must be a list of integers")
+
+        wanted = set(ids)
+
+        def change(data):
+            found = [record for record in data[collection] if record["id"] in wanted]
+            if collection == "documents":
+                # Their files are left to the app, which releases them unless an undo may need them
+                for doc in found:
+                    core.remove_document(data, doc)
+            elif collection == "deadlines":
+                core.remove_deadlines(data, lambda d: d["id"] in wanted)
+            else:
+                for sub in found:
+                    core.remove_subscription(data, sub)
+            return found, bool(found)
+
+        found = await self.write(change)
+        deleted = [record["id"] for record in found]
+        return json_response(200, {
+            "deleted": deleted,
+            "missing": sorted(wanted.difference(deleted)),
+            "version": self.data["version"]
+        })
+
+# HTTP over asyncio streams
+async def read_request(reader):
+    """Returns (method, target, version, headers, body), or None once the client is done"""
+    request_line = await asyncio.wait_for(reader.readline(), API_IDLE_TIMEOUT)
+    if not request_line.strip():
+        return None
+
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise ApiError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= API_MAX_HEADERS:
+            raise ApiError(431, "Too many headers")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", ""):
+        raise ApiError(411, "Send a Content-Length instead of a chunked body")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise ApiError(400, "Malformed Content-Length")
+    if length > API_MAX_BODY_BYTES:
+        raise ApiError(413, "Request body too large")
+
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, version, headers, body
+
+async def write_response(writer, response, keep_alive):
+    headers = dict(response.headers)
+    headers["Connection"] = "keep-alive" if keep_alive else "close"
+    if response.chunks is not None:
+        headers["Transfer-Encoding"] = "chunked"
+    else:
+        headers["Content-Length"] = str(len(response.body))
+
+    head = f"HTTP/1.1 {response.status} {http.HTTPStatus(response.status).phrase}\r\n"
+    head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    writer.write(head.encode("latin-1") + b"\r\n")
+
+    if response.chunks is None:
+        writer.write(response.body)
+    else:
+        async for chunk in response.chunks:
+            if chunk:
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                # Wait for slow clients instead of buffering the whole list
+                await writer.drain()
+        writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+async def serve_connection(api, reader, writer):
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except ApiError as e:
+                await write_response(writer, json_response(e.status, {"error": e.message}), False)
+                break
+            if request is None:
+                break
+
+            method, target, version, headers, body = request
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            await write_response(writer, await api.handle(method, target, headers, body), keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(host=API_HOST, port=API_PORT, path=store.DATA_FILE):
+    api = Api(path)
+    server = await asyncio.start_server(lambda r, w: serve_connection(api, r, w), host, port, backlog=1024)
+    print(f"Serving on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+class TestClient:
+    """Sends requests to an Api in-process, without sockets"""
+
+    def __init__(self, api):
+        self.api = api
+        self.loop = asyncio.new_event_loop()
+
+    def request(self, method, path, json_body=None, headers=None):
+        body = encode_json(json_body) if json_body is not None else b""
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        response = self.loop.run_until_complete(self.api.handle(method, path, headers, body))
+        if response.chunks is not None:
+            response.body = self.loop.run_until_complete(self.collect(response.chunks))
+            response.chunks = None
+        return response
+
+    async def collect(self, chunks):
+        return b"".join([chunk async for chunk in chunks])
+
+    def get(self, path, headers=None):
+        return self.request("GET", path, headers=headers)
+
+    def post(self, path, json_body):
+        return self.request("POST", path, json_body)
+
+    def delete(self, path, json_body):
+        return self.request("DELETE", path, json_body)
+
+    def close(self):
+        self.loop.close()
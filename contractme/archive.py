@@ -0,0 +1,208 @@
+"""Cold archive for documents that expired long ago.
+
+Archived documents leave the active data. Each keeps a metadata row in
+an SQLite database (name, category, dates, size: enough to list and
+search it) with the full record and its deadlines zlib-compressed next
+to it. Its file is compressed into the archive's own content-addressed
+storage. Nothing is decompressed until a document is downloaded or
+restored.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import zlib
+from contextlib import closing
+from datetime import date, timedelta
+
+from contractme import core, store
+
+def archive_file_of(data_file):
+    """The archive of a data file's documents: next to it, in its workspace"""
+    return os.path.join(os.path.dirname(data_file) or ".", "archive", "archive.sqlite3")
+
+ARCHIVE_FILE = archive_file_of(store.DATA_FILE)
+ARCHIVE_GRACE_DAYS = int(os.environ.get("CONTRACTME_ARCHIVE_GRACE_DAYS", "90"))  # Days after expiry
+ARCHIVE_COMPRESSION_LEVEL = 6
+ARCHIVE_CHUNK_SIZE = 1024 * 1024  # Bytes compressed or decompressed per iteration
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    category TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    expiry_date TEXT,
+    archived_date TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT,
+    record BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_by_archived_date ON documents (archived_date DESC, id DESC);
+"""
+
+# Metadata columns returned as stubs, without the compressed record
+STUB_COLUMNS = ("id", "name", "category", "filename", "expiry_date", "archived_date", "size")
+
+def compress_file(path, archive_path):
+    """Writes a zlib-compressed copy of path, chunk by chunk"""
+    compressor = zlib.compressobj(ARCHIVE_COMPRESSION_LEVEL)
+    fd, part_path = tempfile.mkstemp(dir=os.path.dirname(archive_path), suffix=".part")
+    try:
+        with open(path, "rb") as source, os.fdopen(fd, "wb") as out:
+            while chunk := source.read(ARCHIVE_CHUNK_SIZE):
+                out.write(compressor.compress(chunk))
+            out.write(compressor.flush())
+        os.replace(part_path, archive_path)
+    except BaseException:
+        os.remove(part_path)
+        raise
+
+def iter_decompressed(archive_path):
+    """Yields the original content of a compressed file, chunk by chunk"""
+    decompressor = zlib.decompressobj()
+    with open(archive_path, "rb") as f:
+        while chunk := f.read(ARCHIVE_CHUNK_SIZE):
+            yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+class DocumentArchive:
+    """SQLite index of archived documents plus their compressed files.
+
+    Every call opens its own connection, so one archive object can be
+    shared by the threads of all sessions.
+    """
+
+    def __init__(self, path=ARCHIVE_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.files_dir = os.path.join(os.path.dirname(path) or ".", "files")
+        os.makedirs(self.files_dir, exist_ok=True)
+        with closing(self.connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def file_path(self, sha256):
+        return os.path.join(self.files_dir, f"{sha256}.zz")
+
+    def add(self, doc, deadlines, today=None):
+        """Archives a document and its deadlines; archiving it again replaces the copy"""
+        if doc.get("sha256") and doc.get("path") and os.path.exists(doc["path"]) \
+                and not os.path.exists(self.file_path(doc["sha256"])):
+            compress_file(doc["path"], self.file_path(doc["sha256"]))
+
+        record = zlib.compress(json.dumps({"document": doc, "deadlines": deadlines},
+                                          default=store.encode_value).encode())
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc["id"], doc["name"], doc["name"].lower(), doc["category"], doc["filename"],
+                 doc["expiry_date"].isoformat() if doc.get("expiry_date") else None,
+                 (today or date.today()).isoformat(), doc.get("size", 0), doc.get("sha256"), record)
+            )
+
+    def search(self, query="", category=None, limit=20, offset=0):
+        """Stubs of the archived documents whose name contains query, most recently archived first"""
+        sql = f"SELECT {', '.join(STUB_COLUMNS)} FROM documents WHERE name_key LIKE ? ESCAPE '\\'"
+        pattern = query.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params = [f"%{pattern}%"]
+        if category:
+            sql += " AND category = ?"
+            params.append(category)
+        sql += " ORDER BY archived_date DESC, id DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+
+        with closing(self.connect()) as conn:
+            stubs = [store.decode_record(dict(row)) for row in conn.execute(sql, params)]
+        for stub in stubs:
+            stub["archived_date"] = date.fromisoformat(stub["archived_date"])
+        return stubs
+
+    def count(self):
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def categories(self):
+        with closing(self.connect()) as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT category FROM documents ORDER BY category")]
+
+    def get(self, doc_id):
+        """Decompresses an archived document; returns it and its deadlines, or None"""
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT record FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        archived = json.loads(zlib.decompress(row["record"]), object_hook=store.decode_record)
+        return archived["document"], archived["deadlines"]
+
+    def read_file(self, doc_id):
+        """The original content of an archived document's file, or None if it was not archived"""
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT sha256 FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        if row is None or not row["sha256"] or not os.path.exists(self.file_path(row["sha256"])):
+            return None
+        return b"".join(iter_decompressed(self.file_path(row["sha256"])))
+
+    def remove(self, doc_id):
+        """Drops a document from the archive, and its compressed file unless another one shares it"""
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute("SELECT sha256 FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return
+            conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            shared = row["sha256"] and conn.execute("SELECT 1 FROM documents WHERE sha256 = ? LIMIT 1",
+                                                    (row["sha256"],)).fetchone()
+        if row["sha256"] and not shared and os.path.exists(self.file_path(row["sha256"])):
+            os.remove(self.file_path(row["sha256"]))
+
+def expired_documents(documents, grace_days=ARCHIVE_GRACE_DAYS, today=None):
+    """Documents whose expiry date passed more than grace_days ago, except restored ones"""
+    cutoff = (today or date.today()) - timedelta(days=grace_days)
+    return [doc for doc in documents
+            if doc.get("expiry_date") and doc["expiry_date"] < cutoff and not doc.get("keep_active")]
+
+def archive_documents(data, archive, documents, today=None):
+    """Moves documents and their deadlines from data to the archive.
+
+    Returns the removed deadlines. The caller releases the stored files,
+    once the data without the documents is saved.
+    """
+    removed_deadlines = []
+    for doc in documents:
+        deadlines = [d for d in data["deadlines"] if d.get("document_id") == doc["id"]]
+        archive.add(doc, deadlines, today)
+        removed_deadlines += core.remove_document(data, doc)
+    return removed_deadlines
+
+def restore_document(data, archive, doc_id):
+    """Moves a document and its deadlines from the archive back to data.
+
+    Its file is decompressed back to its stored path unless it is still
+    there. The document is not archived again by later sweeps. Returns
+    the document and its deadlines, or None if it is not archived.
+    """
+    archived = archive.get(doc_id)
+    if archived is None:
+        return None
+    doc, deadlines = archived
+
+    path = doc.get("path")
+    if path and not os.path.exists(path):
+        archive_path = archive.file_path(doc["sha256"])
+        if os.path.exists(archive_path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".part", "wb") as out:
+                for chunk in iter_decompressed(archive_path):
+                    out.write(chunk)
+            os.replace(path + ".part", path)
+
+    doc["keep_active"] = True
+    data["documents"].append(doc)
+    data["deadlines"].extend(deadlines)
+    archive.remove(doc_id)
+    return doc, deadlines
@@ -0,0 +1,226 @@
+"""The AI assistant: answer simulation, model backends and the inference runner."""
+import asyncio
+import hashlib
+import json
+import queue
+import re
+import threading
+import urllib.request
+import zlib
+from collections import OrderedDict
+
+def simulate_ai_response(user_input, doc):
+    """Simulates an AI response based on the selected document.
+
+    The same question about the same document always gets the same answer.
+    """
+    
+    # Predefined responses to simulate AI
+    general_responses = [
+        "I can help you manage your documents and deadlines. What would you like to know?",
+        "This is a simulated assistant. In a complete version, I could analyze your documents and provide more relevant responses.",
+        "I don't have access to a real language model. This is a response simulation.",
+        "To get more detailed information, you should connect a real AI model to this app."
+    ]
+    
+    document_responses = [
+        f"I've examined the document '{doc['name']}'. What specifically would you like to know?",
+        f"The document '{doc['name']}' is in the '{doc['category']}' category. I can help you interpret it.",
+        f"This document was uploaded on {doc['upload_date'].strftime('%m/%d/%Y')}. How can I help you?",
+        f"I'm analyzing '{doc['name']}'. Remember this is a simulated AI assistant."
+    ] if doc else []
+    
+    # Specific responses based on keywords in the question
+    if "deadline" in user_input.lower() or "expiry" in user_input.lower() or "renewal" in user_input.lower():
+        if doc and doc.get("expiry_date"):
+            return f"The deadline for '{doc['name']}' is set for {doc['expiry_date'].strftime('%m/%d/%Y')}."
+        else:
+            return "I couldn't find any deadline information in the selected document."
+    
+    elif "content" in user_input.lower() or "what" in user_input.lower() and "says" in user_input.lower():
+        if doc and doc["type"] == "text":
+            preview = doc["preview"]
+            # Limit the response length
+            if len(preview) > 300:
+                preview = preview[:300] + "..."
+            return f"Here's an excerpt from the document: \n\n{preview}"
+        else:
+            return "I can't extract text content from this type of document."
+    
+    elif "category" in user_input.lower():
+        if doc:
+            return f"The document '{doc['name']}' belongs to the '{doc['category']}' category."
+        else:
+            return "You haven't selected a document."
+    
+    # Generic responses, picked from the question so the choice is repeatable
+    choice = zlib.crc32(normalize_question(user_input).encode())
+    if doc:
+        return document_responses[choice % len(document_responses)]
+    else:
+        return general_responses[choice % len(general_responses)]
+
+# Inference backends
+class InferenceError(Exception):
+    """The AI backend failed to answer, whatever went wrong in it"""
+
+class InferenceTimeout(InferenceError, TimeoutError):
+    """The AI backend did not answer within the timeout"""
+
+class InferenceBackend:
+    """Interface of the models the AI assistant answers through"""
+
+    async def stream(self, question, doc):
+        """Yields the answer to a question about doc (or None) piece by piece"""
+        raise NotImplementedError
+        yield
+
+class LocalStubBackend(InferenceBackend):
+    """Deterministic stand-in that answers with the simulated responses"""
+
+    async def stream(self, question, doc):
+        for token in re.findall(r"\S+\s*", simulate_ai_response(question, doc)):
+            yield token
+
+class LocalModelServerBackend(InferenceBackend):
+    """Streams answers from a local model server speaking the Ollama generate API"""
+
+    def __init__(self, url, model, timeout):
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+
+    async def stream(self, question, doc):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"model": self.model, "prompt": build_ai_prompt(question, doc)}).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        # urllib is blocking, so every read happens on a worker thread
+        response = await asyncio.to_thread(urllib.request.urlopen, request, timeout=self.timeout)
+        try:
+            while True:
+                line = await asyncio.to_thread(response.readline)
+                if not line:
+                    break
+                chunk = json.loads(line)
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+        finally:
+            response.close()
+
+def build_ai_prompt(question, doc):
+    """Builds the prompt sent to a model: document details, an excerpt, then the question"""
+    if not doc:
+        return f"You are an assistant for a document and deadline manager.\n\nQuestion: {question}"
+
+    lines = [
+        "You are an assistant answering questions about one of the user's documents.",
+        f"Name: {doc['name']}",
+        f"Category: {doc['category']}",
+        f"Uploaded: {doc['upload_date'].strftime('%m/%d/%Y')}",
+    ]
+    if doc.get("expiry_date"):
+        lines.append(f"Expiry date: {doc['expiry_date'].strftime('%m/%d/%Y')}")
+    if doc["type"] == "text" and doc.get("preview"):
+        lines.append(f"Excerpt:\n{doc['preview']}")
+    lines.append(f"\nQuestion: {question}")
+    return "\n".join(lines)
+
+def normalize_question(question):
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+def answer_cache_key(question, doc):
+    """Cache key: hash of what the model sees about the document plus the normalized question"""
+    if not doc:
+        return (None, normalize_question(question))
+
+    # The stored file hash covers the content; the prompt also shows these details
+    context = "|".join(str(value) for value in (
+        doc.get("sha256"), doc["name"], doc["category"], doc["upload_date"], doc.get("expiry_date")
+    ))
+    return (hashlib.sha256(context.encode()).hexdigest(), normalize_question(question))
+
+class AnswerCache:
+    """Thread-safe LRU cache of complete answers"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.answers = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            answer = self.answers.get(key)
+            if answer is not None:
+                self.answers.move_to_end(key)
+            return answer
+
+    def put(self, key, answer):
+        with self.lock:
+            self.answers[key] = answer
+            self.answers.move_to_end(key)
+            if len(self.answers) > self.max_size:
+                self.answers.popitem(last=False)
+
+class InferenceRunner:
+    """Runs backend calls on a background event loop, with a timeout and an answer cache"""
+
+    def __init__(self, backend, cache, timeout):
+        self.backend = backend
+        self.cache = cache
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="inference-loop", daemon=True).start()
+
+    def stream(self, question, doc):
+        """Yields the answer piece by piece.
+
+        Raises InferenceTimeout if the backend does not finish within the
+        timeout, and InferenceError if it fails in any other way, such as an
+        unreachable server or a malformed reply. Closing the generator early
+        cancels the backend call.
+        """
+        key = answer_cache_key(question, doc)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        tokens = queue.Queue()
+        end = object()
+
+        async def produce():
+            async def consume():
+                async for token in self.backend.stream(question, doc):
+                    tokens.put(token)
+
+            try:
+                await asyncio.wait_for(consume(), self.timeout)
+                tokens.put(end)
+            except Exception as e:
+                tokens.put(e)
+
+        future = asyncio.run_coroutine_threadsafe(produce(), self.loop)
+        parts = []
+        try:
+            while True:
+                try:
+                    item = tokens.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise InferenceTimeout("The AI backend did not answer in time.")
+                if item is end:
+                    break
+                if isinstance(item, asyncio.TimeoutError):
+                    raise InferenceTimeout("The AI backend did not answer in time.") from item
+                if isinstance(item, Exception):
+                    raise InferenceError(f"The AI backend failed ({type(item).__name__}: {item})") from item
+                parts.append(item)
+                yield item
+        finally:
+            # No-op once the call has finished; cancels it when the reader stopped early
+            future.cancel()
+
+        self.cache.put(key, "".join(parts))
@@ -0,0 +1,191 @@
+"""In-process change feed that keeps the sessions of one server in sync."""
+import itertools
+import threading
+from collections import deque
+
+from contractme import store
+
+CHANGE_FEED_SIZE = 10000  # Deltas kept for subscribers that are behind
+STORE_SOURCE = "store"  # Source of the changes other processes saved to the data file
+
+class ChangeFeed:
+    """Publish/subscribe log of record changes.
+
+    Publishers append small deltas. Each subscriber keeps the sequence
+    number it has read up to and asks for what came after, so a subscriber
+    that goes away (a closed browser tab) costs nothing. The log is capped;
+    a subscriber that falls further behind is told to reload instead.
+
+    The feed also holds the ID counters shared by all sessions, so records
+    created in different sessions never get the same ID.
+    """
+
+    def __init__(self, size=CHANGE_FEED_SIZE):
+        self.log = deque(maxlen=size)
+        self.seq = 0
+        self.id_counters = {}
+        self.lock = threading.Lock()
+
+    def publish(self, source, op, collection, record):
+        """Records that source added ("add") or removed ("remove") a record"""
+        with self.lock:
+            self.seq += 1
+            self.log.append({
+                "seq": self.seq,
+                "source": source,
+                "op": op,
+                "collection": collection,
+                "record": dict(record)
+            })
+
+    def cursor(self):
+        """Sequence number to subscribe from: the next delta published is after it"""
+        with self.lock:
+            return self.seq
+
+    def since(self, cursor):
+        """Returns the deltas after cursor and the new cursor.
+
+        The deltas are None if some of them were already dropped from the log.
+        """
+        with self.lock:
+            if cursor == self.seq:
+                return [], cursor
+            if not self.log or self.log[0]["seq"] > cursor + 1:
+                return None, self.seq
+            return list(itertools.islice(self.log, cursor + 1 - self.log[0]["seq"], None)), self.seq
+
+    def next_id(self, kind, records=()):
+        """Allocates the next ID of a kind of record, under the lock.
+
+        records are the existing records of the kind, to start after the
+        highest of their IDs if the kind has no counter yet.
+        """
+        with self.lock:
+            if kind not in self.id_counters:
+                self.id_counters[kind] = max((record["id"] for record in records), default=0)
+            self.id_counters[kind] += 1
+            return self.id_counters[kind]
+
+    def merge_counters(self, counters):
+        """Raises the shared ID counters to at least those of loaded data"""
+        with self.lock:
+            for kind, value in counters.items():
+                self.id_counters[kind] = max(self.id_counters.get(kind, 0), value)
+
+    def counters(self):
+        """A copy of the shared ID counters, to store"""
+        with self.lock:
+            return dict(self.id_counters)
+
+class StoreWatcher:
+    """Brings the writes other processes save to a data file into a change feed.
+
+    The command line and the API write to a workspace's data file while the
+    app has it open. The watcher keeps the records as the app's sessions
+    last loaded or saved them; once the file was saved by someone else, the
+    differences are published from STORE_SOURCE like any session's changes.
+    Callers hold store.locked(path) while picking up changes or saving.
+    """
+
+    def __init__(self, path, feed):
+        self.path = path
+        self.feed = feed
+        self.stamp = None
+        self.data = None
+
+    def changed(self):
+        """Whether the file was saved since the last pick up or save; cheap enough for every rerun"""
+        return store.file_stamp(self.path) != self.stamp
+
+    def pick_up(self):
+        """Publishes the changes saved to the file since the last pick up or save; returns their deltas"""
+        stamp = store.file_stamp(self.path)
+        if self.data is not None and stamp == self.stamp:
+            return []
+        data = store.load_data(self.path)
+        # Nothing was loaded from the file yet, so no session can be missing anything
+        deltas = diff_records(self.data, data) if self.data is not None else []
+        for delta in deltas:
+            self.feed.publish(STORE_SOURCE, delta["op"], delta["collection"], delta["record"])
+        self.feed.merge_counters(data["id_counters"])
+        self.remember(data, stamp)
+        return deltas
+
+    def saved(self, data):
+        """Records that a session saved data to the file"""
+        self.remember(data, store.file_stamp(self.path))
+
+    def remember(self, data, stamp):
+        # Records are copied, so that a session changing one in place cannot hide a change from the diff
+        self.data = {collection: [dict(record) for record in data[collection]] for collection in store.COLLECTIONS}
+        self.data["categories"] = list(data["categories"])
+        self.data["version"] = data["version"]
+        self.stamp = stamp
+
+    @property
+    def version(self):
+        """Version of the data file as last picked up or saved"""
+        return self.data["version"] if self.data is not None else 0
+
+def diff_records(old, new):
+    """Deltas that turn the collections of old data into those of new data"""
+    deltas = []
+    for collection in store.COLLECTIONS:
+        previous = {record["id"]: record for record in old[collection]}
+        for record in new[collection]:
+            if previous.pop(record["id"], None) != record:
+                deltas.append({"source": STORE_SOURCE, "op": "add", "collection": collection, "record": record})
+        deltas += [{"source": STORE_SOURCE, "op": "remove", "collection": collection, "record": record}
+                   for record in previous.values()]
+    return deltas
+
+def apply_changes(data, deltas, source, indexes=None):
+    """Applies the deltas other sources published to data.
+
+    indexes maps collection names to lists of indexes of their records
+    (with add and remove methods) to keep up to date. Applying a delta
+    twice changes nothing. Returns the names of the collections that
+    changed.
+    """
+    indexes = indexes or {}
+    changed = set()
+    positions = {}  # Collection -> ID -> position of its records, built once per call
+    removed = set()  # Collections with removed records, left as None until the end
+
+    for delta in deltas:
+        if delta["source"] == source:
+            continue
+
+        collection = delta["collection"]
+        record = dict(delta["record"])
+        records = data[collection]
+        collection_indexes = indexes.get(collection, ())
+        if collection not in positions:
+            positions[collection] = {r["id"]: i for i, r in enumerate(records)}
+        ids = positions[collection]
+        position = ids.get(record["id"])
+
+        if position is not None:
+            for index in collection_indexes:
+                index.remove(records[position])
+        if delta["op"] == "add":
+            if position is None:
+                ids[record["id"]] = len(records)
+                records.append(record)
+            else:
+                records[position] = record
+            for index in collection_indexes:
+                index.add(record)
+        elif position is not None:
+            # Deleting now would shift the positions of the records after it
+            records[position] = None
+            del ids[record["id"]]
+            removed.add(collection)
+
+        changed.add(collection)
+
+    for collection in removed:
+        data[collection][:] = [record for record in data[collection] if record is not None]
+
+    return changed
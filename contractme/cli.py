@@ -0,0 +1,193 @@
+"""Command-line tool for batch jobs over the stored data.
+
+    python -m contractme report [--days N] [--json]
+    python -m contractme sweep [--days N] [--json]
+    python -m contractme archive [--grace-days N] [--release-files] [--json]
+    python -m contractme export-ics [--output FILE]
+    python -m contractme import-ics FILE
+    python -m contractme serve [--host HOST] [--port PORT]
+
+Commands work on --data, by default the single-user data file; --workspace
+KEY picks the data file of an app workspace (the key is in the app's page
+address). Only the standard library and the core are imported up front;
+commands import anything heavier themselves.
+"""
+import argparse
+import json
+import sys
+from contextlib import nullcontext
+from datetime import date
+
+from contractme import core, store
+
+def print_json(value):
+    json.dump(value, sys.stdout, default=store.encode_value, indent=2)
+    sys.stdout.write("\n")
+
+def report(data, args):
+    """Totals and the deadlines due in the next days"""
+    today = date.today()
+    core.clean_subscriptions(data, today)
+    due = [d for d in core.upcoming_deadlines(data["deadlines"], today) if (d["date"] - today).days <= args.days]
+    rows = core.deadline_rows(due, data["documents"], today)
+    summary = {
+        "documents": len(data["documents"]),
+        "deadlines": len(data["deadlines"]),
+        "subscriptions": len(data["subscriptions"]),
+        "monthly_cost": core.monthly_cost_by_currency(data["subscriptions"]),
+        "due": rows
+    }
+
+    if args.json:
+        print_json(summary)
+        return 0
+
+    monthly_cost = " + ".join(core.format_money(amount, currency)
+                              for currency, amount in sorted(summary["monthly_cost"].items())) or "nothing"
+    print(f"{summary['documents']} documents, {summary['deadlines']} deadlines, "
+          f"{summary['subscriptions']} subscriptions ({monthly_cost} per month)")
+    print(f"Due in the next {args.days} days: {len(rows)}")
+    for row in rows:
+        print(f"  {row['date'].isoformat()}  {row['days_left']:>4} days  {row['status']:<8}  {row['title']}")
+    return 0
+
+def sweep(data, args):
+    """Expired and soon expiring documents, and missed deadlines"""
+    found = core.expiry_sweep(data["documents"], data["deadlines"], args.days)
+
+    if args.json:
+        print_json({
+            "expired_documents": [{"id": d["id"], "name": d["name"], "expiry_date": d["expiry_date"]}
+                                  for d in found["expired_documents"]],
+            "expiring_documents": [{"id": d["id"], "name": d["name"], "expiry_date": d["expiry_date"]}
+                                   for d in found["expiring_documents"]],
+            "missed_deadlines": [{"id": d["id"], "title": d["title"], "date": d["date"]}
+                                 for d in found["missed_deadlines"]]
+        })
+        return 0
+
+    print(f"Expired documents: {len(found['expired_documents'])}")
+    for doc in found["expired_documents"]:
+        print(f"  {doc['expiry_date'].isoformat()}  {doc['name']}")
+    print(f"Documents expiring in the next {args.days} days: {len(found['expiring_documents'])}")
+    for doc in found["expiring_documents"]:
+        print(f"  {doc['expiry_date'].isoformat()}  {doc['name']}")
+    print(f"Missed deadlines: {len(found['missed_deadlines'])}")
+    for deadline in found["missed_deadlines"]:
+        print(f"  {deadline['date'].isoformat()}  {deadline['title']}")
+    return 0
+
+def archive(data, args):
+    """Moves documents expired more than the grace period ago to the archive of the data file.
+
+    The stored files of the archived documents are left to the app, which
+    deletes them once no session can undo their removal any more, unless
+    --release-files says the app is not running.
+    """
+    from contractme.archive import (ARCHIVE_GRACE_DAYS, DocumentArchive, archive_documents, archive_file_of,
+                                    expired_documents)
+    from contractme.storage import release_stored_file
+
+    grace_days = ARCHIVE_GRACE_DAYS if args.grace_days is None else args.grace_days
+    expired = expired_documents(data["documents"], grace_days)
+    if expired:
+        archive_documents(data, DocumentArchive(archive_file_of(args.data)), expired)
+        store.save_data(data, args.data)
+        if args.release_files:
+            for doc in expired:
+                release_stored_file(doc, data["documents"])
+
+    if args.json:
+        print_json([{"id": d["id"], "name": d["name"], "expiry_date": d["expiry_date"]} for d in expired])
+        return 0
+
+    print(f"Documents archived: {len(expired)}")
+    for doc in expired:
+        print(f"  {doc['expiry_date'].isoformat()}  {doc['name']}")
+    return 0
+
+def export_ics(data, args):
+    from contractme.ics import write_ics
+
+    if args.output == "-":
+        write_ics(sys.stdout.buffer, data["deadlines"], data["subscriptions"])
+    else:
+        with open(args.output, "wb") as f:
+            write_ics(f, data["deadlines"], data["subscriptions"])
+    return 0
+
+def import_ics(data, args):
+    from contractme.ics import parse_ics
+
+    skipped = []
+    with open(args.file, encoding="utf-8", errors="replace", newline="") as f:
+        events = list(parse_ics(f, skipped))
+    for message in skipped:
+        print(f"Skipped {message}", file=sys.stderr)
+
+    added = core.import_events(data, events)
+    if added:
+        store.save_data(data, args.data)
+    print(f"{len(added)} deadlines imported" + (f", {len(skipped)} invalid events skipped" if skipped else ""))
+    return 0
+
+def serve(data, args):
+    import asyncio
+    from contractme.api import serve
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.data))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="contractme", description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default=store.DATA_FILE, help="data file (default: %(default)s)")
+    parser.add_argument("--workspace", metavar="KEY", help="use the data file of an app workspace instead")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("report", help="totals and upcoming deadlines")
+    command.add_argument("--days", type=int, default=30, help="how far ahead to list deadlines")
+    command.add_argument("--json", action="store_true", help="print JSON")
+    command.set_defaults(run=report)
+
+    command = commands.add_parser("sweep", help="expired and expiring documents, missed deadlines")
+    command.add_argument("--days", type=int, default=7, help="how far ahead a document counts as expiring")
+    command.add_argument("--json", action="store_true", help="print JSON")
+    command.set_defaults(run=sweep)
+
+    command = commands.add_parser("archive", help="move long expired documents to the archive")
+    command.add_argument("--grace-days", type=int, default=None,
+                         help="days after expiry before a document is archived (default: $CONTRACTME_ARCHIVE_GRACE_DAYS or 90)")
+    command.add_argument("--release-files", action="store_true",
+                         help="also delete the archived documents' stored files; only while the app is not running, "
+                              "as its sessions may still undo their removal")
+    command.add_argument("--json", action="store_true", help="print JSON")
+    command.set_defaults(run=archive, writes=True)
+
+    command = commands.add_parser("export-ics", help="write deadlines and renewals as iCalendar")
+    command.add_argument("--output", "-o", default="-", help="output file (default: standard output)")
+    command.set_defaults(run=export_ics)
+
+    command = commands.add_parser("import-ics", help="add the events of an iCalendar file as deadlines")
+    command.add_argument("file")
+    command.set_defaults(run=import_ics, writes=True)
+
+    command = commands.add_parser("serve", help="serve the data over a local HTTP API")
+    command.add_argument("--host", default="127.0.0.1")
+    command.add_argument("--port", type=int, default=8502)
+    command.set_defaults(run=serve)
+
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.workspace is not None:
+        if not store.is_workspace_key(args.workspace):
+            parser.error(f"invalid workspace key: {args.workspace}")
+        args.data = store.workspace_data_file(args.workspace)
+    # Commands that save hold the data file's lock from loading it, so the app and the API lose nothing
+    with store.locked(args.data) if getattr(args, "writes", False) else nullcontext():
+        return args.run(store.load_data(args.data), args)
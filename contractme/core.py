@@ -0,0 +1,377 @@
+"""Records and business rules for documents, deadlines and subscriptions.
+
+Functions take the data as a mapping with "documents", "deadlines",
+"subscriptions", "categories" and "id_counters" entries: a dict loaded by
+contractme.store, or Streamlit's session state. Data shared by several
+writers may also have an "id_allocator" entry, such as a ChangeFeed, that
+allocates IDs under its lock instead of "id_counters".
+"""
+import calendar
+import heapq
+import uuid
+from datetime import date, timedelta
+
+DEFAULT_CATEGORIES = ["Home", "Work", "Health", "Finance", "Education", "Other"]
+
+# Deadline periods offered by the deadline views, in days from today
+DEADLINE_PERIODS = {
+    "All": None,
+    "Next 7 days": 7,
+    "Next 30 days": 30,
+    "Next 3 months": 90,
+    "Expired": None
+}
+
+IMMINENT_DAYS = 7  # Deadlines closer than this are imminent
+
+# Currencies subscriptions can be paid in, with their symbols
+CURRENCIES = {"USD": "$", "EUR": "€", "GBP": "£"}
+DEFAULT_CURRENCY = "USD"
+
+def format_money(amount, currency):
+    return f"{CURRENCIES.get(currency, currency + ' ')}{amount:.2f}"
+
+def new_record_id(data, kind):
+    """Returns an unused ID for documents, deadlines or subscriptions (the list name)"""
+    allocator = data.get("id_allocator")
+    if allocator is not None:
+        return allocator.next_id(kind, data[kind])
+    counters = data["id_counters"]
+    if kind not in counters:
+        counters[kind] = max((record["id"] for record in data[kind]), default=0)
+    counters[kind] += 1
+    return counters[kind]
+
+def new_ics_uid(kind):
+    """A calendar UID for a new deadline or subscription, unique across workspaces"""
+    return f"{kind}-{uuid.uuid4().hex}@contractme"
+
+def deadline_uid(deadline):
+    # Deadlines created before they had a UID are exported under their ID
+    return deadline.get("ics_uid") or f"deadline-{deadline['id']}@contractme"
+
+def subscription_uid(sub):
+    return sub.get("ics_uid") or f"subscription-{sub.get('id', 0)}@contractme"
+
+def is_subscription_uid(uid):
+    """Whether a calendar UID is that of a subscription exported by ContractME"""
+    return uid.startswith("subscription-") and uid.endswith("@contractme")
+
+# Records
+def add_document(data, name, category, doc_type, preview, expiry_date, filename, stored, today=None):
+    """Creates a document from a stored upload, plus its expiry deadline if it has one.
+
+    Returns the document and the deadline (or None).
+    """
+    document = {
+        "id": new_record_id(data, "documents"),
+        "name": name,
+        "category": category,
+        "type": doc_type,
+        "preview": preview,
+        "upload_date": today or date.today(),
+        "expiry_date": expiry_date,
+        "filename": filename,
+        "path": stored["path"],
+        "size": stored["size"],
+        "sha256": stored["sha256"],
+        "encoding": stored["encoding"]
+    }
+    data["documents"].append(document)
+
+    deadline = None
+    if expiry_date:
+        deadline = add_deadline(data, f"Expiry {name}", expiry_date,
+                                f"Deadline for document '{name}'", category, document_id=document["id"])
+    return document, deadline
+
+def add_deadline(data, title, due_date, description, category, document_id=None, subscription_id=None, ics_uid=None):
+    """Creates a deadline with ics_uid as its calendar UID, e.g. that of an imported event, or a new one"""
+    deadline = {
+        "id": new_record_id(data, "deadlines"),
+        "title": title,
+        "date": due_date,
+        "description": description,
+        "category": category,
+        "document_id": document_id,
+        "ics_uid": ics_uid or new_ics_uid("deadline")
+    }
+    if subscription_id is not None:
+        deadline["subscription_id"] = subscription_id
+    data["deadlines"].append(deadline)
+    return deadline
+
+def add_subscription(data, name, sub_type, renewal_date, cost, description, currency=DEFAULT_CURRENCY):
+    """Creates a subscription and the deadline of its next renewal; returns both"""
+    subscription = {
+        "id": new_record_id(data, "subscriptions"),
+        "name": name,
+        "type": sub_type,
+        "renewal_date": renewal_date,
+        "cost": float(cost),  # Ensure cost is a float
+        "currency": currency,
+        "description": description,
+        "ics_uid": new_ics_uid("subscription")
+    }
+    data["subscriptions"].append(subscription)
+
+    deadline = add_deadline(data, f"Renewal {name}", renewal_date,
+                            f"Subscription renewal '{name}' - {format_money(subscription['cost'], currency)}",
+                            "Subscriptions", subscription_id=subscription["id"])
+    return subscription, deadline
+
+def merge_document(data, doc, doc_type, preview, expiry_date, filename, stored, today=None):
+    """Makes a new upload the current file of an existing document.
+
+    The document keeps its ID, name, category and deadlines; a new expiry
+    date replaces its expiry deadline. An updated copy replaces the
+    document, which stays as it was. Returns the copy, the removed
+    deadlines and the new one (or None).
+    """
+    doc = replace_record(data, "documents", doc, {
+        "type": doc_type,
+        "preview": preview,
+        "upload_date": today or date.today(),
+        "filename": filename,
+        "path": stored["path"],
+        "size": stored["size"],
+        "sha256": stored["sha256"],
+        "encoding": stored["encoding"]
+    })
+    if not expiry_date or expiry_date == doc["expiry_date"]:
+        return doc, [], None
+
+    doc["expiry_date"] = expiry_date
+    title = f"Expiry {doc['name']}"
+    removed = remove_deadlines(data, lambda d: d.get("document_id") == doc["id"] and d["title"] == title)
+    # The new expiry keeps the calendar UID of the one it replaces, so calendars update the event
+    deadline = add_deadline(data, title, expiry_date,
+                            f"Deadline for document '{doc['name']}'", doc["category"], document_id=doc["id"],
+                            ics_uid=removed[0].get("ics_uid") if removed else None)
+    return doc, removed, deadline
+
+def merge_subscription(data, sub, sub_type, renewal_date, cost, description, currency=DEFAULT_CURRENCY):
+    """Updates an existing subscription with the details entered for a new one.
+
+    The subscription keeps its ID and name, and keeps its description if
+    no new one was entered. Its renewal deadline is replaced. An updated
+    copy replaces the subscription, which stays as it was. Returns the
+    copy, the removed deadlines and the new one.
+    """
+    sub = replace_record(data, "subscriptions", sub, {
+        "type": sub_type,
+        "renewal_date": renewal_date,
+        "cost": float(cost),
+        "currency": currency,
+        "description": description or sub.get("description", "")
+    })
+    removed = remove_deadlines(data, lambda d: d.get("subscription_id") == sub["id"])
+    deadline = add_deadline(data, f"Renewal {sub['name']}", renewal_date,
+                            f"Subscription renewal '{sub['name']}' - {format_money(sub['cost'], currency)}",
+                            "Subscriptions", subscription_id=sub["id"])
+    return sub, removed, deadline
+
+def replace_record(data, kind, record, changes):
+    """Replaces a record with an updated copy and returns the copy.
+
+    Records are never modified in place, so earlier versions held for
+    undo stay as they were. Raises KeyError if the record was removed.
+    """
+    records = data[kind]
+    position = next((i for i, r in enumerate(records) if r["id"] == record["id"]), None)
+    if position is None:
+        raise KeyError(f"No record {record['id']} in {kind}")
+    updated = {**record, **changes}
+    records[position] = updated
+    return updated
+
+def remove_document(data, doc):
+    """Removes a document and its deadlines; returns the removed deadlines"""
+    data["documents"].remove(doc)
+    return remove_deadlines(data, lambda d: d.get("document_id") == doc["id"])
+
+def remove_subscription(data, sub):
+    """Removes a subscription and its renewal deadlines; returns the removed deadlines"""
+    data["subscriptions"].remove(sub)
+    return remove_deadlines(data, lambda d: d.get("subscription_id") == sub["id"])
+
+def remove_deadlines(data, predicate):
+    removed = [d for d in data["deadlines"] if predicate(d)]
+    if removed:
+        data["deadlines"] = [d for d in data["deadlines"] if not predicate(d)]
+    return removed
+
+def import_events(data, events):
+    """Creates a deadline for every parsed iCalendar event not imported or exported before.
+
+    Subscription renewals exported by ContractME are skipped: they recur
+    monthly, which a deadline cannot. Returns the new deadlines.
+    """
+    known_uids = {deadline_uid(d) for d in data["deadlines"]}
+    added = []
+
+    for event in events:
+        uid = event.get("uid")
+        if uid and (uid in known_uids or is_subscription_uid(uid)):
+            continue
+
+        category = event.get("category") or "Other"
+        if category not in data["categories"] and category != "Subscriptions":
+            data["categories"].append(category)
+
+        added.append(add_deadline(data, event.get("summary", "Imported deadline"), event["date"],
+                                  event.get("description", ""), category, ics_uid=uid))
+        if uid:
+            known_uids.add(uid)
+
+    return added
+
+def storage_used(documents):
+    return sum(doc.get("size", 0) for doc in documents)
+
+# Deadlines
+def deadline_status(days_left):
+    """Classifies a deadline as Expired, Imminent or Future"""
+    if days_left < 0:
+        return "Expired"
+    if days_left <= IMMINENT_DAYS:
+        return "Imminent"
+    return "Future"
+
+def filter_deadlines(deadlines, period, today=None):
+    """Returns the deadlines of one of DEADLINE_PERIODS, sorted by date"""
+    today = today or date.today()
+    sorted_deadlines = sorted(deadlines, key=lambda x: x["date"])
+
+    if period == "Expired":
+        return [d for d in sorted_deadlines if d["date"] < today]
+    if DEADLINE_PERIODS[period] is None:
+        return sorted_deadlines
+
+    end_date = today + timedelta(days=DEADLINE_PERIODS[period])
+    return [d for d in sorted_deadlines if today <= d["date"] <= end_date]
+
+def upcoming_deadlines(deadlines, today=None, limit=None):
+    """Returns the deadlines from today on, soonest first"""
+    today = today or date.today()
+    upcoming = (d for d in deadlines if d["date"] >= today)
+    if limit is None:
+        return sorted(upcoming, key=lambda x: x["date"])
+    return heapq.nsmallest(limit, upcoming, key=lambda x: x["date"])
+
+def deadline_rows(deadlines, documents, today=None):
+    """Deadlines with their days left, status and linked document name"""
+    today = today or date.today()
+    doc_names = {doc["id"]: doc["name"] for doc in documents}
+    rows = []
+
+    for d in deadlines:
+        days_left = (d["date"] - today).days
+        rows.append({
+            "id": d["id"],
+            "title": d["title"],
+            "date": d["date"],
+            "days_left": days_left,
+            "category": d["category"],
+            "document": doc_names.get(d.get("document_id")),
+            "status": deadline_status(days_left)
+        })
+
+    return rows
+
+def expiry_sweep(documents, deadlines, days, today=None):
+    """Finds expired documents, documents expiring within days, and missed deadlines"""
+    today = today or date.today()
+    horizon = today + timedelta(days=days)
+    with_expiry = sorted((doc for doc in documents if doc.get("expiry_date")), key=lambda doc: doc["expiry_date"])
+
+    return {
+        "expired_documents": [doc for doc in with_expiry if doc["expiry_date"] < today],
+        "expiring_documents": [doc for doc in with_expiry if today <= doc["expiry_date"] <= horizon],
+        "missed_deadlines": sorted((d for d in deadlines if d["date"] < today), key=lambda d: d["date"])
+    }
+
+# Subscriptions
+def subscription_repairs(sub, today=None):
+    """The changes that repair a subscription's missing or invalid cost, currency, renewal date or name"""
+    changes = {}
+    if "cost" not in sub or not isinstance(sub["cost"], (int, float)):
+        changes["cost"] = 0.0
+    if sub.get("currency") not in CURRENCIES:
+        # Subscriptions from before currencies were added are in dollars
+        changes["currency"] = DEFAULT_CURRENCY
+    if not hasattr(sub.get("renewal_date"), "year"):
+        changes["renewal_date"] = today or date.today()
+    if not sub.get("name"):
+        changes["name"] = "Unnamed Subscription"
+    return changes
+
+def clean_subscriptions(data, today=None):
+    """Repairs the subscriptions that need it with updated copies; returns (original, repaired) pairs"""
+    repaired = []
+    for sub in list(data["subscriptions"]):
+        changes = subscription_repairs(sub, today)
+        if changes:
+            repaired.append((sub, replace_record(data, "subscriptions", sub, changes)))
+    return repaired
+
+def monthly_cost_by_currency(subscriptions):
+    """Sums monthly costs per currency, without converting them"""
+    totals = {}
+    for sub in subscriptions:
+        if isinstance(sub.get("cost"), (int, float)):
+            currency = sub.get("currency", DEFAULT_CURRENCY)
+            totals[currency] = totals.get(currency, 0.0) + sub["cost"]
+    return totals
+
+def days_to_renewal(sub, today=None):
+    return (sub["renewal_date"] - (today or date.today())).days
+
+# Calendar
+def monthly_renewal_day(renewal_date, year, month):
+    """Day of a month on which a subscription renewing monthly from renewal_date renews, or None.
+
+    Renewals on the 29th-31st fall on the last day of shorter months, as in
+    analytics.project_monthly_renewals.
+    """
+    if (year, month) < (renewal_date.year, renewal_date.month):
+        return None
+    return min(renewal_date.day, calendar.monthrange(year, month)[1])
+
+def month_events(deadlines, subscriptions, year, month):
+    """Returns the deadlines and renewals of a month, grouped by day of the month.
+
+    Subscriptions renew every month from their renewal date on; their own
+    renewal deadlines are left out, so that each renewal is listed once.
+    """
+    events = {}
+
+    for deadline in deadlines:
+        if deadline.get("subscription_id"):
+            continue
+        if deadline["date"].year == year and deadline["date"].month == month:
+            events.setdefault(deadline["date"].day, []).append({
+                "title": deadline["title"],
+                "type": "deadline",
+                "id": deadline["id"],
+                "category": deadline["category"]
+            })
+
+    for sub in subscriptions:
+        day = monthly_renewal_day(sub["renewal_date"], year, month)
+        if day is not None:
+            events.setdefault(day, []).append({
+                "title": f"Renewal {sub.get('name', 'Unnamed')}",
+                "type": "subscription",
+                "id": sub.get("id", 0),
+                "cost": sub.get("cost", 0),
+                "currency": sub.get("currency", DEFAULT_CURRENCY)
+            })
+
+    return events
+
+def calendar_years(deadlines, subscriptions, current_year):
+    """Years from the earliest deadline (or this year) to the latest (or two years ahead)"""
+    years = [d["date"].year for d in deadlines]
+    years += [sub["renewal_date"].year for sub in subscriptions]
+    return list(range(min(years + [current_year]), max(years + [current_year + 2]) + 1))
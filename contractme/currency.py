@@ -0,0 +1,74 @@
+"""Dated exchange rates and vectorized currency conversion."""
+import csv
+import os
+from datetime import date
+
+import numpy as np
+
+from contractme.analytics import dates_to_datetime64
+from contractme.core import DEFAULT_CURRENCY
+
+RATES_FILE = os.environ.get("CONTRACTME_RATES_FILE", os.path.join(os.path.dirname(__file__), "rates.csv"))
+
+# Lookup keys are currency code * KEY_STRIDE + day, shifted so days before 1970 stay positive
+KEY_STRIDE = 1 << 32
+KEY_DAY_OFFSET = 1 << 31
+
+class RateTable:
+    """Exchange rates by currency and date, kept as sorted arrays.
+
+    Each rate is the value of one unit in dollars and holds from its date
+    until the next rate of the same currency. Dates before a currency's
+    first rate use that first rate.
+    """
+
+    def __init__(self, rows):
+        """rows are (date, currency, dollars per unit) tuples"""
+        self.currencies = sorted({currency for _, currency, _ in rows})
+        self.codes = {currency: code for code, currency in enumerate(self.currencies)}
+
+        codes = np.array([self.codes[currency] for _, currency, _ in rows], dtype=np.int64)
+        days = dates_to_datetime64((day for day, _, _ in rows), len(rows))
+        keys = self.keys(codes, days)
+        order = np.argsort(keys, kind="stable")
+
+        self.rate_keys = keys[order]
+        self.rates = np.array([rate for _, _, rate in rows], dtype=np.float64)[order]
+        self.first_rate = np.searchsorted(self.rate_keys, np.arange(len(self.currencies)) * KEY_STRIDE)
+
+    @classmethod
+    def load(cls, path=RATES_FILE):
+        """Reads a CSV file with date, currency and usd_per_unit columns"""
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = [(date.fromisoformat(row["date"]), row["currency"].strip().upper(), float(row["usd_per_unit"]))
+                    for row in csv.DictReader(f)]
+        return cls(rows)
+
+    @staticmethod
+    def keys(codes, days):
+        return codes * KEY_STRIDE + days.astype(np.int64) + KEY_DAY_OFFSET
+
+    def currency_codes(self, currencies, count):
+        """Codes of an iterable of currency names; unknown currencies raise KeyError"""
+        return np.fromiter((self.codes[currency] for currency in currencies), dtype=np.int64, count=count)
+
+    def rates_on(self, codes, days):
+        """Dollars per unit of each currency code on each day (datetime64[D]), in one search"""
+        position = np.searchsorted(self.rate_keys, self.keys(codes, days), side="right") - 1
+        return self.rates[np.maximum(position, self.first_rate[codes])]
+
+    def convert(self, amounts, codes, currency, days):
+        """Converts amounts in the currencies of codes to currency, at the rates of days"""
+        target = np.full(len(amounts), self.codes[currency], dtype=np.int64)
+        return amounts * self.rates_on(codes, days) / self.rates_on(target, days)
+
+def subscription_costs(subscriptions, rates, currency, day=None):
+    """Monthly costs of subscriptions in currency, at the rates of day (or each renewal date)"""
+    count = len(subscriptions)
+    amounts = np.fromiter((sub["cost"] for sub in subscriptions), dtype=np.float64, count=count)
+    codes = rates.currency_codes((sub.get("currency", DEFAULT_CURRENCY) for sub in subscriptions), count)
+    if day is None:
+        days = dates_to_datetime64((sub["renewal_date"] for sub in subscriptions), count)
+    else:
+        days = np.full(count, np.datetime64(day, "D"))
+    return rates.convert(amounts, codes, currency, days)
@@ -0,0 +1,101 @@
+"""Undo and redo over the record changes of a session.
+
+History keeps changes, not copies of the data. A step is the list of
+(collection, before, after) records one action changed: before is None
+for an added record and after is None for a removed one. Records are
+copy-on-write (an update replaces the dict, it never modifies it), so a
+step holds the same record dicts as the data and the other steps, and
+costs memory in proportion to what its action changed.
+"""
+import threading
+import weakref
+from collections import deque
+from datetime import datetime
+
+HISTORY_LIMIT = 50  # Steps kept for undo; the oldest are dropped first
+
+class History:
+    """Bounded undo and redo stacks of steps.
+
+    Actions run between begin() and end(); the changes recorded meanwhile
+    make up their step. Changes recorded outside an action are not undoable.
+    """
+
+    def __init__(self, limit=HISTORY_LIMIT):
+        self.limit = limit
+        self.undo_steps = deque()
+        self.redo_steps = []
+        self.pending = None
+
+    def begin(self, label, when=None):
+        self.pending = {"label": label, "time": when or datetime.now(), "changes": []}
+
+    def record(self, collection, before, after):
+        if self.pending is not None:
+            self.pending["changes"].append((collection, before, after))
+
+    def end(self):
+        """Closes the action's step; returns the steps dropped to make room for it.
+
+        A new step drops the undone steps, which can no longer be redone,
+        and the oldest steps beyond the limit.
+        """
+        step, self.pending = self.pending, None
+        if not step or not step["changes"]:
+            return []
+
+        dropped = self.redo_steps
+        self.redo_steps = []
+        self.undo_steps.append(step)
+        while len(self.undo_steps) > self.limit:
+            dropped.append(self.undo_steps.popleft())
+        return dropped
+
+    def undo(self):
+        """Moves the last step to the redo stack; returns it and the changes that revert it, or None"""
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        self.redo_steps.append(step)
+        return step, [(collection, after, before) for collection, before, after in reversed(step["changes"])]
+
+    def redo(self):
+        """Moves the last undone step back; returns it and its changes, or None"""
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        self.undo_steps.append(step)
+        return step, list(step["changes"])
+
+    def steps(self):
+        """Undoable steps, most recent first"""
+        return list(reversed(self.undo_steps))
+
+    def records(self, collection):
+        """Every version of the records of a collection the steps hold"""
+        return step_records((*self.undo_steps, *self.redo_steps), collection)
+
+class HistoryRegistry:
+    """The histories of the open sessions of a workspace, to tell which records they may bring back.
+
+    Histories are held weakly: one drops out when its session ends.
+    """
+
+    def __init__(self):
+        self.histories = weakref.WeakSet()
+        self.lock = threading.Lock()
+
+    def add(self, history):
+        with self.lock:
+            self.histories.add(history)
+
+    def records(self, collection):
+        """Every version of the records of a collection the steps of the open sessions hold"""
+        with self.lock:
+            histories = list(self.histories)
+        return [record for history in histories for record in history.records(collection)]
+
+def step_records(steps, collection):
+    """Every version of the records of a collection the steps hold"""
+    return [record for step in steps for changed, before, after in step["changes"] if changed == collection
+            for record in (before, after) if record is not None]
@@ -0,0 +1,152 @@
+"""iCalendar (RFC 5545) export and import of deadlines and renewals."""
+import itertools
+import re
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from contractme.core import DEFAULT_CURRENCY, deadline_uid, format_money, subscription_uid
+
+def ics_escape(text):
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+def ics_unescape(text):
+    if "\\" not in text:
+        return text
+    return re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), text)
+
+def ics_fold(line):
+    """Folds a content line into 75-octet pieces, as RFC 5545 requires"""
+    if len(line.encode("utf-8")) <= 75:
+        return line + "\r\n"
+
+    pieces = []
+    current = ""
+    current_bytes = 0
+    for char in line:
+        char_bytes = len(char.encode("utf-8"))
+        # Continuation lines start with a space, which counts towards the limit
+        if current_bytes + char_bytes > (75 if not pieces else 74):
+            pieces.append(current)
+            current = ""
+            current_bytes = 0
+        current += char
+        current_bytes += char_bytes
+    pieces.append(current)
+    return "\r\n ".join(pieces) + "\r\n"
+
+def ics_event(uid, start_date, summary, description="", category=None, rrule=None, dtstamp=""):
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{dtstamp}",
+        f"DTSTART;VALUE=DATE:{start_date.strftime('%Y%m%d')}",
+        f"DTEND;VALUE=DATE:{(start_date + timedelta(days=1)).strftime('%Y%m%d')}",
+        f"SUMMARY:{ics_escape(summary)}",
+    ]
+    if description:
+        lines.append(f"DESCRIPTION:{ics_escape(description)}")
+    if category:
+        lines.append(f"CATEGORIES:{ics_escape(category)}")
+    if rrule:
+        lines.append(f"RRULE:{rrule}")
+    lines.append("END:VEVENT")
+    return "".join(ics_fold(line) for line in lines)
+
+def iter_ics(deadlines, subscriptions):
+    """Yields an iCalendar feed one VEVENT at a time.
+
+    Subscription renewals are exported as monthly recurring events, so the
+    renewal deadlines created for them are not exported a second time.
+    """
+    dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//ContractME//Deadlines//EN\r\nCALSCALE:GREGORIAN\r\n"
+
+    for deadline in deadlines:
+        if deadline.get("subscription_id"):
+            continue
+        yield ics_event(deadline_uid(deadline), deadline["date"], deadline["title"], deadline.get("description", ""),
+                        deadline.get("category"), dtstamp=dtstamp)
+
+    for sub in subscriptions:
+        name = sub.get("name", "Unnamed")
+        yield ics_event(subscription_uid(sub), sub["renewal_date"], f"Renewal {name}",
+                        f"Subscription renewal '{name}' - "
+                        f"{format_money(sub.get('cost', 0), sub.get('currency', DEFAULT_CURRENCY))}",
+                        "Subscriptions", rrule="FREQ=MONTHLY", dtstamp=dtstamp)
+
+    yield "END:VCALENDAR\r\n"
+
+def write_ics(f, deadlines, subscriptions):
+    for chunk in iter_ics(deadlines, subscriptions):
+        f.write(chunk.encode("utf-8"))
+
+def export_ics_file(deadlines, subscriptions):
+    """Writes the feed to a temporary file and returns it, rewound, for download"""
+    f = tempfile.TemporaryFile()
+    write_ics(f, deadlines, subscriptions)
+    f.seek(0)
+    return f
+
+ICS_DATE_PATTERN = re.compile(r"(\d{4})(\d{2})(\d{2})(T\d{6}Z?)?")
+
+def parse_ics_date(value):
+    """Reads a DTSTART value; raises ValueError unless it is a valid date"""
+    # Dates may be plain (20250131) or date-times (20250131T090000Z)
+    match = ICS_DATE_PATTERN.fullmatch(value.strip())
+    if match is None:
+        raise ValueError(f"Invalid date: {value!r}")
+    year, month, day = (int(part) for part in match.group(1, 2, 3))
+    try:
+        return datetime(year, month, day).date()
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r}") from None
+
+def parse_ics(lines, skipped=None):
+    """Yields the VEVENTs of an iCalendar stream as dicts, reading it line by line.
+
+    Events without a valid start date are left out; if skipped is a list,
+    a message saying why is appended to it for each.
+    """
+    event = None
+    pending = None
+
+    def handle(line):
+        nonlocal event
+        name_part, _, value = line.partition(":")
+        name = name_part.split(";", 1)[0].upper()
+
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            event = {}
+        elif name == "END" and value.upper() == "VEVENT":
+            finished, event = event, None
+            return finished
+        elif event is not None:
+            if name == "DTSTART":
+                try:
+                    event["date"] = parse_ics_date(value)
+                except ValueError as e:
+                    event["error"] = str(e)
+            elif name in ("SUMMARY", "DESCRIPTION", "UID", "RRULE"):
+                event[name.lower()] = ics_unescape(value)
+            elif name == "CATEGORIES":
+                event["category"] = ics_unescape(re.split(r"(?<!\\),", value)[0])
+        return None
+
+    for raw_line in itertools.chain(lines, [""]):
+        line = raw_line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            # Folded continuation of the previous line
+            pending += line[1:]
+            continue
+
+        if pending:
+            finished = handle(pending)
+            if finished is not None:
+                if "date" in finished and "error" not in finished:
+                    yield finished
+                elif skipped is not None:
+                    reason = finished.get("error", "No start date")
+                    skipped.append(f"{finished.get('summary') or finished.get('uid') or 'Event'}: {reason}")
+        pending = line
@@ -0,0 +1,39 @@
+"""Image processing for uploads, run in worker processes.
+
+Kept apart from the app so that pool workers only import Pillow, not
+Streamlit and the rest of the app.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+
+def is_readable_image(content):
+    """Whether Pillow can open an image from bytes, checked without decoding it"""
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.verify()
+    except (OSError, SyntaxError, ValueError):
+        return False
+    return True
+
+
+def make_image_preview(path, max_size):
+    """Saves a PNG thumbnail of a stored image, upright per its EXIF orientation.
+
+    Returns the path of the thumbnail, stored next to the image.
+    """
+    preview_path = path + ".preview.png"
+    with Image.open(path) as image:
+        # draft() lets the JPEG decoder downscale while decoding, which is much cheaper
+        image.draft("RGB", max_size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(max_size)
+
+        if image.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+            # PNG cannot store modes such as CMYK
+            image = image.convert("RGB")
+
+        image.save(preview_path, format="PNG")
+
+    return preview_path
@@ -0,0 +1,349 @@
+"""In-memory indexes over the records."""
+import bisect
+import math
+from datetime import timedelta
+
+DUPLICATE_THRESHOLD = 0.6  # Trigram similarity from which two names look like the same thing
+DUPLICATE_LIMIT = 5  # Likely duplicates offered at most
+MIN_DESCRIPTION_CHARS = 20  # Shorter descriptions are too generic to compare
+
+SEARCH_THRESHOLD = 0.5  # Trigram similarity from which a word matches a search word with a typo
+SEARCH_LIMIT = 8  # Results returned by a search
+SEARCH_PREFIX_SCAN = 200  # Prefix matches looked at per search, for queries matching many titles
+
+# Field holding the title of the records of each collection
+TITLE_FIELDS = {"documents": "name", "deadlines": "title", "subscriptions": "name"}
+
+def document_file_type(doc):
+    return doc["filename"].split(".")[-1].upper()
+
+class DocumentIndex:
+    """Inverted indexes from document attributes to document IDs.
+
+    Kept up to date on add and remove, so filters are answered by
+    intersecting ID sets and facet counts are set sizes, without scanning
+    the documents.
+    """
+
+    def __init__(self, documents=()):
+        self.documents = {}  # ID -> document
+        self.by_category = {}  # Category -> IDs
+        self.by_file_type = {}  # File type -> IDs
+        self.with_expiry = set()
+        self.upload_dates = []  # Sorted (upload date, ID) pairs
+        self.names = DuplicateIndex()
+        for doc in documents:
+            self.add(doc)
+
+    def add(self, doc):
+        doc_id = doc["id"]
+        self.documents[doc_id] = doc
+        self.by_category.setdefault(doc["category"], set()).add(doc_id)
+        self.by_file_type.setdefault(document_file_type(doc), set()).add(doc_id)
+        if doc.get("expiry_date"):
+            self.with_expiry.add(doc_id)
+        bisect.insort(self.upload_dates, (doc["upload_date"], doc_id))
+        self.names.add(doc)
+
+    def remove(self, doc):
+        doc_id = doc["id"]
+        if self.documents.pop(doc_id, None) is None:
+            return
+        for postings, key in ((self.by_category, doc["category"]), (self.by_file_type, document_file_type(doc))):
+            ids = postings.get(key)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del postings[key]
+        self.with_expiry.discard(doc_id)
+        position = bisect.bisect_left(self.upload_dates, (doc["upload_date"], doc_id))
+        if position < len(self.upload_dates) and self.upload_dates[position][1] == doc_id:
+            del self.upload_dates[position]
+        self.names.remove(doc)
+
+    def get(self, doc_id):
+        return self.documents.get(doc_id)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def duplicates(self, name):
+        """Documents whose name looks like name, with their similarity, best first"""
+        return self.names.duplicates(name)
+
+    def category_counts(self):
+        return {category: len(ids) for category, ids in self.by_category.items()}
+
+    def file_type_counts(self):
+        return {file_type: len(ids) for file_type, ids in self.by_file_type.items()}
+
+    def uploaded_between(self, start=None, end=None):
+        low = 0 if start is None else bisect.bisect_left(self.upload_dates, (start,))
+        high = len(self.upload_dates) if end is None else bisect.bisect_left(self.upload_dates, (end + timedelta(days=1),))
+        return {doc_id for _, doc_id in self.upload_dates[low:high]}
+
+    def query(self, categories=None, file_types=None, uploaded_from=None, uploaded_to=None, has_expiry=None):
+        """Returns the IDs matching every given facet; empty facets match everything"""
+        constraints = []
+        if categories:
+            constraints.append(set().union(*(self.by_category.get(c, ()) for c in categories)))
+        if file_types:
+            constraints.append(set().union(*(self.by_file_type.get(t, ()) for t in file_types)))
+        if uploaded_from or uploaded_to:
+            constraints.append(self.uploaded_between(uploaded_from, uploaded_to))
+        if has_expiry is True:
+            constraints.append(self.with_expiry)
+        elif has_expiry is False:
+            constraints.append(self.documents.keys() - self.with_expiry)
+
+        if not constraints:
+            return set(self.documents)
+
+        # Intersect starting from the smallest set
+        constraints.sort(key=len)
+        result = set(constraints[0])
+        for ids in constraints[1:]:
+            result &= ids
+        return result
+
+def trigrams(text):
+    """The character trigrams of text, ignoring case and extra whitespace"""
+    text = " ".join(text.lower().split())
+    if not text:
+        return frozenset()
+    padded = f" {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+class NGramIndex:
+    """Character trigram index for finding texts similar to a given one.
+
+    Similarity is the Dice coefficient of the trigram sets, so "Netflix"
+    and "Netflix Premium" or "Netflx" score high. A text reaching the
+    threshold must share a minimum number of trigrams with the query, so
+    it appears in the postings of the query's rarest few trigrams: only
+    those postings are read (prefix filtering), not every text.
+    """
+
+    def __init__(self):
+        self.grams = {}  # Key -> trigrams
+        self.postings = {}  # Trigram -> keys
+
+    def add(self, key, text):
+        grams = trigrams(text or "")
+        if not grams:
+            return
+        self.grams[key] = grams
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        grams = self.grams.pop(key, None)
+        if grams is None:
+            return
+        for gram in grams:
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+
+    def __len__(self):
+        return len(self.grams)
+
+    def similar(self, text, threshold=DUPLICATE_THRESHOLD):
+        """Returns the (key, similarity) pairs reaching threshold, best first"""
+        grams = trigrams(text or "")
+        if not grams:
+            return []
+
+        # Dice >= threshold needs an overlap of at least threshold * n / (2 - threshold)
+        min_overlap = max(1, math.ceil(threshold * len(grams) / (2 - threshold) - 1e-9))
+        rarest = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+        candidates = set().union(*(self.postings.get(gram, ()) for gram in rarest[:len(grams) - min_overlap + 1]))
+
+        # Texts much shorter or longer than the query cannot reach the threshold either
+        shortest = min_overlap
+        longest = (2 - threshold) * len(grams) / threshold
+
+        matches = []
+        for key in candidates:
+            other = self.grams[key]
+            if not shortest <= len(other) <= longest:
+                continue
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if score >= threshold:
+                matches.append((key, score))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+
+class DuplicateIndex:
+    """Finds the records whose name or description looks like a new record's"""
+
+    def __init__(self, records=()):
+        self.records = {}  # ID -> record
+        self.names = NGramIndex()
+        self.descriptions = NGramIndex()
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        self.records[record["id"]] = record
+        self.names.add(record["id"], record.get("name"))
+        description = record.get("description") or ""
+        if len(description.strip()) >= MIN_DESCRIPTION_CHARS:
+            self.descriptions.add(record["id"], description)
+
+    def remove(self, record):
+        if self.records.pop(record["id"], None) is None:
+            return
+        self.names.remove(record["id"])
+        self.descriptions.remove(record["id"])
+
+    def __len__(self):
+        return len(self.records)
+
+    def duplicates(self, name, description="", limit=DUPLICATE_LIMIT):
+        """Returns (record, similarity) pairs of likely duplicates, best first"""
+        scores = dict(self.names.similar(name))
+        if len((description or "").strip()) >= MIN_DESCRIPTION_CHARS:
+            for key, score in self.descriptions.similar(description):
+                scores[key] = max(score, scores.get(key, 0))
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(self.records[key], score) for key, score in best]
+
+def normalize_title(text):
+    return " ".join((text or "").lower().split())
+
+class SearchIndex:
+    """Typeahead search over the titles of a collection's records.
+
+    Prefix matches come from a sorted list of every title's word suffixes
+    ("netflix premium" and "premium"), found by bisection. When they do
+    not fill the results, titles with a word spelled like a query word
+    ("netflx") are added, found through a trigram index of the distinct
+    words. Entries are looked up by ID on remove, so records changed in
+    place are removed correctly.
+    """
+
+    def __init__(self, field, records=()):
+        self.field = field
+        self.titles = {}  # ID -> title
+        self.suffixes = []  # Sorted (word suffix, ID) pairs
+        self.words = {}  # Word -> IDs of the titles with it
+        self.vocabulary = NGramIndex()  # Trigrams of the words
+
+        # Sort the initial suffixes once rather than inserting them one by one
+        for record in records:
+            self.index_words(record["id"], record.get(field) or "")
+        self.suffixes = sorted((suffix, record_id) for record_id, title in self.titles.items()
+                               for suffix in self.word_suffixes(title))
+
+    def index_words(self, record_id, title):
+        self.titles[record_id] = title
+        for word in set(normalize_title(title).split()):
+            if word not in self.words:
+                self.words[word] = set()
+                self.vocabulary.add(word, word)
+            self.words[word].add(record_id)
+
+    def add(self, record):
+        self.remove(record)
+        title = record.get(self.field) or ""
+        self.index_words(record["id"], title)
+        for suffix in self.word_suffixes(title):
+            bisect.insort(self.suffixes, (suffix, record["id"]))
+
+    def remove(self, record):
+        record_id = record["id"]
+        title = self.titles.pop(record_id, None)
+        if title is None:
+            return
+        for word in set(normalize_title(title).split()):
+            ids = self.words[word]
+            ids.discard(record_id)
+            if not ids:
+                del self.words[word]
+                self.vocabulary.remove(word)
+        for suffix in self.word_suffixes(title):
+            position = bisect.bisect_left(self.suffixes, (suffix, record_id))
+            if position < len(self.suffixes) and self.suffixes[position] == (suffix, record_id):
+                del self.suffixes[position]
+
+    @staticmethod
+    def word_suffixes(title):
+        words = normalize_title(title).split()
+        return {" ".join(words[i:]) for i in range(len(words))}
+
+    def __len__(self):
+        return len(self.titles)
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Returns (score, ID) pairs of the best matches, best first.
+
+        Titles with a word starting with each word of the query score from
+        1 to 2, or from 2 to 3 if they start with the whole query (shorter
+        titles first). Titles matching the query words only with typos
+        score below 1.
+        """
+        query = normalize_title(query)
+        if not query:
+            return []
+        words = query.split(" ")
+
+        # Suffixes starting with each query word, read for the word that starts the fewest
+        bounds = {word: (bisect.bisect_left(self.suffixes, (word,)),
+                         bisect.bisect_left(self.suffixes, (word + "\U0010ffff",))) for word in set(words)}
+        low, high = min(bounds.values(), key=lambda bound: bound[1] - bound[0])
+
+        scores = {}
+        for _, record_id in self.suffixes[low:min(high, low + SEARCH_PREFIX_SCAN)]:
+            if record_id in scores:
+                continue
+            title = normalize_title(self.titles[record_id])
+            title_words = title.split(" ")
+            if all(any(title_word.startswith(word) for title_word in title_words) for word in words):
+                scores[record_id] = (2 if title.startswith(query) else 1) + len(query) / len(title)
+
+        if len(scores) < limit:
+            misspelled = [word for word in words if bounds[word][0] == bounds[word][1]]
+            for record_id, score in self.typo_matches(words, misspelled):
+                scores.setdefault(record_id, score)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(score, record_id) for record_id, score in best]
+
+    def typo_matches(self, words, misspelled):
+        """(ID, score) pairs of the titles where each query word starts a word or is spelled like one.
+
+        misspelled are the query words that start no word at all.
+        """
+        if not misspelled or any(len(word) < 3 for word in misspelled):
+            return []
+        similar = {word: dict(self.vocabulary.similar(word, SEARCH_THRESHOLD)) for word in misspelled}
+        if not all(similar.values()):
+            return []
+
+        # Titles with a word like the misspelled word that has the fewest such titles
+        rarest = min(similar, key=lambda word: sum(len(self.words[w]) for w in similar[word]))
+        candidates = set().union(*(self.words[w] for w in similar[rarest]))
+
+        matches = []
+        for record_id in candidates:
+            title_words = normalize_title(self.titles[record_id]).split(" ")
+            total = 0
+            for word in words:
+                best = max((1 if title_word.startswith(word) else similar.get(word, {}).get(title_word, 0)
+                            for title_word in title_words), default=0)
+                if not best:
+                    break
+                total += best
+            else:
+                matches.append((record_id, total / len(words)))
+        return matches
+
+def search_all(indexes, query, limit=SEARCH_LIMIT):
+    """Searches the SearchIndex of each collection; returns the best (score, collection, ID) triples"""
+    results = [(score, collection, record_id)
+               for collection, index in indexes.items()
+               for score, record_id in index.search(query, limit)]
+    results.sort(key=lambda result: result[0], reverse=True)
+    return results[:limit]
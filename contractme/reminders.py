@@ -0,0 +1,218 @@
+"""Deadline reminders: a scheduler thread and the sinks it delivers to."""
+import heapq
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from collections import deque
+from datetime import date, datetime, timedelta
+
+REMINDER_LEAD_DAYS = [7, 1, 0]  # Days before a deadline a reminder fires
+REMINDER_HOUR = 9  # Local hour reminders fire at
+REMINDER_INBOX_SIZE = 50  # Reminders kept for display
+
+def reminder_time(due_date, lead):
+    """When the reminder lead days ahead of a due date is meant to fire"""
+    reminder_day = due_date - timedelta(days=lead)
+    return datetime(reminder_day.year, reminder_day.month, reminder_day.day, REMINDER_HOUR)
+
+class ReminderScheduler:
+    """Fires reminders ahead of deadlines from a background thread.
+
+    Pending fire times live in a min-heap, so scheduling and firing cost
+    O(log n). Cancelled or rescheduled items leave stale heap entries behind
+    that are skipped when they come up.
+
+    Each reminder fires once: the (due date, lead days) of the reminders
+    fired for each key are remembered, in fired_file if given so that
+    restarts remember them too, and scheduling an item again skips them.
+    """
+
+    def __init__(self, sinks, lead_days=REMINDER_LEAD_DAYS, fired_file=None):
+        self.sinks = sinks
+        self.lead_days = sorted(lead_days, reverse=True)
+        self.heap = []  # (fire_at, version, key, lead_days)
+        self.items = {}  # key -> [version, item, pending reminders]
+        self.pending = 0  # Live heap entries, i.e. the sum of pending reminders
+        self.versions = itertools.count()
+        self.condition = threading.Condition()
+        self.fired_file = fired_file
+        self.fired = self.load_fired()  # key -> (due date, lead days) of the reminders fired
+        threading.Thread(target=self.run, name="reminder-scheduler", daemon=True).start()
+
+    def schedule(self, key, item, now=None):
+        """Schedules (or reschedules) the reminders of an item with a due_date that have not fired yet"""
+        now = now or datetime.now()
+        due_date = item["due_date"]
+        fire_times = []
+
+        for lead in self.lead_days:
+            fire_at = reminder_time(due_date, lead)
+            if fire_at >= now:
+                fire_times.append((fire_at, lead))
+            elif due_date >= now.date():
+                # The lead time has already started: fire the closest missed reminder now
+                fire_times = [(now, lead)]
+
+        with self.condition:
+            fired = self.fired.get(key, ())
+            fire_times = [(fire_at, lead) for fire_at, lead in fire_times if (due_date, lead) not in fired]
+            version = next(self.versions)
+            self.forget(key)
+            if fire_times:
+                self.items[key] = [version, item, len(fire_times)]
+                self.pending += len(fire_times)
+
+            for fire_at, lead in fire_times:
+                heapq.heappush(self.heap, (fire_at, version, key, lead))
+
+            self.compact()
+            self.condition.notify()
+
+    def cancel(self, key):
+        with self.condition:
+            self.forget(key)
+
+    def forget(self, key):
+        entry = self.items.pop(key, None)
+        if entry is not None:
+            self.pending -= entry[2]
+
+    def compact(self):
+        # Rebuild the heap once stale entries outnumber live ones
+        if len(self.heap) > 2 * self.pending + 64:
+            live_versions = {key: entry[0] for key, entry in self.items.items()}
+            self.heap = [e for e in self.heap if live_versions.get(e[2]) == e[1]]
+            heapq.heapify(self.heap)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+
+                    fire_at, version, key, lead = self.heap[0]
+                    delay = (fire_at - datetime.now()).total_seconds()
+                    if delay > 0:
+                        self.condition.wait(timeout=delay)
+                        continue
+
+                    heapq.heappop(self.heap)
+                    entry = self.items.get(key)
+                    if entry is None or entry[0] != version:
+                        continue  # Cancelled or rescheduled
+
+                    entry[2] -= 1
+                    self.pending -= 1
+                    if entry[2] == 0:
+                        del self.items[key]
+                    reminder = dict(entry[1], key=key, lead_days=lead, fired_at=datetime.now())
+                    self.fired.setdefault(key, set()).add((reminder["due_date"], lead))
+                    fired = self.prune_fired(reminder["fired_at"].date())
+                    break
+
+            # The fired file and sinks are written outside the lock so they cannot block scheduling;
+            # the file goes first so that a restart never fires a delivered reminder again
+            self.save_fired(fired)
+            for sink in self.sinks:
+                try:
+                    sink(reminder)
+                except Exception:
+                    logging.getLogger(__name__).exception("Reminder sink failed")
+
+    def prune_fired(self, today):
+        """Forgets the reminders of past due dates, which are never scheduled again; returns a copy to save"""
+        for key in list(self.fired):
+            self.fired[key] = {(due_date, lead) for due_date, lead in self.fired[key] if due_date >= today}
+            if not self.fired[key]:
+                del self.fired[key]
+        return {key: sorted([due_date.isoformat(), lead] for due_date, lead in reminders)
+                for key, reminders in self.fired.items()}
+
+    def load_fired(self):
+        if not self.fired_file:
+            return {}
+        try:
+            with open(self.fired_file, encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logging.getLogger(__name__).exception("Unreadable fired reminders file %s", self.fired_file)
+            return {}
+        return {key: {(date.fromisoformat(due_date), lead) for due_date, lead in reminders}
+                for key, reminders in stored.items()}
+
+    def save_fired(self, fired):
+        if not self.fired_file:
+            return
+        directory = os.path.dirname(self.fired_file) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, part_path = tempfile.mkstemp(dir=directory, suffix=".part")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(fired, f)
+                os.replace(part_path, self.fired_file)
+            except BaseException:
+                os.remove(part_path)
+                raise
+        except OSError:
+            logging.getLogger(__name__).exception("Could not save fired reminders")
+
+def reminder_text(reminder):
+    # Missed reminders fire late, so count from when it actually fired
+    days_left = (reminder["due_date"] - reminder["fired_at"].date()).days
+    when = "today" if days_left == 0 else "tomorrow" if days_left == 1 else f"in {days_left} days"
+    return f"{reminder['title']} is due {when} ({reminder['due_date'].strftime('%m/%d/%Y')})"
+
+def log_reminder_sink(reminder):
+    logging.getLogger("contractme.reminders").info(reminder_text(reminder))
+
+class FileDropReminderSink:
+    """Writes each reminder as a JSON file into a directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, reminder):
+        file_name = f"{reminder['fired_at'].strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.json"
+        with open(os.path.join(self.directory, file_name), "w") as f:
+            json.dump(reminder, f, default=str)
+
+class InboxReminderSink:
+    """Stand-in notifier: keeps the latest reminders of each workspace for display"""
+
+    def __init__(self, size=REMINDER_INBOX_SIZE):
+        self.size = size
+        self.inboxes = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, reminder):
+        with self.lock:
+            inbox = self.inboxes.setdefault(reminder.get("workspace"), deque(maxlen=self.size))
+            inbox.append(reminder)
+
+    def recent(self, workspace=None):
+        with self.lock:
+            return list(self.inboxes.get(workspace, ()))
+
+def deadline_reminder_key(deadline, workspace=None):
+    """Scheduler key of a deadline; deadline IDs are only unique within a workspace"""
+    key = f"deadline:{deadline['id']}"
+    return f"{workspace}:{key}" if workspace else key
+
+def deadline_reminder(deadline, workspace=None):
+    """The item a scheduler reminds of for a deadline"""
+    return {
+        "kind": "renewal" if deadline.get("subscription_id") else "deadline",
+        "title": deadline["title"],
+        "due_date": deadline["date"],
+        "workspace": workspace
+    }
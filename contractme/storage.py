@@ -0,0 +1,227 @@
+"""Content-addressed storage of uploaded files, with line indexes for text files."""
+import codecs
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from contractme.store import DATA_FILE
+
+def storage_dir_of(data_file):
+    """Where the files of a data file's documents are stored: next to it, in its workspace"""
+    return os.path.join(os.path.dirname(data_file) or ".", "files")
+
+STORAGE_DIR = storage_dir_of(DATA_FILE)
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes read from an upload per iteration
+TEXT_PREVIEW_CHARS = 2000
+TEXT_VIEWER_MAX_PAGE_BYTES = 256 * 1024  # Guards against files with very long lines
+
+IMAGE_EXTENSIONS = ["jpg", "jpeg", "png"]
+TEXT_EXTENSIONS = ["txt", "md"]
+
+# Files stored next to a stored upload
+DERIVED_SUFFIXES = [".lines.npy", ".preview.png"]
+
+def document_type(file_extension):
+    """Returns how a file is previewed: image, pdf, text, or an empty string for anything else"""
+    if file_extension in IMAGE_EXTENSIONS:
+        return "image"
+    if file_extension == "pdf":
+        return "pdf"
+    if file_extension in TEXT_EXTENSIONS:
+        return "text"
+    return ""
+
+def detect_text_encoding(head):
+    """Guesses the encoding of a text file from its first bytes"""
+    # UTF-32 BOMs start with the UTF-16 ones, so they must be checked first
+    boms = [
+        (codecs.BOM_UTF32_LE, "utf-32"),
+        (codecs.BOM_UTF32_BE, "utf-32"),
+        (codecs.BOM_UTF8, "utf-8-sig"),
+        (codecs.BOM_UTF16_LE, "utf-16"),
+        (codecs.BOM_UTF16_BE, "utf-16"),
+    ]
+    for bom, encoding in boms:
+        if head.startswith(bom):
+            return encoding
+
+    try:
+        # final=False tolerates a multi-byte character cut at the end of the chunk
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+def ingest_upload(uploaded_file, file_extension, max_bytes, storage_dir=STORAGE_DIR):
+    """Streams an upload to storage chunk by chunk, hashing it on the way.
+
+    Text files are decoded incrementally and stored as UTF-8, together with
+    an index of their line offsets. Raises ValueError as soon as more than
+    max_bytes have been read.
+    """
+    os.makedirs(storage_dir, exist_ok=True)
+
+    sha256 = hashlib.sha256()
+    size = 0
+    decoder = None
+    encoding = None
+    preview_parts = []
+    preview_chars = 0
+    newline_offsets = []
+    text_bytes = 0
+
+    uploaded_file.seek(0)
+    fd, part_path = tempfile.mkstemp(dir=storage_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = uploaded_file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"The file exceeds the allowed size of {max_bytes / (1024 * 1024):.0f} MB.")
+
+                sha256.update(chunk)
+
+                if file_extension in TEXT_EXTENSIONS:
+                    if decoder is None:
+                        encoding = detect_text_encoding(chunk)
+                        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+                    text = decoder.decode(chunk)
+                    if preview_chars < TEXT_PREVIEW_CHARS:
+                        preview_parts.append(text[:TEXT_PREVIEW_CHARS - preview_chars])
+                        preview_chars += len(preview_parts[-1])
+                else:
+                    out.write(chunk)
+                    continue
+
+                encoded = text.encode("utf-8")
+                newline_offsets.append(np.flatnonzero(np.frombuffer(encoded, dtype=np.uint8) == 10) + text_bytes)
+                text_bytes += len(encoded)
+                out.write(encoded)
+
+            if decoder is not None:
+                encoded = decoder.decode(b"", final=True).encode("utf-8")
+                newline_offsets.append(np.flatnonzero(np.frombuffer(encoded, dtype=np.uint8) == 10) + text_bytes)
+                text_bytes += len(encoded)
+                out.write(encoded)
+    except BaseException:
+        os.remove(part_path)
+        raise
+
+    # Files are stored under their content hash, so identical uploads share one file
+    digest = sha256.hexdigest()
+    path = os.path.join(storage_dir, f"{digest}.{file_extension}")
+    os.replace(part_path, path)
+
+    line_count = None
+    if decoder is not None:
+        line_starts = line_starts_from_newlines(newline_offsets, text_bytes)
+        save_line_index(path, line_starts)
+        line_count = len(line_starts)
+
+    return {
+        "path": path,
+        "sha256": digest,
+        "size": size,
+        "encoding": encoding,
+        "line_count": line_count,
+        "text_preview": "".join(preview_parts) if decoder is not None else None
+    }
+
+def save_line_index(path, line_starts):
+    """Writes the line index of a stored file, replacing any previous one atomically.
+
+    The previous index may be memory-mapped by a viewer: truncating it in
+    place would crash the process reading it.
+    """
+    fd, part_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, line_starts)
+        os.replace(part_path, path + ".lines.npy")
+    except BaseException:
+        os.remove(part_path)
+        raise
+
+def line_starts_from_newlines(newline_offsets, total_bytes):
+    """Turns newline byte offsets into the start offset of every line"""
+    newlines = np.concatenate(newline_offsets) if newline_offsets else np.empty(0, dtype=np.int64)
+    starts = np.concatenate(([0], newlines + 1)).astype(np.int64)
+    # A trailing newline does not open another line, and an empty file has none
+    return starts[starts < total_bytes]
+
+def read_stored_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def release_stored_file(doc, documents):
+    """Deletes the stored file of a document unless one of documents shares it"""
+    path = doc.get("path")
+    if not path:
+        return
+    if any(other.get("path") == path for other in documents if other is not doc):
+        return
+    for stored_path in [path] + [path + suffix for suffix in DERIVED_SUFFIXES]:
+        if os.path.exists(stored_path):
+            os.remove(stored_path)
+
+def release_unreferenced_files(documents, min_age_seconds=0, storage_dir=STORAGE_DIR):
+    """Deletes the stored files, and their derived files, that no document refers to.
+
+    Files written less than min_age_seconds ago are kept, as they may
+    belong to an upload still in progress. Returns how many were deleted.
+    """
+    if not os.path.isdir(storage_dir):
+        return 0
+    referenced = {os.path.abspath(doc["path"]) for doc in documents if doc.get("path")}
+    referenced |= {path + suffix for path in referenced for suffix in DERIVED_SUFFIXES}
+    cutoff = time.time() - min_age_seconds
+
+    deleted = 0
+    for entry in os.scandir(storage_dir):
+        if entry.is_file() and not entry.name.endswith(".part") and os.path.abspath(entry.path) not in referenced \
+                and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            deleted += 1
+    return deleted
+
+def open_line_index(path):
+    """Returns the line start offsets of a stored text file, memory-mapped"""
+    index_path = path + ".lines.npy"
+    if not os.path.exists(index_path):
+        # Build the index for files stored before it was precomputed
+        with open(path, "rb") as f:
+            data = f.read()
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+        save_line_index(path, line_starts_from_newlines([newlines], len(data)))
+    return np.load(index_path, mmap_mode="r")
+
+def read_text_lines(path, line_starts, first_line, line_count):
+    """Reads up to line_count lines starting at first_line without loading the whole file.
+
+    Returns the text and the index of the line after the last one read.
+    Pages stop at the last line that fits in TEXT_VIEWER_MAX_PAGE_BYTES; a
+    first line longer than that is cut short.
+    """
+    if first_line >= len(line_starts):
+        return "", first_line
+
+    file_size = os.path.getsize(path)
+    end_line = min(first_line + line_count, len(line_starts))
+    start_byte = int(line_starts[first_line])
+    end_byte = int(line_starts[end_line]) if end_line < len(line_starts) else file_size
+    if end_byte - start_byte > TEXT_VIEWER_MAX_PAGE_BYTES:
+        limit = start_byte + TEXT_VIEWER_MAX_PAGE_BYTES
+        # Lines end where the next starts, so those starting up to the limit but the last end within it
+        end_line = max(int(np.searchsorted(line_starts, limit, side="right")) - 1, first_line + 1)
+        end_byte = min(int(line_starts[end_line]) if end_line < len(line_starts) else file_size, limit)
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm[start_byte:end_byte].decode("utf-8", errors="replace"), end_line
@@ -0,0 +1,149 @@
+"""Persistent store: all records in one JSON file, rewritten atomically.
+
+Every save bumps a version number kept in the file, so readers can tell
+whether the data changed since they loaded it. The app, the command line
+and the API may all write to a data file: each writer holds locked(path)
+from loading the latest data to saving it, so none overwrites another's
+changes or allocates the same record IDs.
+
+A data file belongs to one workspace: the directory holding it also holds
+the files of its documents and its archive. DATA_FILE is the default
+workspace of the command line and the API; the app gives each user a
+workspace of their own under WORKSPACES_DIR.
+"""
+import json
+import os
+import re
+import secrets
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers in other processes are not kept out
+    fcntl = None
+
+from contractme.core import DEFAULT_CATEGORIES
+
+DATA_DIR = os.environ.get("CONTRACTME_DATA_DIR", os.path.join(os.path.expanduser("~"), ".contractme"))
+DATA_FILE = os.path.join(DATA_DIR, "data.json")
+WORKSPACES_DIR = os.path.join(DATA_DIR, "workspaces")
+
+# Workspace keys name directories, so only URL-safe characters are accepted
+WORKSPACE_KEY_PATTERN = re.compile(r"[A-Za-z0-9_-]{16,64}")
+
+COLLECTIONS = ("documents", "deadlines", "subscriptions")
+
+# Entries of the data mapping that are stored
+FIELDS = COLLECTIONS + ("categories", "id_counters")
+
+DATE_FIELDS = {"date", "upload_date", "expiry_date", "renewal_date"}
+
+def empty_data():
+    return {
+        "documents": [],
+        "deadlines": [],
+        "subscriptions": [],
+        "categories": list(DEFAULT_CATEGORIES),
+        "id_counters": {},
+        "version": 0
+    }
+
+def new_workspace_key():
+    """A random, unguessable workspace key"""
+    return secrets.token_urlsafe(16)
+
+def is_workspace_key(key):
+    return isinstance(key, str) and WORKSPACE_KEY_PATTERN.fullmatch(key) is not None
+
+def workspace_data_file(key):
+    """The data file of the workspace with this key"""
+    if not is_workspace_key(key):
+        raise ValueError(f"Invalid workspace key: {key!r}")
+    return os.path.join(WORKSPACES_DIR, key, "data.json")
+
+def encode_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Cannot store {type(value).__name__} values")
+
+def decode_record(record):
+    for field in DATE_FIELDS.intersection(record):
+        if isinstance(record[field], str):
+            record[field] = date.fromisoformat(record[field])
+    return record
+
+# Data files whose lock each thread holds, so that a holder can lock again
+_held = threading.local()
+
+@contextmanager
+def locked(path=DATA_FILE):
+    """Holds the exclusive lock of a data file, across processes and threads.
+
+    The lock is a companion file, so it survives the data file being
+    replaced by saves. A thread that holds it already just goes on.
+    """
+    held = _held.__dict__.setdefault("paths", set())
+    if path in held:
+        yield
+        return
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    with open(path + ".lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)  # Closing the file releases the lock
+
+def file_stamp(path=DATA_FILE):
+    """Identifies the saved state of a data file, or None if nothing was saved yet.
+
+    Saves replace the file, so its inode changes even when two saves fall
+    within the resolution of the modification time.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def load_data(path=DATA_FILE):
+    """Returns the stored data, or empty data if nothing was saved yet"""
+    data = empty_data()
+    try:
+        with open(path, encoding="utf-8") as f:
+            data.update(json.load(f, object_hook=decode_record))
+    except FileNotFoundError:
+        pass
+    return data
+
+def save_data(data, path=DATA_FILE):
+    """Writes the FIELDS of data to the store and returns the new version.
+
+    The file is replaced atomically, so readers never see a partial write.
+    Writers do not merge: one that saves without holding locked(path) since
+    it loaded the data overwrites what others saved meanwhile.
+    """
+    version = data.get("version", 0) + 1
+    stored = {field: data[field] for field in FIELDS}
+    stored["version"] = version
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, part_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(stored, f, default=encode_value)
+        os.replace(part_path, path)
+    except BaseException:
+        os.remove(part_path)
+        raise
+
+    data["version"] = version
+    return version
@@ -0,0 +1,84 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from contractme import core
+from contractme.analytics import deadline_event_arrays, overload_periods, project_monthly_renewals
+
+def brute_force_periods(days, costs, window_days, max_events, max_cost):
+    """Overloaded periods by checking the window starting on every event day against every event"""
+    windows = []
+    for start in sorted(set(days)):
+        inside = [i for i, day in enumerate(days) if start <= day < start + window_days]
+        total = sum(costs[i] for i in inside)
+        if len(inside) > max_events or total > max_cost + 1e-9:
+            windows.append((start, max(days[i] for i in inside), len(inside), total))
+
+    periods = []
+    for start, last, count, total in windows:
+        if periods and start <= periods[-1]["last"]:
+            period = periods[-1]
+            period["last"] = max(period["last"], last)
+            period["peak_events"] = max(period["peak_events"], count)
+            period["peak_cost"] = max(period["peak_cost"], total)
+        else:
+            periods.append({"first": start, "last": last, "peak_events": count, "peak_cost": total})
+    for period in periods:
+        inside = [i for i, day in enumerate(days) if period["first"] <= day <= period["last"]]
+        period["events"] = len(inside)
+        period["cost"] = sum(costs[i] for i in inside)
+    return periods
+
+@pytest.mark.parametrize("seed", range(20))
+def test_overload_periods_match_a_brute_force_check(seed):
+    rng = np.random.default_rng(seed)
+    n_events = int(rng.integers(0, 120))
+    days = np.sort(rng.integers(0, 200, n_events))
+    costs = np.where(rng.random(n_events) < 0.3, rng.integers(1, 100, n_events).astype(float), 0.0)
+    window_days, max_events, max_cost = int(rng.integers(1, 10)), int(rng.integers(1, 6)), float(rng.integers(50, 300))
+
+    dates = np.datetime64("2025-01-01") + days
+    periods = overload_periods(dates, costs, window_days, max_events, max_cost)
+    expected = brute_force_periods(list(days), list(costs), window_days, max_events, max_cost)
+
+    origin = date(2025, 1, 1)
+    assert [((p["start"] - origin).days, (p["end"] - origin).days, p["events"], p["peak_events"])
+            for p in periods] == \
+        [(p["first"], p["last"], p["events"], p["peak_events"]) for p in expected]
+    assert [p["cost"] for p in periods] == pytest.approx([p["cost"] for p in expected])
+    assert [p["peak_cost"] for p in periods] == pytest.approx([p["peak_cost"] for p in expected])
+
+def test_window_at_exactly_the_limits_is_not_overloaded():
+    dates = np.datetime64("2025-01-01") + np.array([0, 1, 2])
+    assert overload_periods(dates, np.array([0.1, 0.2, 0.3]), 7, 3, 0.6) == []
+    assert len(overload_periods(dates, np.array([0.1, 0.2, 0.3]), 7, 2, 0.6)) == 1
+
+def test_projected_renewals_fall_on_the_last_day_of_shorter_months():
+    renewals = np.array(["2025-01-31"], dtype="datetime64[D]")
+    dates, costs, owner = project_monthly_renewals(renewals, np.array([9.0]), date(2025, 4, 30))
+    assert dates.tolist() == [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)]
+    assert costs.tolist() == [9.0] * 4 and owner.tolist() == [0] * 4
+
+def test_month_events_list_the_events_of_the_arrays():
+    """The calendar lists the same deadlines and renewals as the busy check counts"""
+    data = {"deadlines": [], "subscriptions": [], "categories": [], "id_counters": {}}
+    core.add_subscription(data, "Gym", "Fitness", date(2025, 1, 31), 30, "")
+    core.add_subscription(data, "Music", "Streaming", date(2025, 3, 15), 10, "")
+    for day in (3, 14, 28):
+        core.add_deadline(data, f"Task {day}", date(2025, 2, day), "", "Work")
+
+    dates, _, _, costs = deadline_event_arrays(data["deadlines"], data["subscriptions"], date(2025, 12, 31))
+    for month in range(1, 13):
+        in_month = dates.astype("datetime64[M]") == np.datetime64(f"2025-{month:02d}")
+        expected = sorted(d.day for d in dates[in_month].astype(object))
+        events = core.month_events(data["deadlines"], data["subscriptions"], 2025, month)
+        assert sorted(day for day, day_events in events.items() for _ in day_events) == expected
+
+def test_each_subscription_is_projected_from_its_own_month():
+    renewals = np.array(["1990-06-10", "2025-03-31", "2026-01-01"], dtype="datetime64[D]")
+    dates, costs, owner = project_monthly_renewals(renewals, np.array([1.0, 2.0, 3.0]), date(2025, 5, 15))
+    assert owner.tolist() == [0] * 420 + [1, 1]
+    assert dates[0] == np.datetime64("1990-06-10") and dates[419] == np.datetime64("2025-05-10")
+    assert dates[420:].tolist() == [date(2025, 3, 31), date(2025, 4, 30)]
+    assert costs.tolist() == [1.0] * 420 + [2.0, 2.0]
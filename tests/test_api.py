@@ -0,0 +1,151 @@
+import base64
+import json
+from datetime import date
+
+import pytest
+
+from contractme import api, core, store
+
+@pytest.fixture
+def data_file(tmp_path):
+    return str(tmp_path / "data.json")
+
+@pytest.fixture
+def client(data_file):
+    test_client = api.TestClient(api.Api(data_file))
+    yield test_client
+    test_client.close()
+
+def body(response):
+    return json.loads(response.body)
+
+def test_batch_create_then_list_pages(client, data_file):
+    items = [{"title": f"Deadline {i}", "date": "2025-06-01"} for i in range(5)]
+    response = client.post("/deadlines/batch", {"items": items})
+    assert response.status == 201
+    assert [d["id"] for d in body(response)["items"]] == [1, 2, 3, 4, 5]
+
+    page = body(client.get("/deadlines?offset=1&limit=2"))
+    assert [d["title"] for d in page["items"]] == ["Deadline 1", "Deadline 2"]
+    assert page["total"] == 5 and page["version"] == 1
+
+    saved = store.load_data(data_file)
+    assert saved["deadlines"][0]["date"] == date(2025, 6, 1)
+
+def test_get_one_record(client):
+    client.post("/subscriptions/batch", {"items": [{"name": "Gym", "renewal_date": "2025-04-01", "cost": 30}]})
+    assert body(client.get("/subscriptions/1"))["name"] == "Gym"
+    assert client.get("/subscriptions/2").status == 404
+
+def test_etag_answers_304_until_the_data_changes(client):
+    etag = client.get("/deadlines").headers["ETag"]
+    assert client.get("/deadlines", {"If-None-Match": etag}).status == 304
+
+    client.post("/deadlines/batch", {"items": [{"title": "Taxes", "date": "2025-04-15"}]})
+    response = client.get("/deadlines", {"If-None-Match": etag})
+    assert response.status == 200
+    assert response.headers["ETag"] != etag
+
+def test_ndjson_streams_every_record(client):
+    items = [{"title": f"Deadline {i}", "date": "2025-06-01"} for i in range(api.API_STREAM_CHUNK + 3)]
+    client.post("/deadlines/batch", {"items": items})
+    response = client.get("/deadlines?format=ndjson&offset=2")
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    lines = response.body.decode().splitlines()
+    assert len(lines) == len(items) - 2
+    assert json.loads(lines[0])["title"] == "Deadline 2"
+
+@pytest.mark.parametrize("path, message", [
+    ("/deadlines?offset=-1", "'offset' must not be negative"),
+    ("/deadlines?limit=5000", f"'limit' must be between 0 and {api.API_MAX_PAGE_SIZE}"),
+    ("/deadlines?limit=x", "'limit' must be an integer"),
+])
+def test_invalid_paging(client, path, message):
+    response = client.get(path)
+    assert response.status == 400
+    assert body(response)["error"] == message
+
+def test_invalid_batch_creates_nothing(client, data_file):
+    response = client.post("/deadlines/batch", {"items": [{"title": "Good", "date": "2025-06-01"},
+                                                          {"title": "Bad", "date": "June"}]})
+    assert response.status == 400
+    assert body(response)["error"] == "'date' must be a date (YYYY-MM-DD)"
+    assert store.load_data(data_file)["deadlines"] == []
+
+def test_deadline_must_link_an_existing_document(client):
+    response = client.post("/deadlines/batch", {"items": [{"title": "Expiry", "date": "2025-06-01",
+                                                           "document_id": 3}]})
+    assert response.status == 400
+    assert body(response)["error"] == "No document 3"
+
+def test_documents_store_their_files(client, data_file):
+    content = base64.b64encode(b"first line\nsecond line\n").decode()
+    response = client.post("/documents/batch", {"items": [{"name": "Lease", "filename": "lease.txt",
+                                                           "content_base64": content, "expiry_date": "2026-01-01"}]})
+    assert response.status == 201
+    doc = body(response)["items"][0]
+    assert doc["preview"] == "first line\nsecond line\n"
+    with open(doc["path"], "rb") as f:
+        assert f.read() == b"first line\nsecond line\n"
+
+    # The expiry deadline is created with the document
+    assert [d["document_id"] for d in store.load_data(data_file)["deadlines"]] == [doc["id"]]
+
+def test_unreadable_image_stores_nothing(client, tmp_path):
+    content = base64.b64encode(b"not an image").decode()
+    response = client.post("/documents/batch", {"items": [{"name": "Scan", "filename": "scan.png",
+                                                           "content_base64": content}]})
+    assert response.status == 400
+    assert not (tmp_path / "files").exists() or not any((tmp_path / "files").iterdir())
+
+def test_batch_delete_removes_linked_deadlines(client, data_file):
+    client.post("/subscriptions/batch", {"items": [{"name": "Gym", "renewal_date": "2025-04-01", "cost": 30},
+                                                   {"name": "Music", "renewal_date": "2025-04-02", "cost": 10}]})
+    response = client.delete("/subscriptions/batch", {"ids": [1, 7]})
+    assert body(response)["deleted"] == [1]
+    assert body(response)["missing"] == [7]
+
+    saved = store.load_data(data_file)
+    assert [sub["name"] for sub in saved["subscriptions"]] == ["Music"]
+    assert [d["subscription_id"] for d in saved["deadlines"]] == [2]
+
+def test_reads_and_writes_see_other_writers(client, data_file):
+    # Another process (the app or the command line) saves meanwhile
+    data = store.load_data(data_file)
+    core.add_deadline(data, "From the app", date(2025, 5, 1), "", "Work")
+    store.save_data(data, data_file)
+
+    assert [d["title"] for d in body(client.get("/deadlines"))["items"]] == ["From the app"]
+    created = body(client.post("/deadlines/batch", {"items": [{"title": "From the API", "date": "2025-05-02"}]}))
+    assert created["items"][0]["id"] == 2
+    assert len(store.load_data(data_file)["deadlines"]) == 2
+
+def test_unknown_paths_and_methods(client):
+    assert client.get("/users").status == 404
+    assert client.request("PUT", "/deadlines/batch").status == 405
+    assert client.post("/deadlines/batch", {"wrong": []}).status == 400
+
+@pytest.mark.parametrize("cost", [float("nan"), float("inf"), -1, True, "9.99"])
+def test_costs_must_be_finite_non_negative_numbers(client, data_file, cost):
+    response = client.post("/subscriptions/batch", {"items": [{"name": "Gym", "renewal_date": "2025-04-01",
+                                                               "cost": cost}]})
+    assert response.status == 400
+    assert body(response)["error"] == "'cost' must be a non-negative number"
+    assert store.load_data(data_file)["subscriptions"] == []
+
+def test_booleans_are_not_ids(client, data_file):
+    client.post("/deadlines/batch", {"items": [{"title": "Taxes", "date": "2025-04-15"}]})
+    response = client.delete("/deadlines/batch", {"ids": [True]})
+    assert response.status == 400
+    assert len(store.load_data(data_file)["deadlines"]) == 1
+
+    response = client.post("/deadlines/batch", {"items": [{"title": "Expiry", "date": "2025-06-01",
+                                                           "document_id": True}]})
+    assert response.status == 400
+    assert "'document_id'" in body(response)["error"]
+
+@pytest.mark.parametrize("value", ["0001-01-01", "1899-12-31", "2200-01-01", "9999-12-31"])
+def test_dates_must_be_in_range(client, value):
+    response = client.post("/deadlines/batch", {"items": [{"title": "Taxes", "date": value}]})
+    assert response.status == 400
+    assert body(response)["error"] == f"'date' must be between {api.API_MIN_DATE} and {api.API_MAX_DATE}"
@@ -0,0 +1,123 @@
+import threading
+from datetime import date
+
+from contractme import core, store
+from contractme.changes import STORE_SOURCE, ChangeFeed, StoreWatcher, apply_changes, diff_records
+
+def test_since_returns_the_deltas_after_a_cursor():
+    feed = ChangeFeed()
+    cursor = feed.cursor()
+    feed.publish("a", "add", "deadlines", {"id": 1})
+    feed.publish("b", "remove", "deadlines", {"id": 1})
+    deltas, cursor = feed.since(cursor)
+    assert [(d["source"], d["op"]) for d in deltas] == [("a", "add"), ("b", "remove")]
+    assert feed.since(cursor) == ([], cursor)
+
+def test_since_asks_subscribers_too_far_behind_to_reload():
+    feed = ChangeFeed(size=2)
+    for i in range(3):
+        feed.publish("a", "add", "deadlines", {"id": i})
+    assert feed.since(0) == (None, 3)
+    assert [d["record"]["id"] for d in feed.since(1)[0]] == [1, 2]
+
+def test_next_id_is_unique_across_threads():
+    feed = ChangeFeed()
+    ids = []
+
+    def allocate():
+        for _ in range(1000):
+            ids.append(feed.next_id("deadlines", [{"id": 10}]))
+
+    threads = [threading.Thread(target=allocate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(ids) == list(range(11, 4011))
+
+def test_merge_counters_only_raises():
+    feed = ChangeFeed()
+    feed.next_id("documents")
+    feed.merge_counters({"documents": 5, "deadlines": 2})
+    feed.merge_counters({"documents": 3})
+    assert feed.counters() == {"documents": 5, "deadlines": 2}
+
+def test_apply_changes_skips_own_deltas_and_is_idempotent():
+    data = {"deadlines": [{"id": 1, "title": "Old"}]}
+    deltas = [
+        {"source": "other", "op": "add", "collection": "deadlines", "record": {"id": 1, "title": "New"}},
+        {"source": "other", "op": "add", "collection": "deadlines", "record": {"id": 2, "title": "Added"}},
+        {"source": "me", "op": "remove", "collection": "deadlines", "record": {"id": 2}},
+    ]
+    assert apply_changes(data, deltas, "me") == {"deadlines"}
+    apply_changes(data, deltas, "me")
+    assert data["deadlines"] == [{"id": 1, "title": "New"}, {"id": 2, "title": "Added"}]
+
+def test_diff_records():
+    old = store.empty_data()
+    old["deadlines"] = [{"id": 1, "title": "Kept"}, {"id": 2, "title": "Changed"}, {"id": 3, "title": "Removed"}]
+    new = store.empty_data()
+    new["deadlines"] = [{"id": 1, "title": "Kept"}, {"id": 2, "title": "Changed!"}, {"id": 4, "title": "Added"}]
+    assert [(d["op"], d["record"]["id"]) for d in diff_records(old, new)] == [("add", 2), ("add", 4), ("remove", 3)]
+
+def test_watcher_publishes_what_other_processes_saved(tmp_path):
+    path = str(tmp_path / "data.json")
+    feed = ChangeFeed()
+    watcher = StoreWatcher(path, feed)
+    with store.locked(path):
+        assert watcher.pick_up() == []
+    assert watcher.version == 0
+
+    data = store.load_data(path)
+    deadline = core.add_deadline(data, "Saved by the CLI", date(2025, 5, 1), "", "Work")
+    store.save_data(data, path)
+    assert watcher.changed()
+
+    cursor = feed.cursor()
+    with store.locked(path):
+        deltas = watcher.pick_up()
+    assert [(d["op"], d["record"]) for d in deltas] == [("add", deadline)]
+    assert feed.since(cursor)[0][0]["source"] == STORE_SOURCE
+    assert not watcher.changed()
+    assert watcher.version == 1
+    assert feed.next_id("deadlines") == 2
+
+def test_watcher_does_not_publish_the_apps_own_saves(tmp_path):
+    path = str(tmp_path / "data.json")
+    feed = ChangeFeed()
+    watcher = StoreWatcher(path, feed)
+    with store.locked(path):
+        data = store.load_data(path)
+        watcher.pick_up()
+        core.add_deadline(data, "Saved by the app", date(2025, 5, 1), "", "Work")
+        store.save_data(data, path)
+        watcher.saved(data)
+        assert watcher.pick_up() == []
+
+def test_apply_changes_keeps_order_through_removes_and_re_adds():
+    records = [{"id": i} for i in range(1, 6)]
+    data = {"deadlines": records}
+    deltas = [{"source": "other", "op": op, "collection": "deadlines", "record": {"id": record_id, "op": op}}
+              for op, record_id in [("remove", 2), ("add", 4), ("remove", 4), ("add", 2), ("remove", 9), ("add", 6)]]
+    apply_changes(data, deltas, "me")
+    assert data["deadlines"] is records
+    assert [r["id"] for r in records] == [1, 3, 5, 2, 6]
+
+def test_apply_changes_keeps_indexes_up_to_date():
+    class Index:
+        def __init__(self):
+            self.ids = {1, 2}
+
+        def add(self, record):
+            self.ids.add(record["id"])
+
+        def remove(self, record):
+            self.ids.remove(record["id"])
+
+    index = Index()
+    data = {"deadlines": [{"id": 1}, {"id": 2}]}
+    deltas = [{"source": "other", "op": "remove", "collection": "deadlines", "record": {"id": 1}},
+              {"source": "other", "op": "add", "collection": "deadlines", "record": {"id": 2, "title": "New"}},
+              {"source": "other", "op": "add", "collection": "deadlines", "record": {"id": 3}}]
+    apply_changes(data, deltas, "me", {"deadlines": [index]})
+    assert index.ids == {2, 3}
@@ -0,0 +1,165 @@
+from datetime import date
+
+import pytest
+
+from contractme import core, store
+
+TODAY = date(2025, 3, 10)
+
+def stored_file(path="/files/abc.txt"):
+    return {"path": path, "size": 10, "sha256": "abc", "encoding": "utf-8"}
+
+def test_new_record_id_continues_after_existing_records():
+    data = store.empty_data()
+    data["deadlines"] = [{"id": 4}, {"id": 9}]
+    assert core.new_record_id(data, "deadlines") == 10
+    assert core.new_record_id(data, "deadlines") == 11
+    assert core.new_record_id(data, "documents") == 1
+
+def test_new_record_id_uses_the_allocator():
+    class Allocator:
+        def next_id(self, kind, records):
+            return 100 + len(records)
+
+    data = store.empty_data()
+    data["id_allocator"] = Allocator()
+    data["subscriptions"] = [{"id": 1}]
+    assert core.new_record_id(data, "subscriptions") == 101
+    assert data["id_counters"] == {}
+
+def test_add_document_with_expiry_adds_its_deadline():
+    data = store.empty_data()
+    doc, deadline = core.add_document(data, "Lease", "Home", "text", "preview", date(2025, 6, 1), "lease.txt",
+                                      stored_file(), TODAY)
+    assert data["documents"] == [doc]
+    assert doc["upload_date"] == TODAY
+    assert deadline["document_id"] == doc["id"]
+    assert deadline["date"] == date(2025, 6, 1)
+
+    _, no_deadline = core.add_document(data, "Note", "Home", "text", "", None, "note.txt", stored_file(), TODAY)
+    assert no_deadline is None
+    assert len(data["deadlines"]) == 1
+
+def test_merge_document_replaces_the_record_and_its_expiry_deadline():
+    data = store.empty_data()
+    doc, old_deadline = core.add_document(data, "Lease", "Home", "text", "", date(2025, 6, 1), "lease.txt",
+                                          stored_file(), TODAY)
+    merged, removed, deadline = core.merge_document(data, doc, "text", "new", date(2026, 6, 1), "lease2.txt",
+                                                    stored_file("/files/def.txt"), TODAY)
+
+    assert doc["path"] == "/files/abc.txt"  # Kept as it was for undo
+    assert data["documents"] == [merged]
+    assert merged["id"] == doc["id"] and merged["path"] == "/files/def.txt"
+    assert removed == [old_deadline]
+    assert data["deadlines"] == [deadline]
+
+def test_remove_document_removes_its_deadlines():
+    data = store.empty_data()
+    doc, deadline = core.add_document(data, "Lease", "Home", "text", "", date(2025, 6, 1), "lease.txt",
+                                      stored_file(), TODAY)
+    other = core.add_deadline(data, "Taxes", date(2025, 4, 15), "", "Finance")
+    assert core.remove_document(data, doc) == [deadline]
+    assert data["documents"] == []
+    assert data["deadlines"] == [other]
+
+def test_add_and_remove_subscription():
+    data = store.empty_data()
+    sub, deadline = core.add_subscription(data, "Netflix", "Streaming", date(2025, 4, 1), "15.5", "", "EUR")
+    assert sub["cost"] == 15.5
+    assert deadline["subscription_id"] == sub["id"]
+    assert "€15.50" in deadline["description"]
+
+    assert core.remove_subscription(data, sub) == [deadline]
+    assert data["subscriptions"] == [] and data["deadlines"] == []
+
+def test_import_events_skips_known_uids_and_adds_categories():
+    data = store.empty_data()
+    events = [
+        {"uid": "a", "date": date(2025, 5, 1), "summary": "Visa", "category": "Travel"},
+        {"uid": "a", "date": date(2025, 5, 1), "summary": "Visa again"},
+        {"date": date(2025, 5, 2)},
+    ]
+    added = core.import_events(data, events)
+    assert [d["title"] for d in added] == ["Visa", "Imported deadline"]
+    assert "Travel" in data["categories"]
+    assert core.import_events(data, events[:1]) == []
+
+def test_filter_deadlines_by_period():
+    deadlines = [{"id": i, "date": day} for i, day in enumerate(
+        [date(2025, 3, 1), date(2025, 3, 12), date(2025, 4, 1), date(2025, 8, 1)])]
+    assert [d["id"] for d in core.filter_deadlines(deadlines, "Expired", TODAY)] == [0]
+    assert [d["id"] for d in core.filter_deadlines(deadlines, "Next 7 days", TODAY)] == [1]
+    assert [d["id"] for d in core.filter_deadlines(deadlines, "Next 30 days", TODAY)] == [1, 2]
+    assert [d["id"] for d in core.filter_deadlines(deadlines, "All", TODAY)] == [0, 1, 2, 3]
+
+def test_deadline_status():
+    assert core.deadline_status(-1) == "Expired"
+    assert core.deadline_status(0) == "Imminent"
+    assert core.deadline_status(core.IMMINENT_DAYS) == "Imminent"
+    assert core.deadline_status(core.IMMINENT_DAYS + 1) == "Future"
+
+def test_upcoming_deadlines_with_a_limit_matches_the_full_sort():
+    deadlines = [{"id": i, "date": date(2025, 3, 1 + (i * 7) % 28)} for i in range(20)]
+    everything = core.upcoming_deadlines(deadlines, TODAY)
+    assert all(d["date"] >= TODAY for d in everything)
+    assert [d["date"] for d in core.upcoming_deadlines(deadlines, TODAY, limit=3)] == \
+        [d["date"] for d in everything[:3]]
+
+def test_expiry_sweep():
+    documents = [
+        {"id": 1, "expiry_date": date(2025, 3, 1)},
+        {"id": 2, "expiry_date": date(2025, 3, 20)},
+        {"id": 3, "expiry_date": date(2025, 6, 1)},
+        {"id": 4, "expiry_date": None},
+    ]
+    deadlines = [{"id": 1, "date": date(2025, 3, 9)}, {"id": 2, "date": date(2025, 3, 11)}]
+    sweep = core.expiry_sweep(documents, deadlines, 30, TODAY)
+    assert [doc["id"] for doc in sweep["expired_documents"]] == [1]
+    assert [doc["id"] for doc in sweep["expiring_documents"]] == [2]
+    assert [d["id"] for d in sweep["missed_deadlines"]] == [1]
+
+def test_clean_subscriptions_repairs_with_copies():
+    data = store.empty_data()
+    broken = {"id": 1, "name": "", "cost": "free", "renewal_date": None}
+    fine = {"id": 2, "name": "Gym", "cost": 30.0, "currency": "USD", "renewal_date": TODAY}
+    data["subscriptions"] = [broken, fine]
+
+    repaired = core.clean_subscriptions(data, TODAY)
+    assert len(repaired) == 1 and repaired[0][0] is broken
+    fixed = repaired[0][1]
+    assert fixed == {"id": 1, "name": "Unnamed Subscription", "cost": 0.0, "currency": "USD", "renewal_date": TODAY}
+    assert data["subscriptions"] == [fixed, fine]
+    assert broken["cost"] == "free"
+
+def test_monthly_cost_by_currency():
+    subscriptions = [{"cost": 10.0, "currency": "USD"}, {"cost": 5.0}, {"cost": 3.0, "currency": "EUR"},
+                     {"cost": "n/a"}]
+    assert core.monthly_cost_by_currency(subscriptions) == {"USD": 15.0, "EUR": 3.0}
+
+def test_month_events_lists_monthly_renewals_once():
+    data = store.empty_data()
+    sub, _ = core.add_subscription(data, "Gym", "Fitness", date(2025, 1, 31), 30, "")
+    core.add_deadline(data, "Taxes", date(2025, 2, 14), "", "Finance")
+
+    february = core.month_events(data["deadlines"], data["subscriptions"], 2025, 2)
+    assert sorted(february) == [14, 28]
+    assert february[28] == [{"title": "Renewal Gym", "type": "subscription", "id": sub["id"], "cost": 30.0,
+                             "currency": "USD"}]
+
+    january = core.month_events(data["deadlines"], data["subscriptions"], 2025, 1)
+    assert [event["type"] for event in january[31]] == ["subscription"]
+    assert core.month_events(data["deadlines"], data["subscriptions"], 2024, 12) == {}
+
+def test_calendar_years():
+    deadlines = [{"date": date(2021, 5, 1)}]
+    subscriptions = [{"renewal_date": date(2030, 1, 1)}]
+    assert core.calendar_years(deadlines, subscriptions, 2025) == list(range(2021, 2031))
+    assert core.calendar_years([], [], 2025) == [2025, 2026, 2027]
+
+def test_merging_into_a_removed_record_raises_key_error():
+    data = store.empty_data()
+    sub, _ = core.add_subscription(data, "Gym", "Fitness", date(2025, 4, 1), 30, "")
+    core.remove_subscription(data, sub)
+    with pytest.raises(KeyError):
+        core.merge_subscription(data, sub, "Fitness", date(2025, 5, 1), 35, "")
+    assert data["subscriptions"] == [] and data["deadlines"] == []
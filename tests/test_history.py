@@ -0,0 +1,75 @@
+import gc
+
+from contractme.history import History, HistoryRegistry
+
+def step(history, label, *changes):
+    history.begin(label)
+    for change in changes:
+        history.record(*change)
+    return history.end()
+
+def test_undo_and_redo_return_the_changes_to_apply():
+    history = History()
+    old, new = {"id": 1, "name": "Old"}, {"id": 1, "name": "New"}
+    step(history, "Rename", ("documents", old, new))
+
+    undone, changes = history.undo()
+    assert undone["label"] == "Rename"
+    assert changes == [("documents", new, old)]
+    assert history.undo() is None
+
+    redone, changes = history.redo()
+    assert redone is undone
+    assert changes == [("documents", old, new)]
+    assert history.redo() is None
+
+def test_undo_reverts_the_changes_of_a_step_in_reverse_order():
+    history = History()
+    a, b = {"id": 1}, {"id": 2}
+    step(history, "Add two", ("deadlines", None, a), ("deadlines", None, b))
+    _, changes = history.undo()
+    assert changes == [("deadlines", b, None), ("deadlines", a, None)]
+
+def test_actions_without_changes_make_no_step():
+    history = History()
+    assert step(history, "Nothing") == []
+    history.record("documents", None, {"id": 1})  # Outside an action
+    assert history.steps() == []
+
+def test_new_step_drops_the_redo_steps():
+    history = History()
+    step(history, "First", ("documents", None, {"id": 1}))
+    history.undo()
+    dropped = step(history, "Second", ("documents", None, {"id": 2}))
+    assert [s["label"] for s in dropped] == ["First"]
+    assert history.redo() is None
+
+def test_limit_drops_the_oldest_steps():
+    history = History(limit=2)
+    for i in range(3):
+        dropped = step(history, f"Step {i}", ("documents", None, {"id": i}))
+    assert [s["label"] for s in dropped] == ["Step 0"]
+    assert [s["label"] for s in history.steps()] == ["Step 2", "Step 1"]
+
+def test_records_include_undone_steps():
+    history = History()
+    old, new = {"id": 1, "v": 1}, {"id": 1, "v": 2}
+    step(history, "Edit", ("documents", old, new))
+    step(history, "Deadline", ("deadlines", None, {"id": 5}))
+    history.undo()
+    assert sorted(r["v"] for r in history.records("documents")) == [1, 2]
+    assert history.records("deadlines") == [{"id": 5}]
+    assert history.records("subscriptions") == []
+
+def test_registry_forgets_closed_sessions():
+    registry = HistoryRegistry()
+    kept, closed = History(), History()
+    registry.add(kept)
+    registry.add(closed)
+    step(kept, "Kept", ("documents", None, {"id": 1, "path": "a"}))
+    step(closed, "Closed", ("documents", None, {"id": 2, "path": "b"}))
+    assert sorted(r["path"] for r in registry.records("documents")) == ["a", "b"]
+
+    del closed
+    gc.collect()
+    assert [r["path"] for r in registry.records("documents")] == ["a"]
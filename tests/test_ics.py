@@ -0,0 +1,104 @@
+import io
+from datetime import date
+
+import pytest
+
+from contractme import core, store
+from contractme.ics import ics_fold, iter_ics, parse_ics, parse_ics_date, write_ics
+
+def test_parse_ics_date():
+    assert parse_ics_date("20250131") == date(2025, 1, 31)
+    assert parse_ics_date("20250131T090000Z") == date(2025, 1, 31)
+
+@pytest.mark.parametrize("value", ["20250230", "2025013", "2025-01-31", "20251301", "202501311", ""])
+def test_parse_ics_date_rejects_invalid_dates(value):
+    with pytest.raises(ValueError):
+        parse_ics_date(value)
+
+def test_fold_keeps_lines_within_75_octets():
+    line = "DESCRIPTION:" + "é" * 100
+    folded = ics_fold(line)
+    assert all(len(piece.encode("utf-8")) <= 75 for piece in folded.split("\r\n"))
+    assert folded.replace("\r\n ", "").rstrip("\r\n") == line
+
+def test_export_import_round_trip():
+    deadlines = [
+        {"id": 1, "title": "Lease, flat; 2nd floor", "date": date(2025, 6, 1),
+         "description": "Line one\nLine two \\ with a backslash " + "long " * 30, "category": "Home"},
+        {"id": 2, "title": "Visa", "date": date(2025, 7, 15), "description": "", "category": "Travel",
+         "ics_uid": "visa@example.com"},
+        {"id": 3, "title": "Renewal Gym", "date": date(2025, 4, 30), "description": "", "category": "Subscriptions",
+         "subscription_id": 1},
+    ]
+    subscriptions = [{"id": 1, "name": "Gym", "renewal_date": date(2025, 4, 30), "cost": 30.0, "currency": "EUR"}]
+
+    f = io.BytesIO()
+    write_ics(f, deadlines, subscriptions)
+    events = list(parse_ics(io.StringIO(f.getvalue().decode("utf-8"), newline="")))
+
+    assert [(e["summary"], e["date"], e["uid"]) for e in events] == [
+        ("Lease, flat; 2nd floor", date(2025, 6, 1), "deadline-1@contractme"),
+        ("Visa", date(2025, 7, 15), "visa@example.com"),
+        ("Renewal Gym", date(2025, 4, 30), "subscription-1@contractme"),
+    ]
+    assert events[0]["description"] == deadlines[0]["description"]
+    assert events[0]["category"] == "Home"
+    assert events[2]["rrule"] == "FREQ=MONTHLY"
+    assert "€30.00" in events[2]["description"]
+
+def test_iter_ics_is_one_chunk_per_event():
+    chunks = list(iter_ics([{"id": 1, "title": "A", "date": date(2025, 1, 1)}], []))
+    assert chunks[0].startswith("BEGIN:VCALENDAR") and chunks[-1] == "END:VCALENDAR\r\n"
+    assert len(chunks) == 3
+
+def test_parse_ics_skips_invalid_events():
+    lines = [
+        "BEGIN:VCALENDAR",
+        "BEGIN:VEVENT", "UID:good", "DTSTART;VALUE=DATE:20250131", "SUMMARY:Good", "END:VEVENT",
+        "BEGIN:VEVENT", "UID:bad", "DTSTART:20250230", "SUMMARY:Feb 30", "END:VEVENT",
+        "BEGIN:VEVENT", "UID:short", "DTSTART:2025013", "END:VEVENT",
+        "BEGIN:VEVENT", "SUMMARY:No date", "END:VEVENT",
+        "END:VCALENDAR",
+    ]
+    skipped = []
+    assert [event["uid"] for event in parse_ics(lines, skipped)] == ["good"]
+    assert skipped == ["Feb 30: Invalid date: '20250230'", "short: Invalid date: '2025013'",
+                       "No date: No start date"]
+    assert [event["uid"] for event in parse_ics(lines)] == ["good"]
+
+def export_events(data):
+    f = io.BytesIO()
+    write_ics(f, data["deadlines"], data["subscriptions"])
+    return list(parse_ics(io.StringIO(f.getvalue().decode("utf-8"), newline="")))
+
+def sample_data():
+    data = store.empty_data()
+    core.add_deadline(data, "Taxes", date(2025, 4, 15), "", "Finance")
+    core.add_document(data, "Passport", "Other", "pdf", None, date(2030, 1, 1), "passport.pdf",
+                      {"path": "/files/p.pdf", "size": 1, "sha256": "p", "encoding": None})
+    core.add_subscription(data, "Gym", "Fitness", date(2025, 4, 30), 30, "")
+    data["deadlines"].append({"id": 99, "title": "Saved before UIDs", "date": date(2025, 5, 1), "description": "",
+                              "category": "Work", "document_id": None})
+    return data
+
+def test_importing_an_export_into_the_same_data_adds_nothing():
+    data = sample_data()
+    deadlines = list(data["deadlines"])
+    assert core.import_events(data, export_events(data)) == []
+    assert data["deadlines"] == deadlines
+
+def test_importing_another_workspace_export_adds_its_deadlines_but_not_renewals():
+    other = sample_data()
+    data = store.empty_data()
+    core.add_deadline(data, "Rent", date(2025, 5, 1), "", "Home")
+    added = core.import_events(data, export_events(other))
+    assert sorted(d["title"] for d in added) == ["Expiry Passport", "Saved before UIDs", "Taxes"]
+    assert core.import_events(data, export_events(other)) == []
+
+def test_replaced_expiry_keeps_its_calendar_uid():
+    data = sample_data()
+    doc = data["documents"][0]
+    old = next(d for d in data["deadlines"] if d.get("document_id") == doc["id"])
+    _, _, new = core.merge_document(data, doc, "pdf", None, date(2031, 1, 1), "passport.pdf",
+                                    {"path": "/files/q.pdf", "size": 1, "sha256": "q", "encoding": None})
+    assert new["ics_uid"] == old["ics_uid"]
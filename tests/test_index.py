@@ -0,0 +1,100 @@
+import random
+import string
+from datetime import date
+
+from contractme.index import (DocumentIndex, DuplicateIndex, NGramIndex, SearchIndex, search_all, trigrams)
+
+def dice(a, b):
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+def test_similar_matches_a_brute_force_comparison():
+    rng = random.Random(3)
+    words = ["netflix", "spotify", "premium", "family", "gym", "insurance", "car", "home", "lease"]
+    texts = {}
+    for key in range(300):
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.3:
+            position = rng.randrange(len(text))
+            text = text[:position] + rng.choice(string.ascii_lowercase) + text[position + 1:]
+        texts[key] = text
+
+    index = NGramIndex()
+    for key, text in texts.items():
+        index.add(key, text)
+    for key in range(0, 300, 3):
+        index.remove(key)
+        del texts[key]
+
+    for query in ["netflix premium", "netflx", "car insurance", "home lease family", "gym"]:
+        for threshold in (0.4, 0.6, 0.8):
+            expected = {key for key, text in texts.items() if dice(query, text) >= threshold}
+            found = index.similar(query, threshold)
+            assert {key for key, _ in found} == expected
+            assert [score for _, score in found] == sorted((score for _, score in found), reverse=True)
+
+def test_duplicate_index_compares_names_and_long_descriptions():
+    index = DuplicateIndex([
+        {"id": 1, "name": "Netflix Premium", "description": ""},
+        {"id": 2, "name": "Gym", "description": "Monthly membership at the climbing gym downtown"},
+    ])
+    assert [record["id"] for record, _ in index.duplicates("Netflix")] == [1]
+    assert [record["id"] for record, _ in index.duplicates("Bouldering",
+                                                           "Monthly membership at the climbing gym")] == [2]
+    index.remove({"id": 1})
+    assert index.duplicates("Netflix") == []
+
+def test_search_prefers_titles_starting_with_the_query():
+    index = SearchIndex("name", [
+        {"id": 1, "name": "Premium Netflix"},
+        {"id": 2, "name": "Netflix Premium Family"},
+        {"id": 3, "name": "Netflix"},
+        {"id": 4, "name": "Spotify"},
+    ])
+    assert [record_id for _, record_id in index.search("netf")] == [3, 2, 1]
+    assert [record_id for _, record_id in index.search("prem net")] == [1, 2]
+    assert index.search("") == []
+
+def test_search_finds_typos_below_prefix_matches():
+    index = SearchIndex("name", [{"id": 1, "name": "Netflix"}, {"id": 2, "name": "Spotify"}])
+    results = index.search("netflx")
+    assert [record_id for _, record_id in results] == [1]
+    assert results[0][0] < 1
+
+def test_search_index_follows_adds_and_removes():
+    index = SearchIndex("title")
+    index.add({"id": 1, "title": "Car insurance"})
+    index.add({"id": 2, "title": "Home insurance"})
+    index.add({"id": 1, "title": "Car lease"})  # Re-adding replaces the old title
+    assert [record_id for _, record_id in index.search("insurance")] == [2]
+    index.remove({"id": 2})
+    assert index.search("insurance") == []
+    assert len(index) == 1 and index.suffixes == sorted(index.suffixes)
+
+def test_search_all_merges_collections():
+    indexes = {
+        "documents": SearchIndex("name", [{"id": 1, "name": "Lease contract"}]),
+        "deadlines": SearchIndex("title", [{"id": 7, "title": "Lease renewal"}, {"id": 8, "title": "Taxes"}]),
+    }
+    assert sorted((collection, record_id) for _, collection, record_id in search_all(indexes, "lease")) == \
+        [("deadlines", 7), ("documents", 1)]
+
+def test_document_index_query():
+    docs = [
+        {"id": 1, "name": "Lease", "category": "Home", "filename": "lease.pdf", "upload_date": date(2025, 1, 5),
+         "expiry_date": date(2026, 1, 5)},
+        {"id": 2, "name": "Scan", "category": "Health", "filename": "scan.png", "upload_date": date(2025, 2, 5),
+         "expiry_date": None},
+        {"id": 3, "name": "Notes", "category": "Home", "filename": "notes.txt", "upload_date": date(2025, 3, 5),
+         "expiry_date": None},
+    ]
+    index = DocumentIndex(docs)
+    assert index.query(categories=["Home"]) == {1, 3}
+    assert index.query(categories=["Home"], has_expiry=False) == {3}
+    assert index.query(file_types=["PNG", "PDF"], uploaded_from=date(2025, 2, 1)) == {2}
+    assert index.query(uploaded_to=date(2025, 2, 5)) == {1, 2}
+    assert index.category_counts() == {"Home": 2, "Health": 1}
+
+    index.remove(docs[0])
+    assert index.query() == {2, 3}
+    assert index.category_counts() == {"Home": 1, "Health": 1}
@@ -0,0 +1,45 @@
+import queue
+from datetime import date, datetime, timedelta
+
+from contractme.reminders import ReminderScheduler, deadline_reminder, deadline_reminder_key, reminder_text
+
+def scheduler_with_sink(fired_file=None):
+    fired = queue.Queue()
+    return ReminderScheduler([fired.put], fired_file=fired_file), fired
+
+def deadline(due_date):
+    return {"id": 1, "title": "Taxes", "date": due_date}
+
+def test_missed_reminder_fires_once(tmp_path):
+    fired_file = str(tmp_path / "fired.json")
+    tomorrow = date.today() + timedelta(days=1)
+    key = deadline_reminder_key(deadline(tomorrow), "workspace")
+    scheduler, fired = scheduler_with_sink(fired_file)
+
+    scheduler.schedule(key, deadline_reminder(deadline(tomorrow), "workspace"))
+    reminder = fired.get(timeout=5)
+    assert reminder["key"] == key and reminder["lead_days"] in (1, 7)
+    assert reminder_text(reminder).startswith("Taxes is due tomorrow")
+
+    # Undo, redo and pick-ups schedule the deadline again, and so does a restart
+    scheduler.schedule(key, deadline_reminder(deadline(tomorrow), "workspace"))
+    restarted, fired_after_restart = scheduler_with_sink(fired_file)
+    restarted.schedule(key, deadline_reminder(deadline(tomorrow), "workspace"))
+    assert fired.empty() and fired_after_restart.empty()
+    with restarted.condition:
+        assert all(fire_at > datetime.now() for fire_at, *_ in restarted.heap)
+
+def test_moved_deadline_is_reminded_again():
+    scheduler, fired = scheduler_with_sink()
+    today = date.today()
+    scheduler.schedule("deadline:1", deadline_reminder(deadline(today)))
+    assert fired.get(timeout=5)["due_date"] == today
+
+    tomorrow = today + timedelta(days=1)
+    scheduler.schedule("deadline:1", deadline_reminder(deadline(tomorrow)))
+    assert fired.get(timeout=5)["due_date"] == tomorrow
+
+def test_past_deadlines_are_not_reminded():
+    scheduler, fired = scheduler_with_sink()
+    scheduler.schedule("deadline:1", deadline_reminder(deadline(date.today() - timedelta(days=1))))
+    assert scheduler.items == {}
@@ -0,0 +1,48 @@
+import io
+
+import numpy as np
+
+from contractme import storage
+from contractme.storage import ingest_upload, open_line_index, read_text_lines
+
+def store_text(tmp_path, content, extension="txt"):
+    return ingest_upload(io.BytesIO(content), extension, 1024 * 1024, str(tmp_path))
+
+def test_text_is_stored_as_utf8_with_its_line_index(tmp_path):
+    stored = store_text(tmp_path, "héllo\nwörld\nlast".encode("cp1252"))
+    assert stored["encoding"] == "cp1252"
+    with open(stored["path"], "rb") as f:
+        assert f.read() == "héllo\nwörld\nlast".encode("utf-8")
+    assert open_line_index(stored["path"]).tolist() == [0, 7, 14]
+    assert stored["line_count"] == 3
+
+def test_storing_the_same_text_again_replaces_the_index_file(tmp_path):
+    stored = store_text(tmp_path, b"a\nb\n")
+    mapped = open_line_index(stored["path"])
+    store_text(tmp_path, b"a\nb\n")
+    # The mapping of the previous index stays readable
+    assert mapped.tolist() == [0, 2]
+    assert not list(tmp_path.glob("*.part"))
+
+def test_pages_of_lines(tmp_path):
+    stored = store_text(tmp_path, b"".join(b"line %d\n" % i for i in range(10)))
+    line_starts = open_line_index(stored["path"])
+    assert read_text_lines(stored["path"], line_starts, 2, 3) == ("line 2\nline 3\nline 4\n", 5)
+    assert read_text_lines(stored["path"], line_starts, 8, 5) == ("line 8\nline 9\n", 10)
+    assert read_text_lines(stored["path"], line_starts, 10, 5) == ("", 10)
+
+def test_long_lines_shorten_the_page(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "TEXT_VIEWER_MAX_PAGE_BYTES", 10)
+    stored = store_text(tmp_path, b"abc\ndef\nghi\n" + b"x" * 30 + b"\nend\n")
+    line_starts = open_line_index(stored["path"])
+    # Only the lines that fit whole are read, and the next page starts after them
+    assert read_text_lines(stored["path"], line_starts, 0, 5) == ("abc\ndef\n", 2)
+    # A line that does not fit alone is cut short
+    assert read_text_lines(stored["path"], line_starts, 3, 5) == ("x" * 10, 4)
+    assert read_text_lines(stored["path"], line_starts, 4, 5) == ("end\n", 5)
+
+def test_missing_index_is_built_from_the_file(tmp_path):
+    path = tmp_path / "old.txt"
+    path.write_bytes(b"one\ntwo")
+    assert open_line_index(str(path)).tolist() == [0, 4]
+    assert np.load(str(path) + ".lines.npy").tolist() == [0, 4]